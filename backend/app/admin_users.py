@@ -0,0 +1,106 @@
+"""
+User listing and export for the admin pages.
+
+The listing is one role at a time, newest first, paged with keyset cursors
+over (created_at, id); it selects only the columns it shows, never the
+password hash. The export streams every student and tutor as CSV or NDJSON:
+rows come off a server-side cursor (`yield_per`) `EXPORT_BATCH_SIZE` at a
+time and are written out batch by batch, so memory stays flat however many
+users there are. An export keeps one read connection checked out while it
+streams.
+"""
+import csv
+import io
+import json
+import os
+
+from anyio import CancelScope
+
+from . import models, pagination
+from .database import ReadSessionLocal, run_db
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+ROLES = {"student": models.Student, "tutor": models.Tutor}
+EXPORT_FIELDS = ["role", "id", "name", "email", "subject", "joined"]
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# A CSV cell starting with one of these is read as a formula by spreadsheets.
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _columns(model):
+    columns = [model.__mapper__.primary_key[0], model.name, model.email, model.created_at]
+    return columns + [model.subject] if model is models.Tutor else columns
+
+
+def _item(role, row):
+    item = {"id": row[0], "name": row.name, "email": row.email, "role": role.title(), "joined": row.created_at}
+    if role == "tutor":
+        item["subject"] = row.subject
+    return item
+
+
+def page(db, role, email=None, cursor=None, limit=pagination.DEFAULT_PAGE_SIZE):
+    """One page of `role` users, newest first; `email` filters by address prefix."""
+    model = ROLES[role]
+    pk = model.__mapper__.primary_key[0]
+    query = db.query(*_columns(model))
+    if email:
+        query = query.filter(model.email.startswith(email, autoescape=True))
+    rows, next_cursor = pagination.paginate(query, model.created_at, pk, cursor, limit)
+    return [_item(role, row) for row in rows], next_cursor
+
+
+def _export_row(role, row):
+    joined = row.created_at.isoformat() if row.created_at else None
+    return {"role": role, "id": row[0], "name": row.name, "email": row.email,
+            "subject": getattr(row, "subject", None), "joined": joined}
+
+
+def _cell(value):
+    # Names and emails are user-controlled: quote anything a spreadsheet would evaluate.
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv(rows, header=False):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    writer.writerows([_cell(row[field]) for field in EXPORT_FIELDS] for row in rows)
+    return out.getvalue()
+
+
+def _ndjson(rows):
+    return "".join(json.dumps(row) + "\n" for row in rows)
+
+
+async def export(fmt, roles=tuple(ROLES)):
+    """The users of `roles` in `fmt`, as an async stream of text chunks (one per batch)."""
+    db = ReadSessionLocal()
+    result = None
+
+    def open_result(model):
+        statement = db.query(*_columns(model)).order_by(model.__mapper__.primary_key[0]).statement
+        return db.execute(statement, execution_options={"yield_per": EXPORT_BATCH_SIZE})
+
+    def close():
+        if result is not None:
+            result.close()
+        db.close()
+
+    try:
+        if fmt == "csv":
+            yield _csv([], header=True)
+        for role in roles:
+            result = await run_db(open_result, ROLES[role])
+            while rows := await run_db(result.fetchmany, EXPORT_BATCH_SIZE):
+                items = [_export_row(role, row) for row in rows]
+                yield _csv(items) if fmt == "csv" else _ndjson(items)
+            result.close()
+            result = None
+    finally:
+        # Also on a client that disconnects mid-stream: give the connection back.
+        with CancelScope(shield=True):
+            await run_db(close)
@@ -0,0 +1,103 @@
+"""
+Answer cache for the text route.
+
+Two layers, both scoped to the same conversation context:
+- exact: normalized question text + a hash of the context turns;
+- similar (opt-in): cosine similarity over locally computed hashed
+  bag-of-words vectors, accepted above `ANSWER_CACHE_SIMILARITY`.
+
+Only genuine model answers are stored, never the fallback error texts.
+"""
+import hashlib
+import math
+import os
+import re
+import zlib
+
+from .ttl_cache import TTLCache
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 2000))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 24 * 3600))
+ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "0") == "1"
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.9))
+
+_EMBEDDING_DIM = 1024
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "what", "whats", "how", "why", "does", "do",
+    "please", "explain", "tell", "me", "about", "of", "in", "can", "you", "define", "i",
+}
+
+
+def normalize(question: str) -> str:
+    text = question.lower().replace("'", "").replace("’", "")
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def context_hash(history: list) -> str:
+    digest = hashlib.sha256()
+    for msg in history:
+        digest.update(b"U" if msg["is_user"] else b"A")
+        digest.update(msg["content"].encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def embed(normalized: str) -> dict:
+    """Sparse, L2-normalized vector of hashed unigrams and bigrams."""
+    words = [w for w in normalized.split() if w not in _STOPWORDS] or normalized.split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    vector = {}
+    for feature in features:
+        index = zlib.crc32(feature.encode("utf-8")) % _EMBEDDING_DIM
+        vector[index] = vector.get(index, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+    return {k: v / norm for k, v in vector.items()}
+
+
+def _cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class AnswerCache:
+    def __init__(self, maxsize=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL,
+                 semantic=ANSWER_CACHE_SEMANTIC, threshold=ANSWER_CACHE_SIMILARITY):
+        self.entries = TTLCache(maxsize, ttl)
+        self.semantic = semantic
+        self.threshold = threshold
+        self.similar_hits = 0
+
+    def get(self, question: str, history: list):
+        normalized = normalize(question)
+        ctx = context_hash(history)
+        entry = self.entries.get((ctx, normalized))
+        if entry is not None:
+            return entry["answer"]
+        if not self.semantic:
+            return None
+
+        query_vector = embed(normalized)
+        best_key, best_score = None, self.threshold
+        for key, candidate in self.entries.items():
+            if key[0] != ctx:
+                continue
+            score = _cosine(query_vector, candidate["vector"])
+            if score >= best_score:
+                best_key, best_score = key, score
+        if best_key is None:
+            return None
+        self.similar_hits += 1
+        return self.entries.get(best_key)["answer"]
+
+    def put(self, question: str, history: list, answer: str):
+        normalized = normalize(question)
+        entry = {"answer": answer, "vector": embed(normalized) if self.semantic else None}
+        self.entries.set((context_hash(history), normalized), entry)
+
+    def stats(self):
+        return {**self.entries.stats(), "similar_hits": self.similar_hits, "semantic": self.semantic}
+
+
+answer_cache = AnswerCache()
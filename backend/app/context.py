@@ -0,0 +1,105 @@
+"""
+Conversation context for the text model, kept within a token budget.
+
+The context used to be the last 3 raw turns whatever their size: three long
+LaTeX answers made a multi-thousand-token prompt (and a slow prefill), while
+anything older was dropped. Now the unsummarized turns of the session are
+counted against `CONTEXT_TOKEN_BUDGET`; while they do not fit, or there are
+more than `CONTEXT_WINDOW` of them, the oldest is folded into a rolling
+per-session summary (`Session.summary`, with
+`Session.summary_through` marking the last folded query). The summary keeps
+one short line per folded turn (the question and the first sentence of the
+answer) and drops its oldest lines beyond `CONTEXT_SUMMARY_TOKENS`, except
+the first: the session's opening question usually names its topic. The most
+recent turn is never folded, only cut short if it alone is over budget.
+
+Summaries are extractive, so folding costs no extra model call. Token counts
+are a local estimate (words, long words counting extra, and every symbol),
+close enough to bound prompt size without a tokenizer download.
+"""
+import os
+import re
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1200))
+CONTEXT_SUMMARY_TOKENS = int(os.getenv("CONTEXT_SUMMARY_TOKENS", 300))
+# Most raw turns sent; older ones are folded into the summary even when short.
+CONTEXT_WINDOW = int(os.getenv("CONTEXT_WINDOW", 10))
+_LINE_TOKENS = 40  # per question / per answer in a summary line
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def _cost(token: str) -> int:
+    return 1 + len(token) // 6 if token[0].isalnum() or token[0] == "_" else 1
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return sum(_cost(m.group()) for m in _TOKEN.finditer(text))
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    """The longest prefix of `text` within `max_tokens` (whole tokens), marked with an ellipsis if cut."""
+    used = 0
+    for m in _TOKEN.finditer(text):
+        used += _cost(m.group())
+        if used > max_tokens:
+            return text[:m.start()].rstrip() + " …"
+    return text
+
+
+def _flatten(text: str) -> str:
+    return " ".join(text.split())
+
+
+def summary_line(question: str, answer: str) -> str:
+    first_sentence = _SENTENCE_END.split(_flatten(answer), 1)[0]
+    return f"- Asked: {truncate(_flatten(question), _LINE_TOKENS)} | Answer: {truncate(first_sentence, _LINE_TOKENS)}"
+
+
+def _roll(summary: str, line: str) -> str:
+    # The first line (the session's opening question, usually its topic)
+    # stays; the oldest line after it goes first.
+    lines = (summary.splitlines() if summary else []) + [line]
+    while len(lines) > 2 and count_tokens("\n".join(lines)) > CONTEXT_SUMMARY_TOKENS:
+        lines.pop(1)
+    return "\n".join(lines)
+
+
+def fit(summary: str, turns: list):
+    """
+    Fits `turns` ([(query_id, question, answer)], oldest first: every turn
+    since the summary) and the session summary into CONTEXT_TOKEN_BUDGET and
+    at most CONTEXT_WINDOW raw turns.
+
+    Returns (summary, folded_through, turns): the possibly extended summary,
+    the query_id of the last turn folded into it (None if none was), and the
+    turns to send raw.
+    """
+    turns = list(turns)
+    costs = [count_tokens(q) + count_tokens(a) for _, q, a in turns]
+    folded_through = None
+    while len(turns) > 1 and (len(turns) > CONTEXT_WINDOW
+                              or count_tokens(summary) + sum(costs) > CONTEXT_TOKEN_BUDGET):
+        query_id, question, answer = turns.pop(0)
+        costs.pop(0)
+        summary = _roll(summary, summary_line(question, answer))
+        folded_through = query_id
+
+    if turns and count_tokens(summary) + costs[0] > CONTEXT_TOKEN_BUDGET:
+        query_id, question, answer = turns[0]
+        room = CONTEXT_TOKEN_BUDGET - count_tokens(summary) - count_tokens(question)
+        turns[0] = (query_id, question, truncate(answer, max(room, _LINE_TOKENS)))
+    return summary, folded_through, turns
+
+
+def as_history(summary: str, turns: list) -> list:
+    """Model context entries: the summary first (if any), then the raw turns."""
+    history = [{"is_user": False, "content": summary, "is_summary": True}] if summary else []
+    for _, question, answer in turns:
+        history.append({"is_user": True, "content": question})
+        if answer:
+            history.append({"is_user": False, "content": answer})
+    return history
@@ -1,13 +1,33 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 import os
 import ssl
+import time
 from dotenv import load_dotenv
 
+from . import metrics
+from .threads import bounded_runner
+
 load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
+# Optional read replica for the read-only endpoints (see get_read_db).
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+# Connection pool, per engine (primary and replica each get one). Checkouts
+# wait up to DB_POOL_TIMEOUT for one of DB_POOL_SIZE + DB_MAX_OVERFLOW
+# connections. Pre-ping costs a round trip per checkout, so it is off by
+# default; DB_POOL_RECYCLE already retires connections before the server's
+# idle timeout drops them.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 3600))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "0") == "1"
 
 connect_args = {}
 
@@ -21,13 +41,59 @@ if SQLALCHEMY_DATABASE_URL and "aiven" in SQLALCHEMY_DATABASE_URL:
         "ssl": ssl_context
     }
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    pool_recycle=3600,
-    connect_args=connect_args
-)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class _TimedQueuePool(QueuePool):
+    """QueuePool recording how long each checkout took (waiting for a free slot or connecting)."""
+    label = "primary"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            metrics.db_pool_timeouts.inc(self.label)
+            raise
+        finally:
+            metrics.db_pool_wait.observe(time.perf_counter() - start, self.label)
+
+
+def _create_engine(url, label):
+    options = {"pool_recycle": DB_POOL_RECYCLE, "pool_pre_ping": DB_POOL_PRE_PING}
+    # In-memory SQLite keeps one connection per thread; there is no pool to size.
+    if make_url(url).database not in (None, "", ":memory:"):
+        options.update(
+            poolclass=type(f"{label.title()}Pool", (_TimedQueuePool,), {"label": label}),
+            pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT,
+        )
+    return create_engine(url, connect_args=connect_args, **options)
+
+
+engine = _create_engine(SQLALCHEMY_DATABASE_URL, "primary")
+read_engine = _create_engine(DATABASE_REPLICA_URL, "replica") if DATABASE_REPLICA_URL else engine
+
+
+def _pool_gauge(read):
+    engines = {"primary": engine, "replica": read_engine} if read_engine is not engine else {"primary": engine}
+    return lambda: {(label,): read(e.pool) for label, e in engines.items() if isinstance(e.pool, QueuePool)}
+
+
+metrics.registry.gauge("db_pool_checked_out", "Connections in use.", ("pool",), _pool_gauge(lambda p: p.checkedout()))
+metrics.registry.gauge("db_pool_capacity", "Most connections the pool opens (size + overflow).", ("pool",),
+                       _pool_gauge(lambda p: DB_POOL_SIZE + DB_MAX_OVERFLOW))
+
+# expire_on_commit=False: objects stay readable after a commit, so ending a
+# transaction early (to release the connection) doesn't cost a reload later.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+# Sessions for read-only endpoints: on the replica when one is configured.
+# They refuse to flush, so a write can't land on a replica (or sneak into a
+# read path) unnoticed.
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=read_engine)
+
+
+@event.listens_for(ReadSessionLocal, "before_flush")
+def _refuse_writes(session, flush_context, instances):
+    raise RuntimeError("Read-only session: write through get_db / SessionLocal")
+
 
 Base = declarative_base()
 
@@ -36,4 +102,23 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_read_db():
+    """
+    Session for endpoints that only read. With DATABASE_REPLICA_URL set it
+    reads from the replica, so results may trail the latest writes by the
+    replication lag.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Blocking, session-using work from async endpoints runs on its own bounded
+# set of worker threads, so it never competes with (or starves) the default
+# AnyIO threadpool that serves the sync endpoints. Keep it at or below the
+# connection pool size.
+DB_THREADS = int(os.getenv("DB_THREADS", 10))
+run_db = bounded_runner(DB_THREADS)
@@ -0,0 +1,76 @@
+"""
+Answer cache for the vision route.
+
+A whole class often uploads the same worksheet photo, forwarded through a
+group chat and re-compressed, resized or brightened along the way. Entries
+are keyed by the normalized question plus a 256-bit difference hash (dHash,
+computed in images.py) of the preprocessed image. A lookup first tries the
+exact key, then accepts a stored image with the same question at most
+`IMAGE_CACHE_MAX_DISTANCE` bits away (0 turns near matches off).
+
+On worksheet-like photos, re-encoded, resized or brightened copies of one
+photo measure 1-10 bits apart while distinct pages measure 30+, so the
+default of 12 stays well clear of serving one page's answer for another.
+The hash is not meant to match re-shot photos: a 2% crop or a 1 degree
+tilt already moves it 70+ bits. `python -m bench.image_cache` measures this.
+
+Vision answers do not depend on the conversation, so unlike the text cache
+there is no context component. Only genuine model answers are stored.
+"""
+import os
+
+from .answer_cache import normalize
+from .ttl_cache import TTLCache
+
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", 500))
+IMAGE_CACHE_TTL = float(os.getenv("IMAGE_CACHE_TTL", 24 * 3600))
+IMAGE_CACHE_MAX_DISTANCE = int(os.getenv("IMAGE_CACHE_MAX_DISTANCE", 12))
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class ImageAnswerCache:
+    def __init__(self, maxsize=IMAGE_CACHE_SIZE, ttl=IMAGE_CACHE_TTL, max_distance=IMAGE_CACHE_MAX_DISTANCE):
+        self.entries = TTLCache(maxsize, ttl)
+        self.max_distance = max_distance
+        self.near_hits = 0
+
+    def get(self, question: str, image):
+        normalized = normalize(question)
+        answer = self.entries.get((normalized, image.dhash))
+        if answer is not None or self.max_distance <= 0:
+            return answer
+
+        best_key, best_distance = None, self.max_distance + 1
+        for key, _ in self.entries.items():
+            if key[0] != normalized:
+                continue
+            distance = hamming(image.dhash, key[1])
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+        if best_key is None:
+            return None
+        self.near_hits += 1
+        return self.entries.get(best_key)
+
+    def put(self, question: str, image, answer: str):
+        self.entries.set((normalize(question), image.dhash), answer)
+
+    def stats(self):
+        stats = self.entries.stats()
+        # A near hit follows a missed exact lookup and then a hit on the
+        # matched key; count it once, as a hit.
+        hits, misses = stats["hits"], stats["misses"] - self.near_hits
+        lookups = hits + misses
+        return {
+            **stats,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "near_hits": self.near_hits,
+            "max_distance": self.max_distance,
+        }
+
+
+image_cache = ImageAnswerCache()
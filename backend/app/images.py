@@ -0,0 +1,163 @@
+"""
+Image preprocessing for the vision route.
+
+Uploads used to be decoded whole and handed to the Gemini SDK as a PIL image,
+which re-encodes it losslessly as PNG at full resolution: a 12 MP phone photo
+became a 20+ MB request. `prepare_*` instead:
+- decodes the base64 payload in chunks, stopping as soon as IMAGE_MAX_BYTES is passed;
+- refuses images over IMAGE_MAX_PIXELS before decoding pixel data (decompression bombs);
+- lets JPEG decode directly at reduced scale (`draft`), applies the EXIF orientation
+  and downsamples so the longest side is at most IMAGE_MAX_DIMENSION;
+- re-encodes as JPEG (or WEBP) at IMAGE_QUALITY;
+- computes a difference hash for the vision answer cache (image_cache.py).
+
+The work is CPU-bound and runs on its own bounded thread pool (Pillow releases
+the GIL while decoding, resizing and encoding).
+"""
+import base64
+import binascii
+import io
+import math
+import os
+import tempfile
+
+from PIL import Image, ImageOps
+
+from .threads import bounded_runner
+
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 10 * 1024 * 1024))
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", 50_000_000))
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", 1536))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 85))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+
+# Longest base64 string that can decode to at most IMAGE_MAX_BYTES, plus room
+# for a "data:image/...;base64," prefix.
+IMAGE_MAX_BASE64_CHARS = (IMAGE_MAX_BYTES + 2) // 3 * 4 + 100
+
+_DECODE_CHUNK = 1024 * 1024  # base64 characters per step; a multiple of 4
+_SPOOL_IN_MEMORY = 2 * 1024 * 1024
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+class ImageRejected(ValueError):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class PreparedImage:
+    """A compact, model-ready encoding of an upload."""
+
+    def __init__(self, data: bytes, mime_type: str, size: tuple, original_size: tuple, original_bytes: int,
+                 dhash: int = 0):
+        self.data = data
+        self.mime_type = mime_type
+        self.size = size
+        self.original_size = original_size
+        self.original_bytes = original_bytes
+        self.dhash = dhash
+
+
+_run = bounded_runner(IMAGE_WORKERS)
+
+
+async def prepare_base64(data: str) -> PreparedImage:
+    """Preprocess a (data-URL or bare) base64 image. Raises ImageRejected."""
+    return await _run(_prepare_base64, data)
+
+
+async def prepare_file(fileobj) -> PreparedImage:
+    """Preprocess an image from a binary file object. Raises ImageRejected."""
+    return await _run(_prepare_file, fileobj)
+
+
+def _prepare_base64(data):
+    with _decode_base64(data) as spool:
+        return _prepare_file(spool)
+
+
+def _decode_base64(data):
+    """Decodes chunk by chunk into a spooled buffer, enforcing IMAGE_MAX_BYTES as it goes."""
+    start = data.find(",", 0, 200) + 1 if data.startswith("data:") else 0
+    spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_IN_MEMORY)
+    written = 0
+    try:
+        for offset in range(start, len(data), _DECODE_CHUNK):
+            chunk = base64.b64decode(data[offset:offset + _DECODE_CHUNK], validate=True)
+            written += len(chunk)
+            if written > IMAGE_MAX_BYTES:
+                raise ImageRejected(f"Image larger than {IMAGE_MAX_BYTES // (1024 * 1024)} MB", 413)
+            spool.write(chunk)
+    except binascii.Error:
+        spool.close()
+        raise ImageRejected("Image is not valid base64")
+    except ImageRejected:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def _prepare_file(fileobj):
+    original_bytes = fileobj.seek(0, io.SEEK_END)
+    fileobj.seek(0)
+    if original_bytes > IMAGE_MAX_BYTES:
+        raise ImageRejected(f"Image larger than {IMAGE_MAX_BYTES // (1024 * 1024)} MB", 413)
+
+    try:
+        image = Image.open(fileobj)  # reads the header only
+    except Image.DecompressionBombError:
+        raise ImageRejected("Image dimensions too large", 413)
+    except (Image.UnidentifiedImageError, OSError):
+        raise ImageRejected("Unsupported or corrupt image")
+    with image:
+        original_size = image.size
+        if image.width * image.height > IMAGE_MAX_PIXELS:
+            raise ImageRejected("Image dimensions too large", 413)
+
+        # JPEG only: decode straight at 1/2, 1/4 or 1/8 scale when that still
+        # leaves at least the final size (same aspect ratio, so the EXIF
+        # rotation applied afterwards does not matter).
+        scale = min(1.0, IMAGE_MAX_DIMENSION / max(image.size))
+        image.draft("RGB", (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+        try:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        except (OSError, SyntaxError, ValueError):
+            raise ImageRejected("Unsupported or corrupt image")
+
+        image = _to_rgb(image)
+        out = io.BytesIO()
+        if IMAGE_FORMAT == "WEBP":
+            image.save(out, "WEBP", quality=IMAGE_QUALITY, method=4)
+        else:
+            image.save(out, "JPEG", quality=IMAGE_QUALITY, optimize=True)
+        return PreparedImage(out.getvalue(), _MIME_TYPES.get(IMAGE_FORMAT, "image/jpeg"),
+                             image.size, original_size, original_bytes, dhash(image))
+
+
+def dhash(image, size: int = 16) -> int:
+    """
+    Difference hash: one bit per horizontally adjacent pixel pair on a
+    (size+1) x size grayscale thumbnail, so size*size bits (256 by default).
+    """
+    pixels = image.convert("L").resize((size + 1, size), Image.Resampling.BOX).tobytes()
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            i = row * (size + 1) + col
+            bits = bits << 1 | (pixels[i] > pixels[i + 1])
+    return bits
+
+
+def _to_rgb(image):
+    if image.mode == "RGB":
+        return image
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        # Screenshots with transparency: flatten onto white, not black.
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return image.convert("RGB")
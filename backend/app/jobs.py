@@ -0,0 +1,354 @@
+"""
+Background jobs: work a request should not wait for.
+
+Endpoints do their essential write (the question, the escalation, the tutor
+answer, the rating) and `enqueue` the rest: push notifications, the dashboard
+counters and the per-user activity rollups (see tasks.py for the handlers).
+`JOB_WORKERS` worker tasks on the event loop run the jobs; handlers that
+touch the database run on the DB executor (`run_db`).
+
+A failed job is retried `JOB_RETRIES` times with jittered exponential
+backoff, then logged and dropped (kept as "dead" in the durable store).
+
+Idempotency: a job enqueued with a `key` is ignored while another job with
+the same key is queued or was done less than `JOB_KEEP_SECONDS` ago. For
+database handlers the key is also written to `job_receipt` in the handler's
+own transaction, so a job that is run twice (a crash between the handler's
+commit and the queue's ack) applies its changes once.
+
+The store is in memory by default: jobs still queued when the process exits
+are lost, which costs at most a missed notification or counter drift until
+the next stats reconcile. Set `JOB_QUEUE_PATH` to a SQLite file to keep them
+across restarts (several processes on one host may share the file).
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+from sqlalchemy import delete
+
+from . import models
+from .database import SessionLocal, run_db
+
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_RETRIES = int(os.getenv("JOB_RETRIES", 5))
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", 0.5))
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", 60))
+JOB_KEEP_SECONDS = float(os.getenv("JOB_KEEP_SECONDS", 24 * 3600))
+# How often an idle worker looks at a shared durable store for jobs queued
+# by other processes.
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1))
+# On shutdown, time allowed for the queued jobs to finish.
+JOB_DRAIN_SECONDS = float(os.getenv("JOB_DRAIN_SECONDS", 5))
+
+
+class Job:
+    def __init__(self, kind: str, payload: dict, key=None, job_id=None, attempts=0):
+        self.id = job_id
+        self.kind = kind
+        self.payload = payload
+        self.key = key
+        self.attempts = attempts
+
+
+class MemoryStore:
+    """Jobs of this process only. Thread-safe: sync endpoints enqueue from the threadpool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = deque()
+        self._delayed = []  # heap of (run_at, seq, job)
+        self._seq = itertools.count()
+        self._keys = {}  # key -> forget at (inf while the job is pending)
+        self.running = 0
+        self.dead = 0
+
+    def put(self, job: Job) -> bool:
+        with self._lock:
+            if job.key is not None:
+                if self._keys.get(job.key, 0) > time.time():
+                    return False
+                self._keys[job.key] = float("inf")
+            self._ready.append(job)
+            return True
+
+    def take(self, now: float):
+        with self._lock:
+            while self._delayed and self._delayed[0][0] <= now:
+                self._ready.append(heapq.heappop(self._delayed)[2])
+            if not self._ready:
+                return None
+            self.running += 1
+            return self._ready.popleft()
+
+    def next_run_at(self):
+        with self._lock:
+            return self._delayed[0][0] if self._delayed else None
+
+    def done(self, job: Job):
+        with self._lock:
+            self.running -= 1
+            if job.key is not None:
+                self._keys[job.key] = time.time() + JOB_KEEP_SECONDS
+
+    def retry(self, job: Job, run_at: float, error: str):
+        with self._lock:
+            self.running -= 1
+            heapq.heappush(self._delayed, (run_at, next(self._seq), job))
+
+    def fail(self, job: Job, error: str):
+        with self._lock:
+            self.running -= 1
+            self.dead += 1
+            self._keys.pop(job.key, None)
+
+    def prune(self, now: float):
+        with self._lock:
+            self._keys = {k: t for k, t in self._keys.items() if t > now}
+
+    def stats(self):
+        with self._lock:
+            return {"queued": len(self._ready) + len(self._delayed), "running": self.running, "dead": self.dead}
+
+
+class SQLiteStore:
+    """Jobs in a local SQLite file: survive restarts, shared by the processes on one host."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS job (
+                id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                key TEXT UNIQUE,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                run_at REAL NOT NULL,
+                finished_at REAL,
+                error TEXT
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_job_status_run_at ON job (status, run_at)")
+        # Jobs that were running when a process stopped run again (one running in
+        # another process may run twice; receipts keep DB handlers to one effect).
+        self._conn.execute("UPDATE job SET status = 'queued' WHERE status = 'running'")
+
+    def put(self, job: Job) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO job (kind, payload, key, run_at) VALUES (?, ?, ?, ?)",
+                (job.kind, json.dumps(job.payload), job.key, time.time()))
+            return cursor.rowcount == 1
+
+    def take(self, now: float):
+        with self._lock:
+            while True:
+                row = self._conn.execute(
+                    "SELECT id, kind, payload, key, attempts FROM job WHERE status = 'queued' AND run_at <= ? "
+                    "ORDER BY run_at LIMIT 1", (now,)).fetchone()
+                if row is None:
+                    return None
+                # Another process may have taken it since the SELECT.
+                claimed = self._conn.execute(
+                    "UPDATE job SET status = 'running' WHERE id = ? AND status = 'queued'", (row[0],)).rowcount
+                if claimed:
+                    return Job(row[1], json.loads(row[2]), key=row[3], job_id=row[0], attempts=row[4])
+
+    def next_run_at(self):
+        with self._lock:
+            return self._conn.execute("SELECT MIN(run_at) FROM job WHERE status = 'queued'").fetchone()[0]
+
+    def done(self, job: Job):
+        with self._lock:
+            self._conn.execute("UPDATE job SET status = 'done', finished_at = ? WHERE id = ?", (time.time(), job.id))
+
+    def retry(self, job: Job, run_at: float, error: str):
+        with self._lock:
+            self._conn.execute("UPDATE job SET status = 'queued', attempts = ?, run_at = ?, error = ? WHERE id = ?",
+                               (job.attempts, run_at, error, job.id))
+
+    def fail(self, job: Job, error: str):
+        # The key is released so the same work can be enqueued again.
+        with self._lock:
+            self._conn.execute("UPDATE job SET status = 'dead', attempts = ?, key = NULL, finished_at = ?, error = ? "
+                               "WHERE id = ?", (job.attempts, time.time(), error, job.id))
+
+    def prune(self, now: float):
+        with self._lock:
+            self._conn.execute("DELETE FROM job WHERE status IN ('done', 'dead') AND finished_at < ?",
+                               (now - JOB_KEEP_SECONDS,))
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM job WHERE status IN ('queued', 'running', 'dead') "
+                                             "GROUP BY status").fetchall())
+        return {"queued": counts.get("queued", 0), "running": counts.get("running", 0), "dead": counts.get("dead", 0)}
+
+
+def _backoff(attempts: int) -> float:
+    return random.uniform(0, min(JOB_RETRY_MAX_DELAY, JOB_RETRY_BASE_DELAY * 2 ** attempts))
+
+
+class JobQueue:
+    def __init__(self, store, workers: int = JOB_WORKERS):
+        self.store = store
+        self.workers = workers
+        self._handlers = {}
+        self._loop = None
+        self._wake = None
+        self._tasks = []
+        self._idle = None
+        self._next_prune = 0.0
+        self.enqueued = 0
+        self.duplicates = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def handler(self, kind: str, db: bool = True):
+        """
+        Registers the handler for `kind`. With db=True the handler is a plain
+        function `fn(db, **payload)` run on the DB executor: it makes its
+        changes without committing, the queue commits them together with the
+        job's receipt. With db=False it is a coroutine function `fn(**payload)`.
+        """
+        def register(fn):
+            self._handlers[kind] = (fn, db)
+            return fn
+        return register
+
+    def enqueue(self, kind: str, key: str = None, **payload) -> bool:
+        """
+        Queues a job; safe to call from any thread. Returns False if a job with
+        the same key is queued or recently done. The payload must be JSON.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"No handler for job {kind!r}")
+        if not self.store.put(Job(kind, payload, key=key)):
+            self.duplicates += 1
+            return False
+        self.enqueued += 1
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        return True
+
+    async def start(self):
+        """Starts the workers on the running loop (jobs enqueued before this wait for it)."""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._idle = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def aclose(self, timeout: float = JOB_DRAIN_SECONDS):
+        """Gives queued jobs up to `timeout` seconds to finish, then stops the workers."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Job queue stopped with work left: {self.store.stats()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+
+    async def join(self):
+        """Waits until nothing is queued (retries included) or running."""
+        async with self._idle:
+            await self._idle.wait_for(lambda: not any(self.store.stats()[s] for s in ("queued", "running")))
+
+    async def _notify_idle(self):
+        async with self._idle:
+            self._idle.notify_all()
+
+    async def _work(self):
+        while True:
+            now = time.time()
+            if now >= self._next_prune:
+                self._next_prune = now + min(JOB_KEEP_SECONDS, 3600)
+                await self._prune(now)
+
+            self._wake.clear()
+            job = self.store.take(now)
+            if job is None:
+                await self._notify_idle()
+                run_at = self.store.next_run_at()
+                timeout = JOB_POLL_SECONDS if run_at is None else min(max(run_at - now, 0), JOB_POLL_SECONDS)
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Job):
+        fn, uses_db = self._handlers[job.kind]
+        try:
+            if uses_db:
+                await run_db(self._run_in_transaction, fn, job)
+            else:
+                await fn(**job.payload)
+        except Exception as e:
+            job.attempts += 1
+            error = f"{type(e).__name__}: {e}"
+            if job.attempts > JOB_RETRIES:
+                self.failed += 1
+                self.store.fail(job, error)
+                print(f"Job {job.kind} {job.key or ''} failed after {job.attempts} attempts: {error}")
+            else:
+                self.retried += 1
+                self.store.retry(job, time.time() + _backoff(job.attempts), error)
+        else:
+            self.completed += 1
+            self.store.done(job)
+
+    @staticmethod
+    def _run_in_transaction(fn, job: Job):
+        db = SessionLocal()
+        try:
+            if job.key is not None:
+                if db.get(models.JobReceipt, job.key) is not None:
+                    return  # applied by an earlier run
+                db.add(models.JobReceipt(key=job.key, done_at=models.now()))
+            fn(db, **job.payload)
+            db.commit()
+        finally:
+            db.close()
+
+    async def _prune(self, now: float):
+        self.store.prune(now)
+        try:
+            await run_db(_prune_receipts)
+        except Exception as e:
+            print(f"Job receipt prune failed: {e}")
+
+    def stats(self):
+        return {"store": "sqlite" if isinstance(self.store, SQLiteStore) else "memory", "workers": len(self._tasks),
+                "enqueued": self.enqueued, "duplicates": self.duplicates, "completed": self.completed,
+                "retried": self.retried, "failed": self.failed, **self.store.stats()}
+
+
+def _prune_receipts():
+    cutoff = models.now() - timedelta(seconds=JOB_KEEP_SECONDS)
+    db = SessionLocal()
+    try:
+        db.execute(delete(models.JobReceipt).where(models.JobReceipt.done_at < cutoff))
+        db.commit()
+    finally:
+        db.close()
+
+
+queue = JobQueue(SQLiteStore(JOB_QUEUE_PATH) if JOB_QUEUE_PATH else MemoryStore())
@@ -0,0 +1,223 @@
+"""
+Long-lived model provider clients.
+
+Building an `AsyncInferenceClient` or `genai.Client` per question meant a
+fresh SSL context, TCP connect and TLS handshake every time. The registry
+below creates each provider client once, backed by a keep-alive connection
+pool, and hands the same instance to every request. A client is rebuilt when
+its API key or endpoint changes, after repeated consecutive errors, or
+after serving `LLM_CLIENT_MAX_REQUESTS` calls; the retired instance is closed
+after a grace period so calls still using it can finish.
+"""
+import asyncio
+import contextvars
+import os
+
+import httpx
+import httpx2
+from huggingface_hub import AsyncInferenceClient, set_async_client_factory
+
+try:
+    from google import genai
+except ImportError:
+    genai = None
+
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", 100))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", 60))
+LLM_CLIENT_MAX_ERRORS = int(os.getenv("LLM_CLIENT_MAX_ERRORS", 5))
+LLM_CLIENT_MAX_REQUESTS = int(os.getenv("LLM_CLIENT_MAX_REQUESTS", 5000))
+LLM_CLIENT_RETIRE_GRACE = float(os.getenv("LLM_CLIENT_RETIRE_GRACE", 300))
+
+HUGGINGFACE = "huggingface"
+GEMINI = "gemini"
+LOCAL = "local"  # OpenAI-compatible server on our side (providers.py fallback)
+
+# The provider whose AsyncInferenceClient is asking huggingface_hub for an
+# HTTP client. The hub calls the factory on a client's first request, from
+# the task that just got that client from the registry (see _get).
+_hub_provider = contextvars.ContextVar("hub_provider", default=HUGGINGFACE)
+
+
+async def _read_error_body(response):
+    # huggingface_hub raises from the response body; read it in (when it is
+    # small) before a streamed error response reaches its raise_for_status.
+    # Ours rather than the hub's own hook, which is private (utils._http).
+    if response.status_code < 400:
+        return
+    try:
+        small = int(response.headers["content-length"]) < 1_000_000
+    except (KeyError, ValueError):
+        return
+    if small:
+        await response.aread()
+
+
+class PoolStats:
+    """Counts requests vs. newly opened connections for one provider."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.clients_created = 0
+        self.resets = {"key_rotation": 0, "endpoint_change": 0, "errors": 0, "recycled": 0, "manual": 0}
+
+    async def _trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    async def on_request(self, request):
+        self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connections_reused": max(self.requests - self.connections_opened, 0),
+            "clients_created": self.clients_created,
+            "resets": dict(self.resets),
+        }
+
+
+def _pool_limits(httpx_module):
+    return httpx_module.Limits(
+        max_connections=LLM_POOL_SIZE,
+        max_keepalive_connections=LLM_POOL_SIZE,
+        keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+    )
+
+
+class _Entry:
+    def __init__(self, client, api_key, closers):
+        self.client = client
+        self.api_key = api_key
+        self.base_url = None
+        self.closers = closers
+        self.uses = 0
+        self.errors = 0
+
+
+class ClientRegistry:
+    def __init__(self):
+        self._entries = {}
+        self.stats = {HUGGINGFACE: PoolStats(), GEMINI: PoolStats(), LOCAL: PoolStats()}
+        # AsyncInferenceClient asks huggingface_hub's factory for its HTTP
+        # client, so route that through our pooled, instrumented one. Each
+        # client (huggingface, local) gets a pool of its own.
+        set_async_client_factory(self._hf_http_client)
+
+    def _hf_http_client(self):
+        stats = self.stats[_hub_provider.get()]
+        return httpx2.AsyncClient(
+            event_hooks={
+                "request": [stats.on_request],
+                "response": [_read_error_body],
+            },
+            follow_redirects=True,
+            timeout=None,
+            limits=_pool_limits(httpx2),
+        )
+
+    def _build_huggingface(self, api_key, base_url):
+        client = AsyncInferenceClient(api_key=api_key, base_url=base_url)
+        return _Entry(client, api_key, [client.close])
+
+    def _build_gemini(self, api_key, base_url):
+        stats = self.stats[GEMINI]
+        http_client = httpx.AsyncClient(
+            event_hooks={"request": [stats.on_request]},
+            timeout=None,
+            limits=_pool_limits(httpx),
+        )
+        options = genai.types.HttpOptions(base_url=base_url, httpx_async_client=http_client)
+        client = genai.Client(api_key=api_key, http_options=options)
+        return _Entry(client, api_key, [client.aio.aclose, http_client.aclose])
+
+    def _get(self, provider, api_key, builder, base_url):
+        _hub_provider.set(provider)
+        entry = self._entries.get(provider)
+        if entry is not None:
+            if entry.api_key != api_key:
+                self._retire(provider, "key_rotation")
+            elif entry.base_url != base_url:
+                self._retire(provider, "endpoint_change")
+            elif entry.uses >= LLM_CLIENT_MAX_REQUESTS:
+                self._retire(provider, "recycled")
+            else:
+                entry.uses += 1
+                return entry.client
+
+        entry = builder(api_key, base_url)
+        entry.base_url = base_url
+        entry.uses = 1
+        self._entries[provider] = entry
+        self.stats[provider].clients_created += 1
+        return entry.client
+
+    def huggingface(self, api_key, base_url=None):
+        return self._get(HUGGINGFACE, api_key, self._build_huggingface, base_url)
+
+    def gemini(self, api_key, base_url=None):
+        return self._get(GEMINI, api_key, self._build_gemini, base_url)
+
+    def local(self, base_url):
+        # Same chat-completion client as Hugging Face, with its own HTTP pool
+        # and connection stats.
+        return self._get(LOCAL, "local", self._build_huggingface, base_url)
+
+    def report_success(self, provider):
+        entry = self._entries.get(provider)
+        if entry is not None:
+            entry.errors = 0
+
+    def report_error(self, provider):
+        """Count a failed call; drop the client after too many in a row."""
+        entry = self._entries.get(provider)
+        if entry is None:
+            return
+        entry.errors += 1
+        if entry.errors >= LLM_CLIENT_MAX_ERRORS:
+            self._retire(provider, "errors")
+
+    def reset(self, provider=None):
+        for name in [provider] if provider else list(self._entries):
+            self._retire(name, "manual")
+
+    def _retire(self, provider, reason):
+        entry = self._entries.pop(provider, None)
+        if entry is None:
+            return
+        self.stats[provider].resets[reason] += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # no loop to close on; the process is shutting down
+        loop.call_later(LLM_CLIENT_RETIRE_GRACE, lambda: loop.create_task(_close(entry)))
+
+    async def aclose(self):
+        entries, self._entries = list(self._entries.values()), {}
+        for entry in entries:
+            await _close(entry)
+
+    def metrics(self):
+        result = {}
+        for name, stats in self.stats.items():
+            entry = self._entries.get(name)
+            result[name] = {
+                **stats.as_dict(),
+                "pool_size": LLM_POOL_SIZE,
+                "client_uses": entry.uses if entry else 0,
+                "consecutive_errors": entry.errors if entry else 0,
+            }
+        return result
+
+
+async def _close(entry):
+    for closer in entry.closers:
+        try:
+            await closer()
+        except Exception as e:
+            print(f"Client close failed: {e}")
+
+
+registry = ClientRegistry()
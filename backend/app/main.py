@@ -1,26 +1,91 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, File, Form, Header, HTTPException, Query, UploadFile, WebSocket, WebSocketDisconnect, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session, joinedload
-from passlib.context import CryptContext
+from sqlalchemy import func
+from sqlalchemy.orm import Session, contains_eager, joinedload, selectinload
 from jose import JWTError, jwt
+from anyio import CancelScope, create_task_group
 from datetime import datetime, timedelta, timezone
 from typing import List, Optional
+from contextlib import asynccontextmanager
 import os
+import json
+import secrets
+import asyncio
 from dotenv import load_dotenv
 
-from . import models, schemas, nlp_engine
-from .database import engine, get_db
+from . import models, schemas, admin_users, context, nlp_engine, images, llm_clients, metrics, notifications, pagination, passwords, principals, providers, search, stats, tasks, tutor_queue
+from .answer_cache import answer_cache
+from .image_cache import image_cache
+from .body_limit import BodySizeLimitMiddleware
+from .database import engine, read_engine, get_db, get_read_db, run_db, SessionLocal
+from .jobs import JOB_DRAIN_SECONDS, queue as job_queue
 
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 1440))
+# Characters of the first question shown for each session in GET /sessions.
+SESSION_PREVIEW_CHARS = 120
 
+# Schema is managed by Alembic (backend/migrations): run `alembic upgrade head`.
 
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="Real-Time Doubt Solving Chatbot")
+def _reconcile_stats():
+    db = SessionLocal()
+    try:
+        drift = stats.reconcile(db)
+        if drift:
+            print(f"Stats counters corrected: {drift}")
+        corrected = tasks.reconcile_rollups(db)
+        if corrected:
+            print(f"Activity rollups corrected: {corrected}")
+        return drift
+    finally:
+        db.close()
+
+
+async def _reconcile_stats_after_jobs():
+    """_reconcile_stats once the queued counter and rollup jobs have applied; None if they didn't in time."""
+    if not await tasks.drained():
+        print(f"Stats reconcile skipped: jobs still queued after {JOB_DRAIN_SECONDS}s")
+        return None
+    return await run_db(_reconcile_stats)
+
+
+async def _reconcile_stats_in_background():
+    # Once at startup, then every STATS_RECONCILE_SECONDS (if > 0). It scans
+    # whole tables, so it runs beside the app instead of delaying startup.
+    while True:
+        try:
+            await _reconcile_stats_after_jobs()
+        except Exception as e:
+            print(f"Stats reconcile failed: {e}")
+        if stats.STATS_RECONCILE_SECONDS <= 0:
+            return
+        await asyncio.sleep(stats.STATS_RECONCILE_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await job_queue.start()
+    reconciler = asyncio.create_task(_reconcile_stats_in_background())
+    yield
+    reconciler.cancel()
+    await job_queue.aclose()
+    await llm_clients.registry.aclose()
+    await notifications.broker.aclose()
+
+
+app = FastAPI(title="Real-Time Doubt Solving Chatbot", lifespan=lifespan)
+
+
+# Refuse oversized bodies before they are read and JSON-parsed: an image at
+# the IMAGE_MAX_BYTES limit (base64-encoded) plus room for the question.
+# Added before CORS so that 413 responses still carry the CORS headers.
+REQUEST_MAX_BYTES = int(os.getenv("REQUEST_MAX_BYTES", images.IMAGE_MAX_BASE64_CHARS + 64 * 1024))
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=REQUEST_MAX_BYTES)
 
 
 origins = ["http://localhost:3000", "https://chatbot-ochre-tau-10.vercel.app"]
@@ -33,11 +98,14 @@ app.add_middleware(
 )
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+# Outermost, so request timings include the other middleware.
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engine(engine)
+if read_engine is not engine:
+    metrics.instrument_engine(read_engine)
 
-def verify_password(plain, hashed): return pwd_context.verify(plain, hashed)
-def get_password_hash(password): return pwd_context.hash(password)
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -45,8 +113,7 @@ def create_access_token(data: dict):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-  
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def _decode_token(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -54,20 +121,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         if email is None: raise HTTPException(status_code=401, detail="Invalid token")
     except JWTError:
         raise HTTPException(status_code=401, detail="Could not validate credentials")
+    return role, email, payload.get("uid")
 
-    user = None
-    if role == "student":
-        user = db.query(models.Student).filter(models.Student.email == email).first()
-    elif role == "tutor":
-        user = db.query(models.Tutor).filter(models.Tutor.email == email).first()
-    elif role == "admin":
-        user = db.query(models.Admin).filter(models.Admin.email == email).first()
-    
+  
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """The caller as a read-only principals.Principal, served from a short TTL cache."""
+    with metrics.span("auth"):
+        role, email, uid = _decode_token(token)
+        user = await principals.resolve(role, email, uid)
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
-    
-
-    user.role = role 
     return user
 
 @app.get("/")
@@ -78,15 +141,12 @@ def read_root():
         "docs": "/docs"
     }
 
-@app.post("/register/{role}", response_model=schemas.UserResponse)
-def register_user(role: str, user_data: schemas.UserCreate, db: Session = Depends(get_db)):
-    hashed_pw = get_password_hash(user_data.password)
-    
+def _create_user(db: Session, role: str, user_data: schemas.UserCreate, hashed_pw: str):
     if role == "student":
         if db.query(models.Student).filter(models.Student.email == user_data.email).first():
             raise HTTPException(status_code=400, detail="Email registered")
         new_user = models.Student(name=user_data.name, email=user_data.email, password=hashed_pw)
-        db.add(new_user); db.commit(); db.refresh(new_user)
+        db.add(new_user); stats.bump(db, stats.TOTAL_STUDENTS); db.commit(); db.refresh(new_user)
         return {"id": new_user.student_id, "name": new_user.name, "email": new_user.email, "role": "student"}
 
     elif role == "tutor":
@@ -94,7 +154,7 @@ def register_user(role: str, user_data: schemas.UserCreate, db: Session = Depend
             raise HTTPException(status_code=400, detail="Email registered")
         if not user_data.subject: user_data.subject = "General"
         new_user = models.Tutor(name=user_data.name, email=user_data.email, password=hashed_pw, subject=user_data.subject)
-        db.add(new_user); db.commit(); db.refresh(new_user)
+        db.add(new_user); stats.bump(db, stats.TOTAL_TUTORS); db.commit(); db.refresh(new_user)
         return {"id": new_user.tutor_id, "name": new_user.name, "email": new_user.email, "role": "tutor"}
 
     elif role == "admin":
@@ -103,119 +163,357 @@ def register_user(role: str, user_data: schemas.UserCreate, db: Session = Depend
         new_user = models.Admin(name=user_data.name, email=user_data.email, password=hashed_pw)
         db.add(new_user); db.commit(); db.refresh(new_user)
         return {"id": new_user.admin_id, "name": new_user.name, "email": new_user.email, "role": "admin"}
-    
-    else:
+
+
+@app.post("/register/{role}", response_model=schemas.UserResponse)
+async def register_user(role: str, user_data: schemas.UserCreate, db: Session = Depends(get_db)):
+    if role not in principals.USER_MODELS:
         raise HTTPException(status_code=400, detail="Invalid role. Use 'student', 'tutor', or 'admin'.")
+    with metrics.span("password"):
+        hashed_pw = await passwords.hash_password(user_data.password)
+    created = await run_db(_create_user, db, role, user_data, hashed_pw)
+    if role == "tutor":
+        tutor_queue.forget_subjects()
+    return created
 
 @app.post("/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     email = form_data.username
     password = form_data.password
-    
-
-    student = db.query(models.Student).filter(models.Student.email == email).first()
-    if student and verify_password(password, student.password):
-        token = create_access_token(data={"sub": email, "role": "student"})
-        return {"access_token": token, "token_type": "bearer", "role": "student"}
-
-    tutor = db.query(models.Tutor).filter(models.Tutor.email == email).first()
-    if tutor and verify_password(password, tutor.password):
-        token = create_access_token(data={"sub": email, "role": "tutor"})
-        return {"access_token": token, "token_type": "bearer", "role": "tutor"}
 
-
-    admin = db.query(models.Admin).filter(models.Admin.email == email).first()
-    if admin and verify_password(password, admin.password):
-        token = create_access_token(data={"sub": email, "role": "admin"})
-        return {"access_token": token, "token_type": "bearer", "role": "admin"}
+    # One lookup across all three account tables; bcrypt then runs once per
+    # matching account (normally exactly one) instead of once per table.
+    for role, user_id, hashed in await run_db(principals.find_accounts, db, email):
+        with metrics.span("password"):
+            matches, new_hash = await passwords.verify_and_update(password, hashed)
+        if matches:
+            if new_hash: await run_db(principals.store_password_hash, db, role, user_id, new_hash)
+            token = create_access_token(data={"sub": email, "role": role, "uid": user_id})
+            return {"access_token": token, "token_type": "bearer", "role": role}
 
     raise HTTPException(status_code=401, detail="Incorrect credentials")
 
 
 
-@app.post("/query", response_model=schemas.QueryResponse)
-def submit_query(
-    query_in: schemas.QueryCreate, 
-    user: models.Student = Depends(get_current_user), 
-    db: Session = Depends(get_db)
-):
+def _load_context(user: models.Student, db: Session):
+    """
+    Returns the student's active session id (None if there is none yet) and
+    its model context: the rolling summary plus the turns since, fitted to
+    context.CONTEXT_TOKEN_BUDGET (see context.py). The session, its
+    unsummarized turns and their answers come back in a single statement.
+    All of them, not just a window: turns that no longer fit are folded into
+    the summary, so after the first request they are at most
+    context.CONTEXT_WINDOW plus the new one.
+    """
     if user.role != "student":
         raise HTTPException(status_code=403, detail="Only students can ask queries")
 
-    session = db.query(models.Session).filter(
+    recent_queries = db.query(models.Query).join(models.Session).filter(
         models.Session.student_id == user.student_id, 
-        models.Session.ended_at == None
-    ).first()
+        models.Session.ended_at == None,
+        models.Query.query_id > func.coalesce(models.Session.summary_through, 0)
+    ).options(contains_eager(models.Query.session), joinedload(models.Query.answers))\
+        .order_by(models.Query.timestamp.desc(), models.Query.query_id.desc()).all()
 
-    if not session:
-        session = models.Session(student_id=user.student_id)
-        db.add(session); db.commit(); db.refresh(session)
-
-    recent_queries = db.query(models.Query).filter(
-        models.Query.session_id == session.session_id
-    ).order_by(models.Query.timestamp.desc()).limit(3).all()
+    if recent_queries:
+        session = recent_queries[0].session
+    else:
+        session = db.query(models.Session).filter(
+            models.Session.student_id == user.student_id,
+            models.Session.ended_at == None
+        ).first()
+    if session is None:
+        db.commit()
+        return None, []
 
-    context_history = []
+    turns = []
     for q in reversed(recent_queries):
-        context_history.append({"is_user": True, "content": q.content})
-        ans = db.query(models.Answer).filter(models.Answer.query_id == q.query_id).first()
-        if ans:
-            context_history.append({"is_user": False, "content": ans.content})
-  
+        if q.status == "failed":
+            continue  # no model answer; leave it out of the conversation
+        first = min(q.answers, key=lambda a: a.answer_id) if q.answers else None
+        turns.append((q.query_id, q.content, first.content if first else ""))
+
+    summary, folded_through, turns = context.fit(session.summary, turns)
+    # Failed queries older than the raw turns have nothing to fold; move the
+    # mark past them as well, so they are not loaded again.
+    oldest_kept = turns[0][0] if turns else float("inf")
+    skipped = [q.query_id for q in recent_queries if q.status == "failed" and q.query_id < oldest_kept]
+    folded_through = max([folded_through or 0, *skipped]) or None
+    if folded_through is not None:
+        session.summary = summary
+        session.summary_through = folded_through
+
+    # Hand the connection back to the pool before the model call.
+    db.commit()
+    return session.session_id, context.as_history(summary, turns)
 
 
-    new_query = models.Query(session_id=session.session_id, content=query_in.content, status="answered")
-    db.add(new_query); db.commit(); db.refresh(new_query)
+def _record_exchange(db: Session, student_id: int, session_id: Optional[int], content: str, ai_text: Optional[str], is_cached: int = 0):
+    """
+    Stores the question and its AI answer (and the session, if new) in one
+    transaction. With no answer (ai_text None: every model failed) the query
+    is stored with status "failed" and no Answer row; answer_data is None.
+    """
+    now = models.now()
+    new_query = models.Query(content=content, status="answered" if ai_text is not None else "failed", timestamp=now)
+    if session_id is None:
+        new_query.session = models.Session(student_id=student_id, started_at=now)
+    else:
+        new_query.session_id = session_id
+    db.add(new_query)
 
+    new_answer = None
+    if ai_text is not None:
+        new_answer = models.Answer(query=new_query, content=ai_text, is_ai=1, is_cached=is_cached, timestamp=now)
+        db.add(new_answer)
+    db.commit()
+    tasks.query_recorded(new_query.query_id, student_id)
 
-    ai_text = nlp_engine.generate_answer(
-        query_in.content, 
-        query_in.image, 
-        context_history  
-    )
+    query_data = {"query_id": new_query.query_id, "content": new_query.content, "status": new_query.status, "timestamp": new_query.timestamp}
+    answer_data = new_answer and {"answer_id": new_answer.answer_id, "content": ai_text, "tutor_id": None, "timestamp": new_answer.timestamp, "is_cached": is_cached}
+    return query_data, answer_data
+
+
+async def _prepare_image(image_base64: Optional[str]):
+    """Downscaled, re-encoded upload (see images.py), or None for text questions."""
+    if not image_base64: return None
+    try:
+        with metrics.span("image"):
+            return await images.prepare_base64(image_base64)
+    except images.ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+async def _prepare_upload(upload: Optional[UploadFile]):
+    """Same as _prepare_image, straight from the multipart part's spooled file."""
+    if upload is None: return None
+    try:
+        with metrics.span("image"):
+            return await images.prepare_file(upload.file)
+    except images.ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    finally:
+        await upload.close()
+
+
+async def _answer_query(user, db: Session, content: str, image):
+    # DB work goes through the bounded DB executor; the model call itself is
+    # awaited on the event loop and holds no thread (or connection) while it runs.
+    with metrics.span("context"):
+        session_id, context_history = await run_db(_load_context, user, db)
+
+    with metrics.span("cache"):
+        ai_text = image_cache.get(content, image) if image else answer_cache.get(content, context_history)
+    is_cached = int(ai_text is not None)
+    error = None
+    if ai_text is None:
+        try:
+            ai_text = await nlp_engine.generate_answer(
+                content, 
+                image, 
+                context_history  
+            )
+        except providers.ProviderUnavailable as e:
+            error = str(e)
     
-    new_answer = models.Answer(
-        query_id=new_query.query_id, 
-        content=ai_text, 
-        is_ai=1
+    with metrics.span("save"):
+        query_data, answer_data = await run_db(
+            _record_exchange, db, user.student_id, session_id, content, ai_text, is_cached
+        )
+    if error:
+        # Stored as a failed query (so it can still be escalated), not as an answer.
+        return JSONResponse(jsonable_encoder({**query_data, "answers": [], "error": error}), status_code=503)
+    return {**query_data, "answers": [answer_data]}
+
+
+@app.post("/query", response_model=schemas.QueryResponse)
+async def submit_query(
+    query_in: schemas.QueryCreate, 
+    user: models.Student = Depends(get_current_user), 
+    db: Session = Depends(get_db)
+):
+    image = await _prepare_image(query_in.image)
+    return await _answer_query(user, db, query_in.content, image)
+
+
+@app.post("/query/upload", response_model=schemas.QueryResponse)
+async def submit_query_upload(
+    content: str = Form(...),
+    image: Optional[UploadFile] = File(None),
+    user: models.Student = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    /query with the image as a multipart file part: no base64 inflation on the
+    wire, and the bytes go from the spooled upload straight to the decoder.
+    """
+    image = await _prepare_upload(image)
+    return await _answer_query(user, db, content, image)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+async def _stream_query(user, db: Session, content: str, image):
+    with metrics.span("context"):
+        session_id, context_history = await run_db(_load_context, user, db)
+    student_id = user.student_id
+    with metrics.span("cache"):
+        cached_text = image_cache.get(content, image) if image else answer_cache.get(content, context_history)
+
+    def save_exchange(ai_text):
+        write_db = SessionLocal()
+        try:
+            return _record_exchange(write_db, student_id, session_id, content, ai_text, int(cached_text is not None))
+        finally:
+            write_db.close()
+
+    async def cached_chunks():
+        yield cached_text
+
+    async def event_stream():
+        chunks = []
+        finished = False
+        error = None
+        done_event = None
+        try:
+            chunks_source = cached_chunks() if cached_text is not None \
+                else nlp_engine.stream_answer(content, image, context_history)
+            async for chunk in chunks_source:
+                chunks.append(chunk)
+                yield _sse("token", {"content": chunk})
+            finished = True
+        except providers.ProviderUnavailable as e:
+            error = str(e)
+        finally:
+            # The request-scoped session may already be closed while streaming,
+            # so the exchange is written with a session of its own. A client that
+            # disconnects early still gets whatever was generated persisted.
+            # A failed model call (even mid-answer) is stored as a failed query.
+            if chunks or error:
+                with CancelScope(shield=True), metrics.span("save"):
+                    query_data, answer_data = await run_db(save_exchange, None if error else "".join(chunks))
+                done_event = {**query_data, "answers": [answer_data] if answer_data else []}
+        if error:
+            yield _sse("error", {**done_event, "error": error})
+        elif finished:
+            yield _sse("done", done_event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    db.add(new_answer); db.commit()
 
-    return {
-        "query_id": new_query.query_id,
-        "content": new_query.content,
-        "status": new_query.status,
-        "timestamp": new_query.timestamp,
-        "answers": [{"answer_id": new_answer.answer_id, "content": ai_text, "tutor_id": None, "timestamp": new_answer.timestamp}]
-    }
+
+@app.post("/query/stream")
+async def submit_query_stream(
+    query_in: schemas.QueryCreate,
+    user: models.Student = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Server-Sent Events variant of /query: one `token` event per model chunk,
+    then `done` with the stored query and answer (same shape as /query).
+    """
+    image = await _prepare_image(query_in.image)
+    return await _stream_query(user, db, query_in.content, image)
+
+
+@app.post("/query/upload/stream")
+async def submit_query_upload_stream(
+    content: str = Form(...),
+    image: Optional[UploadFile] = File(None),
+    user: models.Student = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Server-Sent Events variant of /query/upload."""
+    image = await _prepare_upload(image)
+    return await _stream_query(user, db, content, image)
+
 
 
 @app.post("/escalate/{query_id}")
-def escalate_query(query_id: int, user: models.Student = Depends(get_current_user), db: Session = Depends(get_db)):
+def escalate_query(query_id: int, subject: Optional[str] = None, user: models.Student = Depends(get_current_user), db: Session = Depends(get_db)):
     if user.role != "student": raise HTTPException(status_code=403, detail="Forbidden")
+    subject = tutor_queue.route(db, subject)
 
-    query = db.query(models.Query).filter(models.Query.query_id == query_id).first()
+    query = db.query(models.Query).filter(models.Query.query_id == query_id).with_for_update().first()
     if not query: raise HTTPException(status_code=404, detail="Query not found")
+    # Already queued: a second escalation would put the question in front of two tutors.
+    if query.status == "escalated": return {"message": "Query is already waiting for a tutor."}
 
-    query.status = "escalated"
-    esc = models.Escalation(query_id=query_id)
+    old_status, query.status = query.status, "escalated"
+    esc = models.Escalation(query=query, subject=subject)
     db.add(esc)
     db.commit()
 
-    return {"message": "Query escalated to human tutor successfully."}
+    # Counters and the tutors' push go through the job queue (tasks.py).
+    tasks.query_escalated(esc.escalation_id, old_status)
+    tasks.notify(notifications.tutor_channel(esc.subject), {"type": "escalation", "item": tutor_queue.as_item(esc, None)})
+
+    return {"message": "Query escalated to human tutor successfully.", "subject": esc.subject}
+
+
+@app.get("/subjects", response_model=List[str])
+async def list_subjects(user: models.Student = Depends(get_current_user)):
+    """Subjects a student can escalate to (see tutor_queue.route)."""
+    return await tutor_queue.subjects()
 
 
+def _announce_taken(escalations):
+    """Tell the other tutors these escalations are no longer up for grabs."""
+    by_subject = {}
+    for esc in escalations:
+        by_subject.setdefault(esc.subject, []).append(esc.escalation_id)
+    for subject, ids in by_subject.items():
+        tasks.notify(notifications.tutor_channel(subject), {"type": "escalation_taken", "escalation_ids": ids})
+
+@app.get("/tutor/pending", response_model=schemas.QueuePage)
+def get_pending_queries(
+    cursor: Optional[str] = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    user: models.Tutor = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Open escalations for the tutor's subject, oldest first. Others' live claims are hidden."""
+    if user.role != "tutor": raise HTTPException(status_code=403, detail="Forbidden")
+    escalations, next_cursor = tutor_queue.pending(db, user, cursor, limit)
+    return {"items": [tutor_queue.as_item(e, user.tutor_id) for e in escalations], "next_cursor": next_cursor}
+
+@app.post("/tutor/claim", response_model=List[schemas.QueueItem])
+def claim_queries(
+    limit: int = Query(1, ge=1, le=tutor_queue.MAX_CLAIM_BATCH),
+    user: models.Tutor = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Claim up to `limit` more of the oldest open escalations; returns all of the caller's live claims."""
+    if user.role != "tutor": raise HTTPException(status_code=403, detail="Forbidden")
+    claimed = tutor_queue.claim(db, user, limit)
+    _announce_taken(claimed)
+    return [tutor_queue.as_item(e, user.tutor_id) for e in claimed]
 
-@app.get("/tutor/pending")
-def get_pending_queries(user: models.Tutor = Depends(get_current_user), db: Session = Depends(get_db)):
+@app.post("/tutor/release/{escalation_id}")
+def release_query(escalation_id: int, user: models.Tutor = Depends(get_current_user), db: Session = Depends(get_db)):
     if user.role != "tutor": raise HTTPException(status_code=403, detail="Forbidden")
-    queries = db.query(models.Query).filter(models.Query.status == "escalated").all()
-    return queries
+    esc = tutor_queue.release(db, user, escalation_id)
+    if esc is None: raise HTTPException(status_code=404, detail="No active claim on this escalation")
+    tasks.notify(notifications.tutor_channel(esc.subject), {"type": "escalation", "item": tutor_queue.as_item(esc, None)})
+    return {"message": "Released back to the queue"}
 
 @app.post("/tutor/answer")
 def tutor_answer(data: schemas.TutorAnswerCreate, user: models.Tutor = Depends(get_current_user), db: Session = Depends(get_db)):
     if user.role != "tutor": raise HTTPException(status_code=403, detail="Forbidden")
 
+    # Row lock: concurrent status changes must not double-count.
+    query = db.query(models.Query).filter(models.Query.query_id == data.query_id).with_for_update().first()
+    if not query: raise HTTPException(status_code=404, detail="Query not found")
+
+    esc = db.query(models.Escalation).filter(models.Escalation.query_id == data.query_id, models.Escalation.status == "pending")\
+        .with_for_update().first()
+    if esc and tutor_queue.held_by_other(esc, user.tutor_id): raise HTTPException(status_code=409, detail="Claimed by another tutor")
+
     answer = models.Answer(
         query_id=data.query_id,
         tutor_id=user.tutor_id,
@@ -224,17 +522,55 @@ def tutor_answer(data: schemas.TutorAnswerCreate, user: models.Tutor = Depends(g
     )
     db.add(answer)
 
-    query = db.query(models.Query).filter(models.Query.query_id == data.query_id).first()
-    query.status = "resolved"
-    
-    esc = db.query(models.Escalation).filter(models.Escalation.query_id == data.query_id).first()
-    if esc: esc.status = "resolved"
+    old_status, query.status = query.status, "resolved"
+    if esc:
+        esc.status = "resolved"
+        esc.tutor_id = user.tutor_id
+        esc.claim_expires_at = None
+    student_id = query.session.student_id
 
     db.commit()
+
+    tasks.tutor_answered(answer.answer_id, user.tutor_id, old_status)
+    # Pushed off the request: the student's open chat shows the reply without
+    # re-fetching /history, other tutors drop it from their queue.
+    tasks.notify(notifications.student_channel(student_id), {
+        "type": "tutor_answer", "query_id": query.query_id, "session_id": query.session_id, "answer": _answer_dict(answer)
+    })
+    if esc: _announce_taken([esc])
     return {"message": "Answer submitted"}
 
 
 
+@app.websocket("/ws")
+async def notifications_socket(websocket: WebSocket, token: str):
+    """
+    Push channel: tutors get new/taken escalations for their subject, students
+    get tutor answers. The token goes in the query string since browsers
+    cannot set headers on a WebSocket handshake.
+    """
+    try:
+        user = await get_current_user(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    async with notifications.broker.subscribe(notifications.channels_for(user)) as messages:
+        async with create_task_group() as tg:
+            async def forward():
+                async for message in messages:
+                    await websocket.send_json(message)
+            tg.start_soon(forward)
+            try:
+                while True:
+                    await websocket.receive_text()  # only to notice the client going away
+            except WebSocketDisconnect:
+                pass
+            tg.cancel_scope.cancel()
+
+
+
 @app.post("/feedback")
 def submit_feedback(fb: schemas.FeedbackCreate, user: models.Student = Depends(get_current_user), db: Session = Depends(get_db)):
     if user.role != "student": raise HTTPException(status_code=403, detail="Forbidden")
@@ -247,66 +583,176 @@ def submit_feedback(fb: schemas.FeedbackCreate, user: models.Student = Depends(g
     )
     db.add(feedback)
     db.commit()
+    tasks.feedback_given(feedback.feedback_id, fb.answer_id, fb.rating)
     return {"message": "Feedback received"}
 
 
 
-@app.get("/history", response_model=List[schemas.SessionHistory])
-def get_history(user: models.Student = Depends(get_current_user), db: Session = Depends(get_db)):
+def _answer_dict(a: models.Answer):
+    return {"answer_id": a.answer_id, "content": a.content, "tutor_id": a.tutor_id, "timestamp": a.timestamp, "is_cached": a.is_cached or 0}
+
+
+def _query_dict(q: models.Query):
+    return {
+        "query_id": q.query_id,
+        "content": q.content,
+        "status": q.status,
+        "timestamp": q.timestamp,
+        "answers": [_answer_dict(a) for a in q.answers]
+    }
+
+
+@app.get("/sessions", response_model=schemas.SessionPage)
+def list_sessions(
+    cursor: Optional[str] = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    user: models.Student = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Newest sessions first, without message bodies: counts and a preview only."""
     if user.role != "student": raise HTTPException(status_code=403, detail="Forbidden")
 
-    sessions = db.query(models.Session).filter(models.Session.student_id == user.student_id)\
-        .options(joinedload(models.Session.queries).joinedload(models.Query.answers))\
-        .order_by(models.Session.started_at.desc()).all()
-    
+    sessions, next_cursor = pagination.paginate(
+        db.query(models.Session).filter(models.Session.student_id == user.student_id),
+        models.Session.started_at, models.Session.session_id, cursor, limit
+    )
+    ids = [s.session_id for s in sessions]
+
+    counts, first_query = {}, {}
+    if ids:
+        rows = db.query(models.Query.session_id, func.count(models.Query.query_id), func.min(models.Query.query_id))\
+            .filter(models.Query.session_id.in_(ids)).group_by(models.Query.session_id).all()
+        for session_id, count, first_id in rows:
+            counts[session_id] = count
+            first_query[first_id] = session_id
+
+    previews = {}
+    if first_query:
+        rows = db.query(models.Query.query_id, func.substr(models.Query.content, 1, SESSION_PREVIEW_CHARS))\
+            .filter(models.Query.query_id.in_(list(first_query))).all()
+        previews = {first_query[query_id]: text for query_id, text in rows}
+
+    return {
+        "items": [
+            {"session_id": s.session_id, "started_at": s.started_at,
+             "query_count": counts.get(s.session_id, 0), "preview": previews.get(s.session_id)}
+            for s in sessions
+        ],
+        "next_cursor": next_cursor
+    }
+
+
+@app.get("/sessions/{session_id}/queries", response_model=schemas.QueryPage)
+def get_session_queries(
+    session_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    user: models.Student = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Messages of one session, newest first; the next page holds older ones."""
+    if user.role != "student": raise HTTPException(status_code=403, detail="Forbidden")
+
+    owner = db.query(models.Session.student_id).filter(models.Session.session_id == session_id).scalar()
+    if owner != user.student_id: raise HTTPException(status_code=404, detail="Session not found")
+
+    queries, next_cursor = pagination.paginate(
+        db.query(models.Query).filter(models.Query.session_id == session_id).options(selectinload(models.Query.answers)),
+        models.Query.timestamp, models.Query.query_id, cursor, limit
+    )
+    return {"items": [_query_dict(q) for q in queries], "next_cursor": next_cursor}
+
+
+@app.get("/history", response_model=schemas.HistoryPage)
+def get_history(
+    cursor: Optional[str] = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    user: models.Student = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    if user.role != "student": raise HTTPException(status_code=403, detail="Forbidden")
+
+    # selectinload: one IN query per level for the page, instead of one
+    # cartesian sessions x queries x answers join over the whole history.
+    sessions, next_cursor = pagination.paginate(
+        db.query(models.Session).filter(models.Session.student_id == user.student_id)
+            .options(selectinload(models.Session.queries).selectinload(models.Query.answers)),
+        models.Session.started_at, models.Session.session_id, cursor, limit
+    )
+
     result = []
     for s in sessions:
-        queries_data = []
-        for q in s.queries:
-            q_answers = []
-            for a in q.answers:
-                q_answers.append({"answer_id": a.answer_id, "content": a.content, "tutor_id": a.tutor_id, "timestamp": a.timestamp})
-            
-            queries_data.append({
-                "query_id": q.query_id,
-                "content": q.content,
-                "status": q.status,
-                "timestamp": q.timestamp,
-                "answers": q_answers
-            })
-
         result.append({
             "session_id": s.session_id,
             "started_at": s.started_at,
-            "queries": queries_data
+            "queries": [_query_dict(q) for q in s.queries]
         })
-    
-    return result
+
+    return {"items": result, "next_cursor": next_cursor}
+
+
+@app.get("/escalations", response_model=schemas.QueryPage)
+def list_escalations(
+    cursor: Optional[str] = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    user: models.Student = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """The student's questions sent to a tutor (waiting or resolved), newest first."""
+    if user.role != "student": raise HTTPException(status_code=403, detail="Forbidden")
+
+    queries, next_cursor = pagination.paginate(
+        db.query(models.Query).join(models.Session, models.Session.session_id == models.Query.session_id)
+            .filter(models.Session.student_id == user.student_id, models.Query.status.in_(("escalated", "resolved")))
+            .options(selectinload(models.Query.answers)),
+        models.Query.timestamp, models.Query.query_id, cursor, limit
+    )
+    return {"items": [_query_dict(q) for q in queries], "next_cursor": next_cursor}
+
+
+@app.get("/search", response_model=schemas.SearchPage)
+def search_queries(
+    q: str = Query(..., min_length=1, max_length=search.MAX_QUERY_CHARS),
+    scope: Optional[str] = Query(None, pattern="^(mine|resolved)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    user: models.Student = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Past questions and answers matching `q`, best match first. Students search
+    their own ("mine", the default) or the tutor-resolved ones; tutors search
+    the resolved ones, to see how similar questions were answered.
+    """
+    scope = scope or ("mine" if user.role == "student" else "resolved")
+    if user.role not in ("student", "tutor") or (scope == "mine" and user.role != "student"):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    hits, next_cursor = search.search(db, q, scope, getattr(user, "student_id", None), cursor, limit)
+    return {"items": [{**_query_dict(query), "score": score} for query, score in hits], "next_cursor": next_cursor}
 
 
 
 @app.get("/admin/stats")
-def get_system_stats(user: models.Admin = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_system_stats(user: models.Admin = Depends(get_current_user), db: Session = Depends(get_read_db)):
     if user.role != "admin": raise HTTPException(status_code=403, detail="Forbidden")
 
-    total_students = db.query(models.Student).count()
-    total_tutors = db.query(models.Tutor).count()
-    total_queries = db.query(models.Query).count()
-    total_resolved = db.query(models.Query).filter(models.Query.status == "resolved").count()
-    total_escalated = db.query(models.Query).filter(models.Query.status == "escalated").count()
-    
-    return {
-        "total_students": total_students,
-        "total_tutors": total_tutors,
-        "total_queries": total_queries,
-        "queries_resolved": total_resolved,
-        "queries_escalated": total_escalated
-    }
+    # Maintained counters (see stats.py): five primary-key rows, not five table scans.
+    return stats.read(db)
+
+
+@app.post("/admin/stats/reconcile")
+async def reconcile_system_stats(user: models.Admin = Depends(get_current_user)):
+    """Recompute the dashboard counters now; returns the drift that was corrected."""
+    if user.role != "admin": raise HTTPException(status_code=403, detail="Forbidden")
+    drift = await _reconcile_stats_after_jobs()
+    if drift is None:
+        raise HTTPException(status_code=503, detail="Background jobs are still running; try again shortly")
+    return {"corrected": drift}
 
 
 
 @app.get("/admin/reports")
-def get_detailed_reports(user: models.Admin = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_detailed_reports(user: models.Admin = Depends(get_current_user), db: Session = Depends(get_read_db)):
     if user.role != "admin": raise HTTPException(status_code=403, detail="Forbidden")
 
 
@@ -320,24 +766,19 @@ def get_detailed_reports(user: models.Admin = Depends(get_current_user), db: Ses
         })
 
 
-    tutors = db.query(models.Tutor).all()
-    tutor_performance = []
-    for t in tutors:
-        ans_count = db.query(models.Answer).filter(models.Answer.tutor_id == t.tutor_id).count()
-        tutor_performance.append({
-            "tutor_name": t.name,
-            "answers_given": ans_count
-        })
-
-    students = db.query(models.Student).all()
-    student_activity = []
-    for s in students:
-        q_count = db.query(models.Query).join(models.Session).filter(models.Session.student_id == s.student_id).count()
-        if q_count > 0:
-            student_activity.append({"name": s.name, "queries": q_count})
+    # Rollup columns kept by the background jobs (tasks.py), not aggregates
+    # over the answer / query tables on every read.
+    tutor_rows = db.query(models.Tutor.name, models.Tutor.answers_given, models.Tutor.rating_count, models.Tutor.rating_sum)\
+        .order_by(models.Tutor.tutor_id).all()
+    tutor_performance = [
+        {"tutor_name": name, "answers_given": given, "avg_rating": round(total / count, 2) if count else None}
+        for name, given, count, total in tutor_rows
+    ]
 
-    student_activity.sort(key=lambda x: x['queries'], reverse=True)
-    student_activity = student_activity[:5]
+    student_rows = db.query(models.Student.name, models.Student.query_count)\
+        .filter(models.Student.query_count > 0)\
+        .order_by(models.Student.query_count.desc()).limit(5).all()
+    student_activity = [{"name": name, "queries": count} for name, count in student_rows]
 
     return {
         "recent_escalations": escalation_report,
@@ -345,42 +786,78 @@ def get_detailed_reports(user: models.Admin = Depends(get_current_user), db: Ses
         "student_activity": student_activity
     }
 
-@app.get("/admin/users")
-def get_all_users(user: models.Admin = Depends(get_current_user), db: Session = Depends(get_db)):
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus text exposition of the request, DB and model-call histograms (see metrics.py)."""
+    if metrics.METRICS_TOKEN and not secrets.compare_digest(authorization or "", f"Bearer {metrics.METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/ai-metrics")
+def get_ai_metrics(user: models.Admin = Depends(get_current_user)):
+    """Model client reuse (requests vs. connections opened), answer cache hit rates, push delivery and background jobs."""
+    if user.role != "admin": raise HTTPException(status_code=403, detail="Forbidden")
+    return {**llm_clients.registry.metrics(), "answer_cache": answer_cache.stats(),
+            "routes": {r.name: r.metrics() for r in (nlp_engine.text_route, nlp_engine.vision_route)},
+            "coalescing": {f.name: f.stats() for f in (nlp_engine.text_flights, nlp_engine.vision_flights)},
+            "image_cache": image_cache.stats(), "notifications": notifications.broker.stats(), "jobs": job_queue.stats()}
+
+@app.get("/admin/users", response_model=schemas.UserPage)
+def get_all_users(
+    role: str = Query("student", pattern="^(student|tutor)$"),
+    email: Optional[str] = Query(None, max_length=100),
+    cursor: Optional[str] = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    user: models.Admin = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
     """
     User Management List (Scope Page 11: Oversight)
+    One role at a time, newest first; `email` filters by address prefix.
     """
     if user.role != "admin": raise HTTPException(status_code=403, detail="Forbidden")
-    
-    students = db.query(models.Student).all()
-    tutors = db.query(models.Tutor).all()
-    
-    user_list = []
-    for s in students:
-        user_list.append({"id": s.student_id, "name": s.name, "email": s.email, "role": "Student", "joined": s.created_at})
-    for t in tutors:
-        user_list.append({"id": t.tutor_id, "name": t.name, "email": t.email, "role": "Tutor", "joined": t.created_at})
-        
-    return user_list
+    items, next_cursor = admin_users.page(db, role, email, cursor, limit)
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/admin/users/export")
+async def export_users(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    role: Optional[str] = Query(None, pattern="^(student|tutor)$"),
+    user: models.Admin = Depends(get_current_user)
+):
+    """All students and tutors (or one `role`) as a streamed CSV / NDJSON download."""
+    if user.role != "admin": raise HTTPException(status_code=403, detail="Forbidden")
+    roles = (role,) if role else tuple(admin_users.ROLES)
+    return StreamingResponse(
+        admin_users.export(format, roles),
+        media_type=admin_users.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'}
+    )
 
  
 class UserUpdate(schemas.BaseModel):
     name: Optional[str] = None
     password: Optional[str] = None
 
-@app.put("/users/me")
-def update_profile(data: UserUpdate, user: models.Student = Depends(get_current_user), db: Session = Depends(get_db)):
+def _update_profile(db: Session, user, name: Optional[str], hashed_pw: Optional[str]):
+    row = db.get(principals.USER_MODELS[user.role], user.id)
 
-    if data.name:
-        user.name = data.name
+    if name:
+        row.name = name
     
 
-    if data.password:
-        user.password = get_password_hash(data.password)
+    if hashed_pw:
+        row.password = hashed_pw
     
     db.commit()
-    db.refresh(user)
-    return {"message": "Profile updated successfully", "name": user.name}
+    return row.name
+
+@app.put("/users/me")
+async def update_profile(data: UserUpdate, user: models.Student = Depends(get_current_user), db: Session = Depends(get_db)):
+    hashed_pw = await passwords.hash_password(data.password) if data.password else None
+    name = await run_db(_update_profile, db, user, data.name, hashed_pw)
+    principals.invalidate(user)
+    return {"message": "Profile updated successfully", "name": name}
 
 @app.post("/session/new")
 def start_new_session(user: models.Student = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -393,7 +870,7 @@ def start_new_session(user: models.Student = Depends(get_current_user), db: Sess
     ).first()
 
     if active_session:
-        active_session.ended_at = datetime.now()
+        active_session.ended_at = models.now()
         db.commit()
 
     
@@ -0,0 +1,255 @@
+"""
+Request instrumentation and the Prometheus text exposition behind GET /metrics.
+
+`MetricsMiddleware` times every HTTP request and gives it a trace (a context
+variable, so it follows the request into the DB executor threads). Code
+marks the phases of a request with `span("name")`: auth, image, context,
+cache, model, save. The middleware records, per route template:
+- `http_request_duration_seconds` (also by method and status);
+- `http_request_phase_seconds` per phase, with "other" for what no span
+  covered (validation, serialization, framework);
+- `http_request_db_statements` / `http_request_db_seconds`, counted by the
+  SQLAlchemy hooks of `instrument_engine`.
+Model calls are timed per route and target (`llm_call_seconds`,
+`llm_first_chunk_seconds`) by providers.Route, and connection pool
+checkouts, timeouts and usage per pool by database.py.
+
+With `SLOW_REQUEST_MS` set, requests slower than that are printed with
+their phase and DB breakdown. Metrics are per process: with several
+workers, scrape each one. Set `METRICS_TOKEN` to require it as a bearer token
+on /metrics.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 0))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, le=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts..., overflow, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 3)
+            series[bisect_left(self.buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for values, counts in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(self.labels, values, bound)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labels, values, '+Inf')} {counts[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {counts[-2]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {counts[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        lines.extend(f"{self.name}{_labels(self.labels, k)} {v}" for k, v in sorted(values.items()))
+        return lines
+
+
+class Gauge:
+    """Read at scrape time: `collect()` returns {label values tuple: value}."""
+
+    def __init__(self, name: str, help: str, labels, collect):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        lines.extend(f"{self.name}{_labels(self.labels, k)} {v}" for k, v in sorted(self.collect().items()))
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def counter(self, name: str, help: str, labels=()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels, collect) -> Gauge:
+        return self._add(Gauge(name, help, labels, collect))
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+registry = Registry()
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency, to the last body byte.", ("method", "route", "status"))
+http_request_phase = registry.histogram(
+    "http_request_phase_seconds", "Time per request phase.", ("route", "phase"))
+http_request_db_statements = registry.histogram(
+    "http_request_db_statements", "SQL statements executed per request.", ("route",), COUNT_BUCKETS)
+http_request_db_time = registry.histogram(
+    "http_request_db_seconds", "Time spent executing SQL per request.", ("route",))
+llm_call_duration = registry.histogram(
+    "llm_call_seconds", "Model call attempts, to the last chunk.", ("route", "target", "outcome"))
+llm_first_chunk = registry.histogram(
+    "llm_first_chunk_seconds", "Time to the first streamed chunk of a model call.", ("route", "target"))
+db_pool_wait = registry.histogram(
+    "db_pool_checkout_seconds", "Time to check a connection out of the pool.", ("pool",))
+db_pool_timeouts = registry.counter(
+    "db_pool_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT.", ("pool",))
+
+
+class Trace:
+    def __init__(self):
+        self.phases = {}
+        self.db_statements = 0
+        self.db_seconds = 0.0
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+_trace = ContextVar("request_trace", default=None)
+
+
+@contextmanager
+def span(phase: str):
+    """Adds the time spent in the block to `phase` of the current request (no-op outside one)."""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(phase, time.perf_counter() - start)
+
+
+def _route_of(scope):
+    route = scope.get("route")
+    # Templates, not raw paths: /sessions/{session_id}/queries is one series.
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        trace = Trace()
+        token = _trace.set(trace)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _trace.reset(token)
+            elapsed = time.perf_counter() - start
+            self._record(scope, status, elapsed, trace)
+
+    @staticmethod
+    def _record(scope, status, elapsed, trace):
+        route = _route_of(scope)
+        http_request_duration.observe(elapsed, scope["method"], route, status)
+        phases = dict(trace.phases)
+        phases["other"] = max(elapsed - sum(phases.values()), 0.0)
+        for phase, seconds in phases.items():
+            http_request_phase.observe(seconds, route, phase)
+        http_request_db_statements.observe(trace.db_statements, route)
+        http_request_db_time.observe(trace.db_seconds, route)
+
+        if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+            breakdown = " ".join(f"{phase}={seconds * 1000:.1f}" for phase, seconds in phases.items())
+            print(f"🐢 Slow request: {scope['method']} {scope['path']} ({route}) {status} {elapsed * 1000:.0f} ms: "
+                  f"{breakdown}; {trace.db_statements} SQL statements in {trace.db_seconds * 1000:.1f} ms")
+
+
+def instrument_engine(engine):
+    """Counts and times the SQL statements of each request (see Trace)."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_start"].pop()
+        trace = _trace.get()
+        if trace is not None:
+            trace.db_statements += 1
+            trace.db_seconds += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("metrics_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+def render() -> str:
+    return registry.render()
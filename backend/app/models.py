@@ -1,7 +1,21 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, func
+from datetime import datetime, timezone
+
+from sqlalchemy import DDL, Column, Integer, String, Text, DateTime, ForeignKey, Index, event, func
 from sqlalchemy.orm import relationship
 from .database import Base
 
+
+def now() -> datetime:
+    """
+    The time every timestamp column is written with: UTC, stored naive (the
+    columns carry no zone), the same clock as SQLite's CURRENT_TIMESTAMP and a
+    UTC MySQL server's NOW(). Microseconds are kept where the column can hold
+    them; keyset cursors tie-break on the primary key, so rows stored within
+    the same second still page in a stable order.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 # 1. Student Table
 class Student(Base):
     __tablename__ = "student"
@@ -9,7 +23,15 @@ class Student(Base):
     name = Column(String(100), nullable=False)
     email = Column(String(100), unique=True, nullable=False)
     password = Column(String(255), nullable=False)
-    created_at = Column(DateTime, default=func.now())
+    created_at = Column(DateTime, default=now)
+    # Activity rollup for the admin reports, kept by background jobs (tasks.py).
+    query_count = Column(Integer, nullable=False, default=0, server_default="0")
+    __table_args__ = (
+        # Most active students (/admin/reports)
+        Index("ix_student_query_count", "query_count"),
+        # Newest first (/admin/users)
+        Index("ix_student_created_at", "created_at"),
+    )
 
 # 2. Tutor Table
 class Tutor(Base):
@@ -19,7 +41,16 @@ class Tutor(Base):
     email = Column(String(100), unique=True, nullable=False)
     password = Column(String(255), nullable=False)
     subject = Column(String(100), nullable=False)
-    created_at = Column(DateTime, default=func.now())
+    created_at = Column(DateTime, default=now)
+    # Activity rollups for the admin reports, kept by background jobs (tasks.py).
+    answers_given = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    __table_args__ = (
+        Index("ix_tutor_created_at", "created_at"),
+        # Escalation routing by subject, whatever its case (tutor_queue.route)
+        Index("ix_tutor_subject_lower", func.lower(subject)),
+    )
 
 # 3. Admin Table
 class Admin(Base):
@@ -28,16 +59,26 @@ class Admin(Base):
     name = Column(String(100), nullable=False)
     email = Column(String(100), unique=True, nullable=False)
     password = Column(String(255), nullable=False)
-    created_at = Column(DateTime, default=func.now())
+    created_at = Column(DateTime, default=now)
 
 # 4. Session Table
 class Session(Base):
     __tablename__ = "session"
     session_id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("student.student_id"), nullable=False)
-    started_at = Column(DateTime, default=func.now())
+    started_at = Column(DateTime, default=now)
     ended_at = Column(DateTime, nullable=True)
+    # Rolling summary of the turns folded out of the model context (context.py)
+    # and the last query_id it covers.
+    summary = Column(Text, nullable=True)
+    summary_through = Column(Integer, nullable=True)
     queries = relationship("Query", backref="session")
+    __table_args__ = (
+        # Active-session lookup: student_id = ? AND ended_at IS NULL
+        Index("ix_session_student_ended", "student_id", "ended_at"),
+        # A student's sessions, newest first (/history)
+        Index("ix_session_student_started", "student_id", "started_at"),
+    )
 
 # 5. Query Table
 class Query(Base):
@@ -45,9 +86,17 @@ class Query(Base):
     query_id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("session.session_id"), nullable=False)
     content = Column(Text, nullable=False)
-    timestamp = Column(DateTime, default=func.now())
+    timestamp = Column(DateTime, default=now)
     status = Column(String(20), default="pending")
     answers = relationship("Answer", backref="query")
+    __table_args__ = (
+        # Turns of a session in order (context window, history)
+        Index("ix_query_session_timestamp", "session_id", "timestamp"),
+        # Escalated / resolved filters
+        Index("ix_query_status", "status"),
+        # Full-text search (search.py); SQLite uses the FTS5 table below instead.
+        Index("ft_query_content", "content", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
 
 # 6. Answer Table
 class Answer(Base):
@@ -56,8 +105,53 @@ class Answer(Base):
     query_id = Column(Integer, ForeignKey("query.query_id"), nullable=False)
     tutor_id = Column(Integer, ForeignKey("tutor.tutor_id"), nullable=True) 
     content = Column(Text, nullable=False)
-    timestamp = Column(DateTime, default=func.now())
+    timestamp = Column(DateTime, default=now)
     is_ai = Column(Integer, default=0) 
+    is_cached = Column(Integer, default=0)
+    __table_args__ = (
+        Index("ix_answer_query", "query_id"),
+        Index("ix_answer_tutor", "tutor_id"),
+        Index("ft_answer_content", "content", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
+
+
+def fts5_ddl(table: str, key: str) -> list:
+    """
+    SQLite full-text index over `table`.content: an external-content FTS5 table
+    (it stores only the index, not a copy of the text) kept in step by triggers,
+    so every insert, edit and delete updates it in the same transaction.
+
+    Migration 0007 has its own frozen copy of this DDL (migrations don't import
+    app code); a change here needs a new migration, not an edit to 0007.
+    """
+    fts = f"{table}_fts"
+    delete = f"INSERT INTO {fts}({fts}, rowid, content) VALUES ('delete', old.{key}, old.content);"
+    insert = f"INSERT INTO {fts}(rowid, content) VALUES (new.{key}, new.content);"
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5(content, content='{table}', content_rowid='{key}', tokenize='porter unicode61')",
+        f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER {fts}_update AFTER UPDATE OF content ON {table} BEGIN {delete} {insert} END",
+    ]
+
+
+for _model, _key in ((Query, "query_id"), (Answer, "answer_id")):
+    for _statement in fts5_ddl(_model.__tablename__, _key):
+        event.listen(_model.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+    event.listen(_model.__table__, "before_drop",
+                 DDL(f"DROP TABLE IF EXISTS {_model.__tablename__}_fts").execute_if(dialect="sqlite"))
+
+
+def is_search_index(type_: str, name: str) -> bool:
+    """
+    Whether a schema object belongs to the full-text indexes above: the FTS5
+    tables and their shadow tables (`*_fts_data`, `*_fts_idx`, ...) on SQLite,
+    and the FULLTEXT indexes that exist only on MySQL. Alembic autogenerate
+    must skip them, as they are created by DDL the metadata doesn't describe.
+    """
+    if type_ == "table":
+        return name.endswith("_fts") or "_fts_" in name
+    return type_ == "index" and name.startswith("ft_") and name.endswith("_content")
 
 # 7. Escalation Table
 class Escalation(Base):
@@ -65,8 +159,19 @@ class Escalation(Base):
     escalation_id = Column(Integer, primary_key=True, index=True)
     query_id = Column(Integer, ForeignKey("query.query_id"), nullable=False)
     tutor_id = Column(Integer, ForeignKey("tutor.tutor_id"), nullable=True)
-    escalated_at = Column(DateTime, default=func.now())
+    escalated_at = Column(DateTime, default=now)
     status = Column(String(20), default="pending")
+    # Routing and claim lease for the tutor work queue (see tutor_queue.py).
+    subject = Column(String(100), nullable=False, default="General", server_default="General")
+    claim_expires_at = Column(DateTime, nullable=True)
+    query = relationship("Query", backref="escalations")
+    __table_args__ = (
+        Index("ix_escalation_query", "query_id"),
+        Index("ix_escalation_escalated_at", "escalated_at"),
+        # The queue scan: open escalations for a subject, oldest first.
+        Index("ix_escalation_queue", "status", "subject", "escalated_at"),
+        Index("ix_escalation_tutor_claim", "tutor_id", "claim_expires_at"),
+    )
 
 # 8. Feedback Table
 class Feedback(Base):
@@ -76,4 +181,15 @@ class Feedback(Base):
     student_id = Column(Integer, ForeignKey("student.student_id"), nullable=False)
     rating = Column(Integer, nullable=False) 
     comment = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime, default=now)
+# 9. System Counter Table (running totals for the admin dashboard, see stats.py)
+class SystemCounter(Base):
+    __tablename__ = "system_counter"
+    name = Column(String(50), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+# 10. Job Receipt Table (idempotency keys of applied background jobs, see jobs.py)
+class JobReceipt(Base):
+    __tablename__ = "job_receipt"
+    key = Column(String(191), primary_key=True)
+    done_at = Column(DateTime, nullable=False, index=True)
@@ -1,9 +1,12 @@
 import os
-import base64
-import io
 from dotenv import load_dotenv
-from PIL import Image
-from huggingface_hub import InferenceClient
+from . import metrics
+from .images import PreparedImage
+from .llm_clients import registry, HUGGINGFACE, GEMINI, LOCAL
+from .answer_cache import answer_cache, context_hash, normalize
+from .image_cache import image_cache
+from .providers import Route, Target
+from .singleflight import SingleFlight
 
 # Import Google GenAI safely
 try:
@@ -14,80 +17,201 @@ except ImportError:
 
 load_dotenv()
 
-def generate_answer(question: str, image_base64: str = None, previous_history: list = []) -> str:
+TEXT_MODEL = "meta-llama/Meta-Llama-3-8B-Instruct"
+VISION_MODEL = "gemini-flash-latest"
+
+# Failover targets (see providers.py): an alternate model on the same
+# provider, and for text a local OpenAI-compatible server (llama.cpp, Ollama,
+# vLLM, or bench/fake_llm.py). Unset means that target is skipped.
+TEXT_FALLBACK_MODEL = os.getenv("TEXT_FALLBACK_MODEL")
+VISION_FALLBACK_MODEL = os.getenv("VISION_FALLBACK_MODEL", "gemini-flash-lite-latest")
+LOCAL_LLM_URL = os.getenv("LOCAL_LLM_URL")
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "local")
+
+# Optional endpoint overrides, e.g. to point the engine at a local fake model
+# server (see bench/fake_llm.py). Unset means the public provider APIs.
+HF_BASE_URL = os.getenv("HF_BASE_URL")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+
+text_route = Route("text", [
+    Target("text", HUGGINGFACE, TEXT_MODEL, api_key_env="HUGGINGFACE_API_KEY"),
+    Target("text_fallback", HUGGINGFACE, TEXT_FALLBACK_MODEL, api_key_env="HUGGINGFACE_API_KEY"),
+    Target("local", LOCAL, LOCAL_LLM_MODEL, base_url=LOCAL_LLM_URL, enabled=bool(LOCAL_LLM_URL)),
+], "⚠️ AI Service Busy. Please try again shortly or escalate to a human tutor.")
+
+vision_route = Route("vision", [
+    Target("vision", GEMINI, VISION_MODEL, api_key_env="GEMINI_API_KEY", enabled=HAS_GOOGLE),
+    Target("vision_fallback", GEMINI, VISION_FALLBACK_MODEL, api_key_env="GEMINI_API_KEY", enabled=HAS_GOOGLE),
+], "⚠️ Image Analysis Unavailable: the AI vision service is overloaded. "
+   "Please type your question instead, or escalate to a human tutor.")
+
+# Identical questions asked at the same moment share one upstream call
+# (see singleflight.py). Keys match what the answer caches key on.
+text_flights = SingleFlight("text")
+vision_flights = SingleFlight("vision")
+
+async def generate_answer(question: str, image: PreparedImage = None, previous_history: list = []) -> str:
     """
     HYBRID MODE:
     - Images -> Google Gemini (Specific Experimental Model)
     - Text   -> Hugging Face Llama 3 (Unlimited)
+
+    Both routes are awaited on the event loop, so a slow model call does not
+    hold a worker thread while it is in flight. `image` comes from
+    images.prepare_*, already downscaled and re-encoded. Raises
+    providers.ProviderUnavailable when no model could answer.
     """
     
-    # --- ROUTE 1: IMAGE QUERY ---
-    if image_base64:
-        return ask_gemini_vision(question, image_base64)
+    with metrics.span("model"):
+        # --- ROUTE 1: IMAGE QUERY ---
+        if image:
+            return await ask_gemini_vision(question, image)
 
-    # --- ROUTE 2: TEXT QUERY ---
-    return ask_huggingface_text(question, previous_history)
+        # --- ROUTE 2: TEXT QUERY ---
+        return await ask_huggingface_text(question, previous_history)
 
 
-def ask_gemini_vision(question, image_base64):
-    print("📷 Image detected! Switching to Google Gemini (Exp-1206)...")
-    
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not HAS_GOOGLE: return "⚠️ System Error: 'google-genai' library missing."
-    if not api_key: return "⚠️ System Error: GEMINI_API_KEY missing."
-
-    try:
-        client = genai.Client(api_key=api_key)
-        
-        # Prepare Image
-        if "," in image_base64:
-            image_base64 = image_base64.split(",")[1]
-        image_bytes = base64.b64decode(image_base64)
-        image = Image.open(io.BytesIO(image_bytes))
-
-        # Send to Gemini
-        # USING THE SPECIFIC EXPERIMENTAL MODEL FROM YOUR LIST
-        response = client.models.generate_content(
-            model='gemini-flash-latest', 
-            contents=[image, "\n\n", f"Analyze this image and answer: {question}"]
+async def stream_answer(question: str, image: PreparedImage = None, previous_history: list = []):
+    """
+    Same routing as generate_answer, but yields the answer in chunks
+    as the model produces them (used by POST /query/stream).
+    """
+    chunks = stream_gemini_vision(question, image) if image \
+        else stream_huggingface_text(question, previous_history)
+    with metrics.span("model"):
+        async for chunk in chunks:
+            yield chunk
+
+
+def _image_part(image: PreparedImage):
+    # Sent as-is; handing the SDK a PIL image instead makes it re-encode to PNG.
+    return genai.types.Part.from_bytes(data=image.data, mime_type=image.mime_type)
+
+
+def _build_messages(question, history):
+    messages = []
+    system = "You are a helpful academic tutor. Use Markdown and LaTeX."
+    if history and history[0].get("is_summary"):
+        # Folded in here: chat templates expect a single system message.
+        system += "\n\nEarlier in this conversation:\n" + history[0]["content"]
+        history = history[1:]
+    messages.append({"role": "system", "content": system})
+
+    for msg in history:
+        role = "user" if msg['is_user'] else "assistant"
+        messages.append({"role": role, "content": msg['content']})
+
+    messages.append({"role": "user", "content": question})
+    return messages
+
+
+def _chat_client(target, api_key):
+    if target.provider == LOCAL:
+        return registry.local(target.base_url)
+    return registry.huggingface(api_key, HF_BASE_URL)
+
+
+def _vision_contents(question, image):
+    return [_image_part(image), "\n\n", f"Analyze this image and answer: {question}"]
+
+
+def _text_key(question, history):
+    return normalize(question), context_hash(history)
+
+
+def _vision_key(question, image):
+    return normalize(question), image.dhash
+
+
+async def ask_gemini_vision(question, image):
+    return await vision_flights.do(_vision_key(question, image), lambda: _ask_gemini_vision(question, image))
+
+
+async def stream_gemini_vision(question, image):
+    async for chunk in vision_flights.stream(_vision_key(question, image), lambda: _stream_gemini_vision(question, image)):
+        yield chunk
+
+
+async def ask_huggingface_text(question, history):
+    return await text_flights.do(_text_key(question, history), lambda: _ask_huggingface_text(question, history))
+
+
+async def stream_huggingface_text(question, history):
+    async for chunk in text_flights.stream(_text_key(question, history), lambda: _stream_huggingface_text(question, history)):
+        yield chunk
+
+
+async def _ask_gemini_vision(question, image):
+    print("📷 Image detected! Switching to Google Gemini...")
+
+    async def call(target, api_key):
+        client = registry.gemini(api_key, GEMINI_BASE_URL)
+        response = await client.aio.models.generate_content(
+            model=target.model,
+            contents=_vision_contents(question, image)
         )
+        if not response.text:
+            raise ValueError("empty response")
         return response.text
 
-    except Exception as e:
-        error_msg = str(e)
-        print(f"❌ Gemini Failure: {error_msg}")
-        
-        if "429" in error_msg:
-            return "⚠️ **Image Analysis Unavailable:**\nThe AI Vision server is currently overloaded (Quota Exceeded). Please **type your question** instead!"
-        else:
-            return f"⚠️ **Image Analysis Failed:**\nI am currently running in Text-Only mode. Error: {error_msg}"
-
-
-def ask_huggingface_text(question, history):
-    api_key = os.getenv("HUGGINGFACE_API_KEY")
-    if not api_key: return "System Error: HUGGINGFACE_API_KEY missing."
-
-    try:
-        client = InferenceClient(api_key=api_key)
-        
-        messages = []
-        messages.append({"role": "system", "content": "You are a helpful academic tutor. Use Markdown and LaTeX."})
-        
-        for msg in history:
-            role = "user" if msg['is_user'] else "assistant"
-            messages.append({"role": role, "content": msg['content']})
-            
-        messages.append({"role": "user", "content": question})
-
-        # Use Llama 3
-        response = client.chat_completion(
-            model="meta-llama/Meta-Llama-3-8B-Instruct", 
+    answer = await vision_route.complete(call)
+    image_cache.put(question, image, answer)
+    return answer
+
+
+async def _stream_gemini_vision(question, image):
+    print("📷 Image detected! Streaming from Google Gemini...")
+
+    async def call(target, api_key):
+        client = registry.gemini(api_key, GEMINI_BASE_URL)
+        async for chunk in await client.aio.models.generate_content_stream(
+            model=target.model,
+            contents=_vision_contents(question, image)
+        ):
+            if chunk.text:
+                yield chunk.text
+
+    parts = []
+    async for chunk in vision_route.stream(call):
+        parts.append(chunk)
+        yield chunk
+    if parts:
+        image_cache.put(question, image, "".join(parts))
+
+
+async def _ask_huggingface_text(question, history):
+    messages = _build_messages(question, history)
+
+    async def call(target, api_key):
+        response = await _chat_client(target, api_key).chat_completion(
+            model=target.model, 
             messages=messages,
             max_tokens=1500,
             stream=False
         )
         return response.choices[0].message.content
 
-    except Exception as e:
-        print(f"HF Error: {e}")
-        return "⚠️ AI Service Busy. Please escalate to a human tutor."
\ No newline at end of file
+    answer = await text_route.complete(call)
+    answer_cache.put(question, history, answer)
+    return answer
+
+
+async def _stream_huggingface_text(question, history):
+    messages = _build_messages(question, history)
+
+    async def call(target, api_key):
+        async for chunk in await _chat_client(target, api_key).chat_completion(
+            model=target.model,
+            messages=messages,
+            max_tokens=1500,
+            stream=True
+        ):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    parts = []
+    async for chunk in text_route.stream(call):
+        parts.append(chunk)
+        yield chunk
+    if parts:
+        answer_cache.put(question, history, "".join(parts))
@@ -0,0 +1,145 @@
+"""
+Push notifications for escalations and tutor answers.
+
+Endpoints publish small JSON messages on named channels and the WebSocket
+route (`/ws`) forwards whatever arrives on the caller's channels:
+- `tutors:<subject>`: a question was escalated, or left the queue;
+- `student:<id>`: a tutor answered one of the student's questions.
+
+The broker is pluggable. The default in-process one only reaches sockets
+connected to the same worker process; with several workers set
+`NOTIFY_BROKER=redis` (and `NOTIFY_REDIS_URL`) so every process sees every
+message. Delivery is best effort: clients resync over the REST endpoints when
+they (re)connect.
+"""
+import asyncio
+import json
+import os
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from fastapi.encoders import jsonable_encoder
+
+from .tutor_queue import GENERAL
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+NOTIFY_BROKER = os.getenv("NOTIFY_BROKER", "memory")
+NOTIFY_REDIS_URL = os.getenv("NOTIFY_REDIS_URL", "redis://localhost:6379/0")
+# Messages buffered per connected socket; a client that falls further behind
+# loses the oldest ones rather than growing memory without bound.
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", 100))
+
+
+def tutor_channel(subject):
+    return f"tutors:{subject}"
+
+
+def student_channel(student_id):
+    return f"student:{student_id}"
+
+
+def channels_for(user):
+    if user.role == "student":
+        return [student_channel(user.student_id)]
+    if user.role == "tutor":
+        return sorted({tutor_channel(user.subject or GENERAL), tutor_channel(GENERAL)})
+    return []
+
+
+class InProcessBroker:
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    async def publish(self, channel, message):
+        self.published += 1
+        message = jsonable_encoder(message)
+        for queue in list(self._subscribers.get(channel, ())):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(message)
+            self.delivered += 1
+
+    @asynccontextmanager
+    async def subscribe(self, channels):
+        queue = asyncio.Queue(self.queue_size)
+        for channel in channels:
+            self._subscribers[channel].add(queue)
+        try:
+            yield _drain(queue)
+        finally:
+            for channel in channels:
+                self._subscribers[channel].discard(queue)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+    async def aclose(self):
+        self._subscribers.clear()
+
+    def stats(self):
+        return {
+            "broker": "memory",
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "channels": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+async def _drain(queue):
+    while True:
+        yield await queue.get()
+
+
+class RedisBroker:
+    """Redis PUBLISH/SUBSCRIBE; works against any Redis-protocol server."""
+
+    def __init__(self, url=NOTIFY_REDIS_URL):
+        self.redis = aioredis.from_url(url, decode_responses=True)
+        self.published = 0
+
+    async def publish(self, channel, message):
+        self.published += 1
+        await self.redis.publish(channel, json.dumps(jsonable_encoder(message)))
+
+    @asynccontextmanager
+    async def subscribe(self, channels):
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(*channels)
+        try:
+            yield _listen(pubsub)
+        finally:
+            await pubsub.unsubscribe(*channels)
+            await pubsub.aclose()
+
+    async def aclose(self):
+        await self.redis.aclose()
+
+    def stats(self):
+        return {"broker": "redis", "published": self.published}
+
+
+async def _listen(pubsub):
+    async for item in pubsub.listen():
+        if item["type"] == "message":
+            yield json.loads(item["data"])
+
+
+def _make_broker():
+    if NOTIFY_BROKER == "redis":
+        if aioredis is None:
+            raise RuntimeError("NOTIFY_BROKER=redis needs the 'redis' package installed")
+        return RedisBroker()
+    return InProcessBroker()
+
+
+broker = _make_broker()
@@ -0,0 +1,65 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Pages are ordered by a timestamp column with the primary key as tie-breaker,
+and the cursor is the (timestamp, id) of the last row handed out. The next
+page starts strictly after that row, so each request reads at most `limit + 1`
+rows off the index no matter how deep the client pages, and rows inserted in
+the meantime never shift the page boundaries the way OFFSET does. The same
+cursors page through search results by (score, id) (see search.py).
+"""
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(sort_value, row_id: int) -> str:
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, parse=datetime.fromisoformat):
+    """Returns (sort value, id); `parse` turns the sort value back into its type."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        return parse(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def order_by(sort_col, id_col, descending=True):
+    if descending:
+        return sort_col.desc(), id_col.desc()
+    return sort_col.asc(), id_col.asc()
+
+
+def after(sort_col, id_col, cursor: str, descending=True):
+    """WHERE clause selecting the rows that come after `cursor`."""
+    timestamp, row_id = decode_cursor(cursor)
+    if descending:
+        return or_(sort_col < timestamp, and_(sort_col == timestamp, id_col < row_id))
+    return or_(sort_col > timestamp, and_(sort_col == timestamp, id_col > row_id))
+
+
+def paginate(query, sort_col, id_col, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE, descending=True):
+    """
+    Run `query` one page at a time. Returns (rows, next_cursor); next_cursor
+    is None on the last page.
+    """
+    if cursor:
+        query = query.filter(after(sort_col, id_col, cursor, descending))
+    rows = query.order_by(*order_by(sort_col, id_col, descending)).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_col.key), getattr(last, id_col.key))
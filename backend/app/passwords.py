@@ -0,0 +1,37 @@
+"""
+Password hashing off the event loop.
+
+bcrypt is deliberately slow (~0.25 s at the default cost of 12), so every hash
+or verify runs on a dedicated, bounded set of worker threads: the bcrypt
+extension releases the GIL, so up to `PASSWORD_HASH_WORKERS` checks proceed
+in parallel while the event loop keeps serving other requests, and a login
+storm queues here instead of occupying the threads the DB work runs on.
+
+`BCRYPT_ROUNDS` sets the cost for new hashes; existing hashes with a
+different cost are transparently re-hashed on the next successful login.
+`python -m bench.login_storm` measures what each cost means in latency.
+"""
+import os
+
+from passlib.context import CryptContext
+
+from .threads import bounded_runner
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 4))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_run = bounded_runner(PASSWORD_HASH_WORKERS)
+
+
+async def hash_password(password: str) -> str:
+    return await _run(pwd_context.hash, password)
+
+
+async def verify_and_update(password: str, hashed: str):
+    """(matches, new_hash): new_hash is set when the stored hash uses an outdated cost."""
+    try:
+        return await _run(pwd_context.verify_and_update, password, hashed)
+    except ValueError:
+        return False, None  # not a bcrypt hash (e.g. a seeded placeholder)
@@ -0,0 +1,99 @@
+"""
+Authenticated-user lookup with a short-lived in-process cache.
+
+Every authenticated request used to re-select its user row by email. Tokens
+now carry the row's primary key (`uid`), the lookup goes by that key, and the
+result is kept for `PRINCIPAL_CACHE_TTL` seconds as a detached, read-only
+`Principal`. `invalidate()` drops an entry when the profile changes; other
+worker processes pick the change up when their entry expires.
+"""
+import os
+
+from sqlalchemy import literal, union_all, select
+
+from . import models
+from .database import SessionLocal, run_db
+from .ttl_cache import TTLCache
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+
+USER_MODELS = {"student": models.Student, "tutor": models.Tutor, "admin": models.Admin}
+
+cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+
+class Principal:
+    """Column values of a user row (minus the password hash) plus its role."""
+
+    def __init__(self, role, row):
+        for column in row.__table__.columns:
+            if column.key != "password":
+                setattr(self, column.key, getattr(row, column.key))
+        self.role = role
+        self.id = primary_key(row)
+
+
+def primary_key(row):
+    return getattr(row, row.__mapper__.primary_key[0].key)
+
+
+def _cache_key(role, email, uid):
+    return (role, uid) if uid is not None else (role, email)
+
+
+def _load(role, email, uid):
+    model = USER_MODELS.get(role)
+    if model is None:
+        return None
+    db = SessionLocal()
+    try:
+        if uid is not None:
+            user = db.get(model, uid)
+            if user is not None and user.email != email:
+                user = None
+        else:
+            # Tokens issued before `uid` was added to the claims.
+            user = db.query(model).filter(model.email == email).first()
+        return Principal(role, user) if user is not None else None
+    finally:
+        db.close()
+
+
+async def resolve(role, email, uid=None):
+    """The Principal for a token's claims, or None if the user no longer exists."""
+    key = _cache_key(role, email, uid)
+    principal = cache.get(key)
+    if principal is None or principal.email != email:
+        principal = await run_db(_load, role, email, uid)
+        if principal is not None:
+            cache.set(key, principal)
+    return principal
+
+
+def invalidate(principal):
+    cache.pop((principal.role, principal.id))
+    cache.pop((principal.role, principal.email))
+
+
+def find_accounts(db, email):
+    """
+    Every account registered under `email` as (role, id, password hash), in
+    student/tutor/admin order, from a single UNION ALL over the three tables.
+    """
+    parts = []
+    for order, (role, model) in enumerate(USER_MODELS.items()):
+        pk = model.__mapper__.primary_key[0]
+        parts.append(
+            select(literal(order).label("ord"), literal(role).label("role"), pk.label("id"), model.password)
+            .where(model.email == email)
+        )
+    rows = db.execute(union_all(*parts)).all()
+    db.commit()
+    return [(row.role, row.id, row.password) for row in sorted(rows, key=lambda row: row.ord)]
+
+
+def store_password_hash(db, role, user_id, hashed):
+    row = db.get(USER_MODELS[role], user_id)
+    row.password = hashed
+    db.commit()
@@ -0,0 +1,348 @@
+"""
+Provider routing for the model calls.
+
+A `Route` is an ordered list of `Target`s (provider + model), e.g. Llama 3 on
+Hugging Face, then an alternate model, then a local OpenAI-compatible server.
+Each call goes to the first target that can take it:
+- a target holds at most `LLM_<NAME>_CONCURRENCY` calls in flight, and starts
+  at most `LLM_<NAME>_RPS` per second (token bucket, bursts up to
+  `LLM_<NAME>_BURST`; 0 means unlimited). Waiting longer than
+  `LLM_QUEUE_TIMEOUT` for either sheds the call to the next target;
+- 429, 5xx and connection errors are retried `LLM_RETRIES` times with
+  jittered exponential backoff (honouring Retry-After), other errors are not;
+- `LLM_BREAKER_FAILURES` failed calls in a row open the target's circuit
+  breaker: it is skipped for `LLM_BREAKER_COOLDOWN` seconds, then a single
+  probe call decides whether it closes again.
+
+When no target can answer, `ProviderUnavailable` is raised; callers record
+that as a failed query instead of storing an error text as the answer.
+A stream is only retried or failed over before its first chunk; a failure
+after that raises ProviderUnavailable as well.
+"""
+import asyncio
+import os
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import httpx
+import httpx2
+
+from . import metrics
+from .llm_clients import LLM_POOL_SIZE, registry
+
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", 2))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", 8))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 10))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", 30))
+
+_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+_TRANSPORT_ERRORS = (httpx.TransportError, httpx2.TransportError, asyncio.TimeoutError, ConnectionError)
+
+
+class ProviderUnavailable(Exception):
+    """No target of a route could answer (all failing, shedding load, or not configured)."""
+
+
+class _Shed(Exception):
+    """A target could not take the call within LLM_QUEUE_TIMEOUT."""
+
+
+def _env_number(name, default):
+    return float(os.getenv(name, default))
+
+
+def status_of(error):
+    """HTTP status carried by a provider SDK error, if any."""
+    for attr in ("code", "status_code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    value = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None  # HTTP-date form; fall back to our own backoff
+
+
+def is_retryable(error):
+    return isinstance(error, _TRANSPORT_ERRORS) or status_of(error) in _RETRYABLE_STATUS
+
+
+class TokenBucket:
+    """Starts at most `rate` calls per second, `burst` at once. rate <= 0 disables it."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    async def acquire(self, timeout: float):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # Reserve a token now (possibly going negative) and wait for it to
+        # refill, so waiters are served in arrival order.
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        if wait > timeout:
+            raise _Shed()
+        self.tokens -= 1
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failures: int, cooldown: float):
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.max_failures:
+            if self.state != self.OPEN:
+                self.opens += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """A half-open probe ended without a verdict (cancelled or shed)."""
+        self._probing = False
+
+
+class Target:
+    """One provider + model, with its own concurrency cap, rate limit and breaker."""
+
+    def __init__(self, name: str, provider: str, model: str, api_key_env: str = None,
+                 base_url: str = None, enabled: bool = True):
+        self.name = name
+        self.provider = provider
+        self.model = model
+        self.api_key_env = api_key_env
+        self.base_url = base_url
+        self.enabled = enabled and bool(model)
+        prefix = f"LLM_{name.upper()}_"
+        self.concurrency = int(_env_number(prefix + "CONCURRENCY", os.getenv("LLM_CONCURRENCY", LLM_POOL_SIZE)))
+        self.bucket = TokenBucket(_env_number(prefix + "RPS", os.getenv("LLM_RPS", 0)),
+                                  _env_number(prefix + "BURST", os.getenv("LLM_BURST", 10)))
+        self.breaker = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN)
+        self._semaphore = None
+        self.in_flight = 0
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "retries": 0, "shed": 0, "short_circuited": 0}
+
+    def api_key(self):
+        """The key to call with, None if the target is not usable right now."""
+        if not self.enabled:
+            return None
+        if self.api_key_env is None:
+            return "local"
+        return os.getenv(self.api_key_env) or None
+
+    @asynccontextmanager
+    async def slot(self):
+        """A concurrency slot and a rate token, or _Shed after LLM_QUEUE_TIMEOUT."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        deadline = time.monotonic() + LLM_QUEUE_TIMEOUT
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), LLM_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise _Shed()
+        try:
+            await self.bucket.acquire(max(deadline - time.monotonic(), 0.0))
+            self.in_flight += 1
+            self.stats["calls"] += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+        finally:
+            self._semaphore.release()
+
+    def metrics(self):
+        return {
+            **self.stats,
+            "model": self.model,
+            "enabled": self.enabled,
+            "in_flight": self.in_flight,
+            "concurrency": self.concurrency,
+            "rps": self.bucket.rate,
+            "breaker": self.breaker.state,
+            "breaker_opens": self.breaker.opens,
+        }
+
+
+def _backoff(attempt, error):
+    delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+    retry_after = _retry_after(error)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class Route:
+    def __init__(self, name: str, targets: list, unavailable_message: str):
+        self.name = name
+        self.targets = targets
+        self.unavailable_message = unavailable_message
+        self.stats = {"calls": 0, "failovers": 0, "unavailable": 0}
+
+    def _candidates(self):
+        for target in self.targets:
+            api_key = target.api_key()
+            if api_key is None:
+                continue
+            if not target.breaker.allow():
+                target.stats["short_circuited"] += 1
+                continue
+            yield target, api_key
+
+    def _failed(self, target, error):
+        target.stats["failures"] += 1
+        target.breaker.record_failure()
+        registry.report_error(target.provider)
+        print(f"❌ {target.name} ({target.model}) failed: {error!r}")
+
+    def _succeeded(self, target):
+        target.stats["successes"] += 1
+        target.breaker.record_success()
+        registry.report_success(target.provider)
+        if target is not self.targets[0]:
+            self.stats["failovers"] += 1
+
+    @contextmanager
+    def _timed(self, target):
+        """Times one call attempt into llm_call_seconds; call the yielded function at the first chunk."""
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield lambda: metrics.llm_first_chunk.observe(time.perf_counter() - start, self.name, target.name)
+        except Exception:
+            outcome = "error"
+            raise
+        except BaseException:
+            outcome = "cancelled"  # caller went away (client disconnect, coalesced waiters gone)
+            raise
+        finally:
+            metrics.llm_call_duration.observe(time.perf_counter() - start, self.name, target.name, outcome)
+
+    def _unavailable(self):
+        self.stats["unavailable"] += 1
+        return ProviderUnavailable(self.unavailable_message)
+
+    async def complete(self, call):
+        """`await call(target, api_key)` on the first target that answers."""
+        self.stats["calls"] += 1
+        for target, api_key in self._candidates():
+            attempt = 0
+            try:
+                while True:
+                    try:
+                        async with target.slot():
+                            with self._timed(target):
+                                result = await call(target, api_key)
+                        break
+                    except _Shed:
+                        raise
+                    except Exception as e:
+                        if attempt >= LLM_RETRIES or not is_retryable(e):
+                            raise
+                        delay = _backoff(attempt, e)
+                        if delay > LLM_RETRY_MAX_DELAY:
+                            raise
+                        attempt += 1
+                        target.stats["retries"] += 1
+                        await asyncio.sleep(delay)
+            except _Shed:
+                target.stats["shed"] += 1
+                target.breaker.release_probe()
+                continue
+            except Exception as e:
+                self._failed(target, e)
+                continue
+            except BaseException:
+                target.breaker.release_probe()
+                raise
+            self._succeeded(target)
+            return result
+        raise self._unavailable()
+
+    async def stream(self, call):
+        """Yields the chunks of `call(target, api_key)` (an async iterator) from the first target that answers."""
+        self.stats["calls"] += 1
+        for target, api_key in self._candidates():
+            attempt = 0
+            started = False
+            try:
+                while True:
+                    try:
+                        async with target.slot():
+                            with self._timed(target) as first_chunk:
+                                async for chunk in call(target, api_key):
+                                    if not started:
+                                        started = True
+                                        first_chunk()
+                                    yield chunk
+                        break
+                    except _Shed:
+                        raise
+                    except Exception as e:
+                        if started or attempt >= LLM_RETRIES or not is_retryable(e):
+                            raise
+                        delay = _backoff(attempt, e)
+                        if delay > LLM_RETRY_MAX_DELAY:
+                            raise
+                        attempt += 1
+                        target.stats["retries"] += 1
+                        await asyncio.sleep(delay)
+            except _Shed:
+                target.stats["shed"] += 1
+                target.breaker.release_probe()
+                continue
+            except Exception as e:
+                self._failed(target, e)
+                if started:
+                    break  # the client already has part of this answer
+                continue
+            except BaseException:
+                target.breaker.release_probe()
+                raise
+            self._succeeded(target)
+            return
+        raise self._unavailable()
+
+    def metrics(self):
+        return {**self.stats, "targets": {t.name: t.metrics() for t in self.targets}}
@@ -1,7 +1,9 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
 from typing import Optional, List
 
+from .images import IMAGE_MAX_BASE64_CHARS
+
 
 class UserCreate(BaseModel):
     name: str
@@ -28,13 +30,15 @@ class LoginRequest(BaseModel):
 
 class QueryCreate(BaseModel):
     content: str
-    image: Optional[str] = None 
+    # base64 / data URL; capped at what decodes to IMAGE_MAX_BYTES
+    image: Optional[str] = Field(None, max_length=IMAGE_MAX_BASE64_CHARS)
 
 class AnswerResponse(BaseModel):
     answer_id: int
     content: str
     tutor_id: Optional[int]
     timestamp: datetime
+    is_cached: int = 0
     class Config:
         from_attributes = True
 
@@ -64,4 +68,64 @@ class SessionHistory(BaseModel):
     started_at: datetime
     queries: List[QueryResponse]
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class SessionSummary(BaseModel):
+    session_id: int
+    started_at: datetime
+    query_count: int
+    preview: Optional[str] = None
+
+
+class SessionPage(BaseModel):
+    items: List[SessionSummary]
+    next_cursor: Optional[str] = None
+
+
+class QueryPage(BaseModel):
+    items: List[QueryResponse]
+    next_cursor: Optional[str] = None
+
+
+class HistoryPage(BaseModel):
+    items: List[SessionHistory]
+    next_cursor: Optional[str] = None
+
+
+class QueueItem(BaseModel):
+    escalation_id: int
+    query_id: int
+    content: str
+    subject: str
+    escalated_at: datetime
+    timestamp: datetime
+    # Set only on the caller's own live claims.
+    claim_expires_at: Optional[datetime] = None
+
+
+class QueuePage(BaseModel):
+    items: List[QueueItem]
+    next_cursor: Optional[str] = None
+
+
+class SearchHit(QueryResponse):
+    score: float
+
+
+class SearchPage(BaseModel):
+    items: List[SearchHit]
+    next_cursor: Optional[str] = None
+
+
+class UserListItem(BaseModel):
+    id: int
+    name: str
+    email: str
+    role: str
+    joined: Optional[datetime] = None
+    subject: Optional[str] = None
+
+
+class UserPage(BaseModel):
+    items: List[UserListItem]
+    next_cursor: Optional[str] = None
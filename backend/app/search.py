@@ -0,0 +1,95 @@
+"""
+Full-text search over past questions and answers.
+
+Backed by the database's own full-text indexes: FULLTEXT on MySQL (natural
+language mode, relevance from MATCH ... AGAINST) and FTS5 on SQLite (bm25).
+Both are updated as rows are written, in the same transaction (see
+models.fts5_ddl), so there is no rebuild step, and a search reads the index
+entries for its terms instead of scanning the tables with LIKE.
+
+A hit is a question. It matches on its own text or on one of its answers and
+is scored by the better of the two. Scopes:
+- "mine": the student's own questions, matched on any of their answers;
+- "resolved": questions a tutor resolved, matched on the tutor's answers.
+Results come best match first and are paged by (score, query_id) cursors.
+"""
+import re
+
+from sqlalchemy import and_, func, literal_column, or_, select, table, union_all
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import selectinload
+
+from . import models, pagination
+
+SCOPES = ("mine", "resolved")
+MAX_QUERY_CHARS = 200
+# More terms than this add little to the ranking but widen the index read.
+MAX_TERMS = 16
+
+_WORD = re.compile(r"\w+")
+
+
+def terms(text: str) -> list:
+    """The words of a search, lowercased, deduplicated and capped at MAX_TERMS."""
+    return list(dict.fromkeys(_WORD.findall(text.lower())))[:MAX_TERMS]
+
+
+def _fts5_hits(model, key, words, *where):
+    # Each word quoted, so user input can't inject FTS5 syntax (NEAR, *, column
+    # filters); OR-ed, so bm25 ranks partial matches instead of dropping them.
+    name = f"{model.__tablename__}_fts"
+    fts = literal_column(name)
+    match = " OR ".join(f'"{word}"' for word in words)
+    return select(model.query_id, (-func.bm25(fts)).label("score"))\
+        .select_from(table(name)).join(model, key == literal_column(f"{name}.rowid"))\
+        .where(fts.op("MATCH")(match), *where)
+
+
+def _fulltext_hits(model, words, *where):
+    relevance = mysql.match(model.content, against=" ".join(words)).in_natural_language_mode()
+    return select(model.query_id, relevance.label("score")).where(relevance, *where)
+
+
+def _hits(db, words, scope):
+    """(query_id, score) of every question matching `words`, on its text or its answers."""
+    answer_filter = (models.Answer.tutor_id.isnot(None),) if scope == "resolved" else ()
+    if db.get_bind().dialect.name == "sqlite":
+        questions = _fts5_hits(models.Query, models.Query.query_id, words)
+        answers = _fts5_hits(models.Answer, models.Answer.answer_id, words, *answer_filter)
+    else:
+        questions = _fulltext_hits(models.Query, words)
+        answers = _fulltext_hits(models.Answer, words, *answer_filter)
+    hits = union_all(questions, answers).subquery()
+    return select(hits.c.query_id, func.max(hits.c.score).label("score"))\
+        .group_by(hits.c.query_id).subquery()
+
+
+def search(db, text, scope, student_id=None, cursor=None, limit=pagination.DEFAULT_PAGE_SIZE):
+    """
+    One page of questions matching `text`, best first. Returns
+    ([(Query, score)], next_cursor); next_cursor is None on the last page.
+    """
+    words = terms(text)
+    if not words:
+        return [], None
+
+    ranked = _hits(db, words, scope)
+    query = db.query(models.Query, ranked.c.score)\
+        .join(ranked, ranked.c.query_id == models.Query.query_id)\
+        .options(selectinload(models.Query.answers))
+    if scope == "mine":
+        query = query.join(models.Session, models.Session.session_id == models.Query.session_id)\
+            .filter(models.Session.student_id == student_id)
+    else:
+        query = query.filter(models.Query.status == "resolved")
+
+    if cursor:
+        score, query_id = pagination.decode_cursor(cursor, float)
+        query = query.filter(or_(ranked.c.score < score,
+                                 and_(ranked.c.score == score, models.Query.query_id < query_id)))
+    rows = query.order_by(ranked.c.score.desc(), models.Query.query_id.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last_query, last_score = rows[-1]
+    return rows, pagination.encode_cursor(last_score, last_query.query_id)
@@ -0,0 +1,137 @@
+"""
+Coalescing of identical in-flight model calls.
+
+When a question goes up on the board, dozens of students send the same text
+within seconds, long before the first answer lands in the answer cache.
+`SingleFlight` lets the first caller for a key start the upstream call and
+has every concurrent caller with the same key wait on that one call instead.
+
+The call runs in a task owned by the flight, not by the caller that started
+it, so one student disconnecting does not cut off the others; it is only
+cancelled once every waiter has gone. An exception (ProviderUnavailable) is
+raised to all waiters. Streams are fanned out chunk by chunk: a caller that
+joins late first gets the chunks produced so far. Plain and streaming calls
+for the same key share a flight too (chunks are joined for a plain caller; a
+streaming caller gets a plain result as one chunk). A finished flight is
+forgotten at once; later callers are served by the answer cache.
+
+Use from the event loop only.
+"""
+import asyncio
+from contextlib import aclosing
+
+
+class _Flight:
+    def __init__(self, streaming: bool):
+        self.streaming = streaming
+        self.task = None
+        self.waiters = 0
+        # streams only
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def changed(self):
+        await self._changed.wait()
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._flights = {}
+        self.flights = 0
+        self.coalesced = 0
+
+    def _start(self, key, streaming, run):
+        flight = self._flights[key] = _Flight(streaming)
+        flight.task = asyncio.ensure_future(run(flight))
+        self.flights += 1
+        return flight
+
+    def _forget(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _leave(self, key, flight):
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            flight.task.cancel()
+            self._forget(key, flight)
+
+    async def do(self, key, fn):
+        """`await fn()` once for all concurrent callers with the same key."""
+        flight = self._flights.get(key)
+        if flight is None:
+            async def run(flight):
+                try:
+                    return await fn()
+                finally:
+                    self._forget(key, flight)
+            flight = self._start(key, False, run)
+        else:
+            self.coalesced += 1
+
+        if flight.streaming:
+            async with aclosing(self._follow(key, flight)) as chunks:
+                return "".join([chunk async for chunk in chunks])
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            self._leave(key, flight)
+
+    async def stream(self, key, fn):
+        """Iterate `fn()` (an async iterator of str) once for all concurrent callers with the same key."""
+        flight = self._flights.get(key)
+        if flight is None:
+            async def run(flight):
+                try:
+                    async for chunk in fn():
+                        flight.chunks.append(chunk)
+                        flight.notify()
+                except Exception as e:
+                    flight.error = e
+                finally:
+                    flight.done = True
+                    flight.notify()
+                    self._forget(key, flight)
+            flight = self._start(key, True, run)
+        else:
+            self.coalesced += 1
+
+        if not flight.streaming:
+            # Joined a plain call: the whole answer arrives as one chunk.
+            flight.waiters += 1
+            try:
+                result = await asyncio.shield(flight.task)
+            finally:
+                self._leave(key, flight)
+            yield result
+            return
+        async with aclosing(self._follow(key, flight)) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+    async def _follow(self, key, flight):
+        flight.waiters += 1
+        try:
+            sent = 0
+            while True:
+                while sent < len(flight.chunks):
+                    yield flight.chunks[sent]
+                    sent += 1
+                if flight.done:
+                    break
+                await flight.changed()
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            self._leave(key, flight)
+
+    def stats(self):
+        return {"flights": self.flights, "coalesced": self.coalesced, "in_flight": len(self._flights)}
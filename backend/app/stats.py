@@ -0,0 +1,90 @@
+"""
+Running totals behind /admin/stats.
+
+Instead of five COUNT(*) scans per dashboard poll, each write path queues a
+job that bumps the matching counter rows once its change has committed (see
+tasks.py), and the dashboard reads the five rows back. `reconcile`
+recomputes the totals from the source tables (at startup, every
+STATS_RECONCILE_SECONDS, or on demand) and fixes any drift, e.g. from rows
+written outside the API or jobs lost with the process. It runs only once the
+job queue has drained, so no bump for a row it counts is still pending.
+"""
+import os
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from . import models
+
+STATS_RECONCILE_SECONDS = float(os.getenv("STATS_RECONCILE_SECONDS", 3600))
+
+TOTAL_STUDENTS = "total_students"
+TOTAL_TUTORS = "total_tutors"
+TOTAL_QUERIES = "total_queries"
+QUERIES_RESOLVED = "queries_resolved"
+QUERIES_ESCALATED = "queries_escalated"
+COUNTERS = (TOTAL_STUDENTS, TOTAL_TUTORS, TOTAL_QUERIES, QUERIES_RESOLVED, QUERIES_ESCALATED)
+
+# Query statuses that have a counter of their own.
+_STATUS_COUNTERS = {"resolved": QUERIES_RESOLVED, "escalated": QUERIES_ESCALATED}
+
+
+def bump(db: Session, name: str, delta: int = 1):
+    """Adds `delta` to a counter as part of the caller's transaction."""
+    db.execute(
+        update(models.SystemCounter)
+        .where(models.SystemCounter.name == name)
+        .values(value=models.SystemCounter.value + delta)
+    )
+
+
+def status_changed(db: Session, old: str, new: str):
+    """Moves a query between the per-status counters."""
+    if old == new:
+        return
+    if old in _STATUS_COUNTERS:
+        bump(db, _STATUS_COUNTERS[old], -1)
+    if new in _STATUS_COUNTERS:
+        bump(db, _STATUS_COUNTERS[new], 1)
+
+
+def read(db: Session) -> dict:
+    rows = db.query(models.SystemCounter.name, models.SystemCounter.value).all()
+    values = dict(rows)
+    return {name: values.get(name, 0) for name in COUNTERS}
+
+
+def _actual_counts(db: Session) -> dict:
+    return {
+        TOTAL_STUDENTS: db.query(func.count(models.Student.student_id)).scalar(),
+        TOTAL_TUTORS: db.query(func.count(models.Tutor.tutor_id)).scalar(),
+        TOTAL_QUERIES: db.query(func.count(models.Query.query_id)).scalar(),
+        QUERIES_RESOLVED: db.query(func.count(models.Query.query_id)).filter(models.Query.status == "resolved").scalar(),
+        QUERIES_ESCALATED: db.query(func.count(models.Query.query_id)).filter(models.Query.status == "escalated").scalar(),
+    }
+
+
+def reconcile(db: Session) -> dict:
+    """
+    Recomputes every counter from the source tables and returns the drift
+    that was corrected ({name: actual - stored}). Call it with the job queue
+    drained (tasks.drained). The counter rows are locked first, so bump jobs
+    that start meanwhile wait and land on top of the fresh totals instead of
+    being lost.
+    """
+    stored = {
+        row.name: row
+        for row in db.query(models.SystemCounter).with_for_update().all()
+    }
+    drift = {}
+    for name, actual in _actual_counts(db).items():
+        row = stored.get(name)
+        if row is None:
+            db.add(models.SystemCounter(name=name, value=actual))
+            if actual:
+                drift[name] = actual
+        elif row.value != actual:
+            drift[name] = actual - row.value
+            row.value = actual
+    db.commit()
+    return drift
@@ -0,0 +1,118 @@
+"""
+Background job handlers (see jobs.py) and the helpers endpoints call to queue them.
+
+Each write path keeps only its essential rows in the request transaction and
+queues one job for the rest, keyed by the row it follows from:
+- a recorded question: `total_queries` and the student's `query_count`;
+- an escalation / a tutor answer: the per-status dashboard counters (and the
+  tutor's `answers_given`);
+- a rating on a tutor answer: the tutor's `rating_count` / `rating_sum`.
+Push notifications are jobs of their own (`notify`), retried if the broker
+is unreachable.
+
+The dashboard counters and rollups therefore trail the writes by the queue
+delay. `reconcile_rollups` recomputes the rollups alongside the stats
+reconcile. Both count the source rows, so they must run with the queue
+drained (`drained`): a job still queued for a row already counted would be
+applied on top of the recomputed value and count that row twice.
+"""
+import asyncio
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+
+from . import models, notifications, stats
+from .jobs import JOB_DRAIN_SECONDS, queue
+
+
+def _add(db: Session, pk, pk_value, **deltas):
+    """Adds `deltas` ({column: n}) to the columns of the row whose primary key `pk` is `pk_value`."""
+    model = pk.class_
+    db.execute(update(model).where(pk == pk_value).values(**{k: getattr(model, k) + v for k, v in deltas.items()}))
+
+
+@queue.handler("notify", db=False)
+async def _notify(channel: str, message: dict):
+    await notifications.broker.publish(channel, message)
+
+
+@queue.handler("query_recorded")
+def _query_recorded(db: Session, student_id: int):
+    stats.bump(db, stats.TOTAL_QUERIES)
+    _add(db, models.Student.student_id, student_id, query_count=1)
+
+
+@queue.handler("status_changed")
+def _status_changed(db: Session, old: str, new: str, tutor_id: int = None):
+    stats.status_changed(db, old, new)
+    if tutor_id is not None:
+        _add(db, models.Tutor.tutor_id, tutor_id, answers_given=1)
+
+
+@queue.handler("feedback_given")
+def _feedback_given(db: Session, answer_id: int, rating: int):
+    tutor_id = db.query(models.Answer.tutor_id).filter(models.Answer.answer_id == answer_id).scalar()
+    if tutor_id is not None:
+        _add(db, models.Tutor.tutor_id, tutor_id, rating_count=1, rating_sum=rating)
+
+
+def notify(channel: str, message: dict, key: str = None):
+    queue.enqueue("notify", key=key, channel=channel, message=jsonable_encoder(message))
+
+
+def query_recorded(query_id: int, student_id: int):
+    queue.enqueue("query_recorded", key=f"query:{query_id}", student_id=student_id)
+
+
+def query_escalated(escalation_id: int, old_status: str):
+    queue.enqueue("status_changed", key=f"escalation:{escalation_id}", old=old_status, new="escalated")
+
+
+def tutor_answered(answer_id: int, tutor_id: int, old_status: str):
+    queue.enqueue("status_changed", key=f"answer:{answer_id}", old=old_status, new="resolved", tutor_id=tutor_id)
+
+
+def feedback_given(feedback_id: int, answer_id: int, rating: int):
+    queue.enqueue("feedback_given", key=f"feedback:{feedback_id}", answer_id=answer_id, rating=rating)
+
+
+async def drained(timeout: float = JOB_DRAIN_SECONDS) -> bool:
+    """Waits until no job is queued or running; False if that takes longer than `timeout` seconds."""
+    try:
+        await asyncio.wait_for(queue.join(), timeout)
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+def reconcile_rollups(db: Session) -> dict:
+    """Recomputes the activity rollups from the source tables; returns the number of rows corrected."""
+    def tutor_total(column):
+        return select(column)\
+            .select_from(models.Answer).outerjoin(models.Feedback, models.Feedback.answer_id == models.Answer.answer_id)\
+            .where(models.Answer.tutor_id == models.Tutor.tutor_id).scalar_subquery()
+
+    answers_given = select(func.count(models.Answer.answer_id))\
+        .where(models.Answer.tutor_id == models.Tutor.tutor_id).scalar_subquery()
+    rating_count = tutor_total(func.count(models.Feedback.feedback_id))
+    rating_sum = tutor_total(func.coalesce(func.sum(models.Feedback.rating), 0))
+    tutors = db.execute(
+        update(models.Tutor)
+        .where(or_(models.Tutor.answers_given != answers_given, models.Tutor.rating_count != rating_count,
+                   models.Tutor.rating_sum != rating_sum))
+        .values(answers_given=answers_given, rating_count=rating_count, rating_sum=rating_sum)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    query_count = select(func.count(models.Query.query_id))\
+        .join(models.Session, models.Session.session_id == models.Query.session_id)\
+        .where(models.Session.student_id == models.Student.student_id).scalar_subquery()
+    students = db.execute(
+        update(models.Student)
+        .where(models.Student.query_count != query_count)
+        .values(query_count=query_count)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return {name: n for name, n in (("tutors", tutors), ("students", students)) if n}
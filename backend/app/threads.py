@@ -0,0 +1,26 @@
+"""
+Bounded worker threads for blocking work called from async code.
+
+Each kind of blocking work (DB sessions, bcrypt, image decoding) gets its own
+limit, so a burst of one kind queues behind that limit instead of taking the
+threads the others run on, or the default AnyIO pool that serves the sync
+endpoints.
+"""
+from anyio import CapacityLimiter, to_thread
+
+
+def bounded_runner(limit: int):
+    """
+    An async `run(fn, *args)` that calls the blocking `fn` on a worker thread,
+    at most `limit` at a time. The limiter is created on first use, inside the
+    event loop.
+    """
+    limiter = None
+
+    async def run(fn, *args):
+        nonlocal limiter
+        if limiter is None:
+            limiter = CapacityLimiter(limit)
+        return await to_thread.run_sync(fn, *args, limiter=limiter)
+
+    return run
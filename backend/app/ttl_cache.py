@@ -0,0 +1,74 @@
+"""A small in-process LRU cache with per-entry expiry."""
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Bounded mapping: at most `maxsize` entries, each living `ttl` seconds.
+    Reads refresh recency; inserts beyond `maxsize` evict the least recently
+    used entry. Not thread-safe; use it from the event loop only.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if key in self._data:
+            self._data.move_to_end(key)
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def items(self):
+        """Live (key, value) pairs, oldest first. Expired entries are dropped on the way."""
+        now = time.monotonic()
+        expired = []
+        for key, (expires_at, value) in list(self._data.items()):
+            if expires_at < now:
+                expired.append(key)
+            else:
+                yield key, value
+        for key in expired:
+            self._data.pop(key, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,152 @@
+"""
+Tutor work queue over the escalation table.
+
+An escalation is open while its status is "pending". Tutors see the open
+escalations for their subject (plus the unrouted "General" ones), oldest
+first, and claim them in batches. A claim records the tutor in `tutor_id` and
+a lease in `claim_expires_at`; while the lease runs the escalation is hidden
+from everyone else, and once it lapses the escalation is claimable again, so
+work abandoned by a tutor who walked away is not lost.
+"""
+import os
+from datetime import timedelta
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import joinedload
+
+from . import models, pagination
+from .database import ReadSessionLocal, run_db
+from .ttl_cache import TTLCache
+
+CLAIM_LEASE_SECONDS = int(os.getenv("CLAIM_LEASE_SECONDS", 900))
+MAX_CLAIM_BATCH = 10
+GENERAL = "General"
+# How long the subject list behind GET /subjects is reused before re-reading it.
+SUBJECTS_CACHE_TTL = float(os.getenv("SUBJECTS_CACHE_TTL", 60))
+
+_subjects_cache = TTLCache(1, SUBJECTS_CACHE_TTL)
+
+
+def _subjects(tutor):
+    return sorted({tutor.subject or GENERAL, GENERAL})
+
+
+def _load_subjects():
+    db = ReadSessionLocal()
+    try:
+        return sorted({GENERAL, *(subject for subject, in db.query(models.Tutor.subject).distinct() if subject)})
+    finally:
+        db.close()
+
+
+async def subjects():
+    """
+    Subjects an escalation can be routed to: those some tutor teaches, plus
+    General. Read from the tutor table at most once per SUBJECTS_CACHE_TTL.
+    """
+    cached = _subjects_cache.get("subjects")
+    if cached is None:
+        cached = await run_db(_load_subjects)
+        _subjects_cache.set("subjects", cached)
+    return cached
+
+
+def forget_subjects():
+    """Drop the cached subject list (a tutor registered); other workers catch up on expiry."""
+    _subjects_cache.clear()
+
+
+def route(db, subject):
+    """
+    The queue for an escalation asking for `subject`: the subject as the
+    tutors spell it, or General when no tutor teaches it (an escalation routed
+    there would never be seen). One lookup on ix_tutor_subject_lower.
+    """
+    wanted = (subject or "").strip().lower()
+    if not wanted:
+        return GENERAL
+    spelled = db.query(models.Tutor.subject).filter(func.lower(models.Tutor.subject) == wanted).limit(1).scalar()
+    return spelled or GENERAL
+
+
+def _open(tutor):
+    return (models.Escalation.status == "pending", models.Escalation.subject.in_(_subjects(tutor)))
+
+
+def _claimable(now):
+    return or_(models.Escalation.claim_expires_at.is_(None), models.Escalation.claim_expires_at < now)
+
+
+def held_by_other(esc, tutor_id, now=None):
+    now = now or models.now()
+    return esc.claim_expires_at is not None and esc.claim_expires_at >= now and esc.tutor_id != tutor_id
+
+
+def pending(db, tutor, cursor=None, limit=pagination.DEFAULT_PAGE_SIZE):
+    """Open escalations the tutor can work on (unclaimed, lapsed, or their own), oldest first."""
+    now = models.now()
+    query = db.query(models.Escalation).options(joinedload(models.Escalation.query))\
+        .filter(*_open(tutor), or_(_claimable(now), models.Escalation.tutor_id == tutor.tutor_id))
+    return pagination.paginate(query, models.Escalation.escalated_at, models.Escalation.escalation_id,
+                               cursor, limit, descending=False)
+
+
+def claim(db, tutor, limit):
+    """
+    Atomically claim up to `limit` of the oldest claimable escalations.
+    Returns all of the tutor's live claims, the new ones included.
+    """
+    now = models.now()
+    expires = now + timedelta(seconds=CLAIM_LEASE_SECONDS)
+    if db.get_bind().dialect.name == "sqlite":
+        # No row locks in SQLite, but a single UPDATE holds the database write
+        # lock, so picking and marking the rows cannot interleave with another claim.
+        candidates = select(models.Escalation.escalation_id)\
+            .where(*_open(tutor), _claimable(now))\
+            .order_by(models.Escalation.escalated_at, models.Escalation.escalation_id)\
+            .limit(limit)
+        db.query(models.Escalation).filter(models.Escalation.escalation_id.in_(candidates))\
+            .update({"tutor_id": tutor.tutor_id, "claim_expires_at": expires}, synchronize_session=False)
+    else:
+        # SKIP LOCKED: concurrent claimers each take different rows instead of
+        # queueing behind one another's locks.
+        rows = db.query(models.Escalation).filter(*_open(tutor), _claimable(now))\
+            .order_by(models.Escalation.escalated_at, models.Escalation.escalation_id)\
+            .limit(limit).with_for_update(skip_locked=True).all()
+        for esc in rows:
+            esc.tutor_id = tutor.tutor_id
+            esc.claim_expires_at = expires
+    db.commit()
+
+    return db.query(models.Escalation).options(joinedload(models.Escalation.query))\
+        .filter(models.Escalation.tutor_id == tutor.tutor_id, models.Escalation.claim_expires_at >= now,
+                models.Escalation.status == "pending")\
+        .order_by(models.Escalation.escalated_at, models.Escalation.escalation_id).all()
+
+
+def release(db, tutor, escalation_id):
+    """Hand a claimed escalation back to the queue. Returns it, or None if the caller did not hold it."""
+    esc = db.query(models.Escalation).options(joinedload(models.Escalation.query)).filter(
+        models.Escalation.escalation_id == escalation_id,
+        models.Escalation.tutor_id == tutor.tutor_id,
+        models.Escalation.status == "pending",
+        models.Escalation.claim_expires_at >= models.now(),
+    ).with_for_update(of=models.Escalation).first()
+    if esc is None:
+        return None
+    esc.tutor_id = None
+    esc.claim_expires_at = None
+    db.commit()
+    return esc
+
+
+def as_item(esc, tutor_id):
+    return {
+        "escalation_id": esc.escalation_id,
+        "query_id": esc.query_id,
+        "content": esc.query.content,
+        "subject": esc.subject,
+        "escalated_at": esc.escalated_at,
+        "timestamp": esc.query.timestamp,
+        "claim_expires_at": esc.claim_expires_at if esc.tutor_id == tutor_id else None,
+    }
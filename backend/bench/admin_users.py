@@ -0,0 +1,95 @@
+"""
+Memory and time of the admin user listing and export as the user count grows.
+
+    cd backend && python -m bench.admin_users --sizes 10000 50000 200000
+
+Seeds students and tutors (no sessions) into SQLite, then for each size
+records the Python heap peak (tracemalloc) and the time of:
+- full_list: every Student and Tutor loaded as ORM objects into one list, as
+  /admin/users used to;
+- page: one GET /admin/users page of `--limit` rows;
+- export_csv / export_ndjson: GET /admin/users/export from a live server,
+  read as a stream and discarded (the chunk count shows the batching).
+The page and export peaks should stay flat across sizes; full_list grows
+with the user count.
+"""
+import argparse
+import time
+import tracemalloc
+
+import httpx
+
+from .harness import ServerThread, configure_env, emit
+
+
+def measure(fn):
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    detail = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"peak_mib": round((peak - baseline) / 2**20, 2), "seconds": round(elapsed, 3), **(detail or {})}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args()
+
+    configure_env("http://127.0.0.1:9")
+    from app import models
+    from app.database import SessionLocal, engine
+    from app.main import app
+    from .seed import seed
+
+    models.Base.metadata.create_all(bind=engine)
+    results = []
+    with ServerThread(app) as api, httpx.Client(base_url=api.url, timeout=600) as client:
+        client.post("/register/admin", json={"name": "Bench", "email": "admin@example.com", "password": "pw"})
+        token = client.post("/login", data={"username": "admin@example.com", "password": "pw"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        def full_list():
+            db = SessionLocal()
+            try:
+                users = [{"id": s.student_id, "name": s.name, "email": s.email, "role": "Student", "joined": s.created_at}
+                         for s in db.query(models.Student).all()]
+                users += [{"id": t.tutor_id, "name": t.name, "email": t.email, "role": "Tutor", "joined": t.created_at}
+                          for t in db.query(models.Tutor).all()]
+                return {"rows": len(users)}
+            finally:
+                db.close()
+
+        def page():
+            response = client.get("/admin/users", params={"limit": args.limit}, headers=headers)
+            response.raise_for_status()
+            return {"rows": len(response.json()["items"])}
+
+        def export(fmt):
+            def run():
+                chunks = size = 0
+                with client.stream("GET", "/admin/users/export", params={"format": fmt}, headers=headers) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_bytes():
+                        chunks += 1
+                        size += len(chunk)
+                return {"chunks": chunks, "mib": round(size / 2**20, 2)}
+            return run
+
+        seeded = 0
+        for size in sorted(args.sizes):
+            seed(engine, students=size - seeded, tutors=max((size - seeded) // 50, 1), sessions_per_student=0)
+            seeded = size
+            for name, fn in [("full_list", full_list), ("page", page),
+                             ("export_csv", export("csv")), ("export_ndjson", export("ndjson"))]:
+                fn()  # warm up
+                results.append({"students": size, "case": name, **measure(fn)})
+    emit(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
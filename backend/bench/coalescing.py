@@ -0,0 +1,109 @@
+"""
+Request coalescing: a class asking the question on the board at once.
+
+    cd backend && python -m bench.coalescing --students 50 --questions 3 --latency 1.0
+
+`--students` students each open a fresh session and, within the same moment,
+ask one of `--questions` identical questions (half over /query/stream, half
+over /query). With single-flight, the fake model server should see one
+upstream call per question; every student still gets the full answer and a
+Query/Answer pair of their own. One streaming student per question hangs up
+after the first token, which must not cut the answer short for the others.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from .harness import RoundTripCounter, ServerThread, configure_env, emit, summarize
+from . import fake_llm
+
+
+async def run(app_url, llm_url, students, questions):
+    from app import nlp_engine
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=120) as client:
+        headers = []
+        for i in range(students):
+            email = f"board{i}@example.com"
+            await client.post("/register/student", json={"name": f"Board {i}", "email": email, "password": "pw"})
+            r = await client.post("/login", data={"username": email, "password": "pw"})
+            headers.append({"Authorization": f"Bearer {r.json()['access_token']}"})
+        await client.post(f"{llm_url}/stats/reset")
+
+        answers, latencies, hung_up = {}, [], set()
+
+        async def ask(i):
+            question = f"What is the derivative of x^{i % questions + 2}?"
+            start = time.perf_counter()
+            if i % 2:
+                r = await client.post("/query", json={"content": question}, headers=headers[i])
+                r.raise_for_status()
+                answers[i] = r.json()["answers"][0]["content"]
+            else:
+                async with client.stream("POST", "/query/stream", json={"content": question}, headers=headers[i]) as r:
+                    async for line in r.aiter_lines():
+                        if i < questions * 2 and line.startswith("event: token"):
+                            hung_up.add(i)  # first streaming student of each question leaves early
+                            break
+                        if line.startswith("data: ") and '"answers"' in line:
+                            answers[i] = json.loads(line[6:])["answers"][0]["content"]
+            latencies.append(time.perf_counter() - start)
+
+        before = nlp_engine.text_flights.stats()
+        await asyncio.gather(*(ask(i) for i in range(students)))
+        after = nlp_engine.text_flights.stats()
+        upstream = (await client.get(f"{llm_url}/stats")).json()
+
+        expected = {}
+        for i, answer in answers.items():
+            expected.setdefault(i % questions, set()).add(answer)
+    return {
+        "students": students,
+        "questions": questions,
+        "upstream_calls": upstream["requests"],
+        "flights": after["flights"] - before["flights"],
+        "coalesced": after["coalesced"] - before["coalesced"],
+        "answered": len(answers),
+        "hung_up": len(hung_up),
+        "distinct_answers_per_question": {q: len(a) for q, a in expected.items()},
+        "latency": summarize(latencies),
+    }
+
+
+def count_rows(engine):
+    from sqlalchemy import text
+
+    with engine.connect() as conn:
+        return {
+            "query_rows": conn.execute(text("SELECT COUNT(*) FROM query")).scalar(),
+            "answer_rows": conn.execute(text("SELECT COUNT(*) FROM answer")).scalar(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--students", type=int, default=50)
+    parser.add_argument("--questions", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=1.0, help="fake model latency in seconds")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args()
+
+    fake_llm.settings["latency"] = args.latency
+    with ServerThread(fake_llm.app) as llm:
+        configure_env(llm.url)
+        from app import models
+        from app.database import engine
+        from app.main import app
+        models.Base.metadata.create_all(bind=engine)
+        RoundTripCounter(engine)
+        with ServerThread(app) as api:
+            result = asyncio.run(run(api.url, llm.url, args.students, args.questions))
+    emit({**result, **count_rows(engine)}, args.output)
+
+
+if __name__ == "__main__":
+    main()
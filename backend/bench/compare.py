@@ -0,0 +1,92 @@
+"""
+Compares two bench.suite result files, row by row (scenario x concurrency).
+
+    cd backend && python -m bench.compare runs/before.json runs/after.json --threshold 10
+
+Prints p50 / p99 latency, throughput and DB round trips side by side with the
+change in percent, and flags rows where p99 latency or round trips grew (or
+throughput fell) by more than `--threshold` percent. Exits non-zero if any
+row regressed, so it can gate a CI job.
+"""
+import argparse
+import json
+import sys
+
+
+def _load(path):
+    with open(path) as f:
+        run = json.load(f)
+    return run["meta"], {(r["scenario"], r["concurrency"]): r for r in run["results"]}
+
+
+def _change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return round((new - old) / old * 100, 1)
+
+
+# (label, getter, True if higher is better)
+METRICS = [
+    ("p50_ms", lambda r: r["latency"].get("p50_ms"), False),
+    ("p99_ms", lambda r: r["latency"].get("p99_ms"), False),
+    ("rps", lambda r: r["throughput_rps"], True),
+    ("db_rt", lambda r: r["db_round_trips_per_request"], False),
+]
+# Noise-prone metrics that are shown but do not fail the comparison.
+_INFORMATIONAL = {"p50_ms"}
+
+
+def compare(before, after, threshold):
+    rows, regressions = [], []
+    for key in sorted(before.keys() & after.keys()):
+        row = {"scenario": key[0], "concurrency": key[1]}
+        for label, get, higher_is_better in METRICS:
+            old, new = get(before[key]), get(after[key])
+            change = _change(old, new)
+            row[label] = {"before": old, "after": new, "change_pct": change}
+            worse = change is not None and (-change if higher_is_better else change) > threshold
+            if worse and label not in _INFORMATIONAL:
+                regressions.append(f"{key[0]} c={key[1]} {label} {old} -> {new} ({change:+}%)")
+        row["errors"] = {"before": before[key]["errors"], "after": after[key]["errors"]}
+        if after[key]["errors"] > before[key]["errors"]:
+            regressions.append(f"{key[0]} c={key[1]} errors {before[key]['errors']} -> {after[key]['errors']}")
+        rows.append(row)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change counted as a regression")
+    args = parser.parse_args()
+
+    meta_before, before = _load(args.before)
+    meta_after, after = _load(args.after)
+    # The scenario selection only decides which rows exist.
+    params_before, params_after = ({k: v for k, v in m["params"].items() if k != "scenarios"} for m in (meta_before, meta_after))
+    if params_before != params_after:
+        print(f"warning: runs used different parameters:\n  {params_before}\n  {params_after}", file=sys.stderr)
+    rows, regressions = compare(before, after, args.threshold)
+
+    print(f"{meta_before['revision']} -> {meta_after['revision']}")
+    print(f"{'scenario':14} {'conc':>4}  " + "  ".join(f"{label:>24}" for label, _, _ in METRICS))
+    for row in rows:
+        cells = []
+        for label, _, _ in METRICS:
+            m = row[label]
+            change = "" if m["change_pct"] is None else f"{m['change_pct']:+.1f}%"
+            cells.append(f"{m['before']!s:>8} -> {m['after']!s:>8} {change:>6}")
+        print(f"{row['scenario']:14} {row['concurrency']:>4}  " + "  ".join(cells))
+    for key in sorted(before.keys() ^ after.keys()):
+        print(f"{key[0]} c={key[1]}: only in {'before' if key in before else 'after'}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold}%:")
+        for line in regressions:
+            print("  " + line)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
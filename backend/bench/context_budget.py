@@ -0,0 +1,105 @@
+"""
+Context budget: prompt size and latency over a long session.
+
+    cd backend && python -m bench.context_budget --turns 20 --answer-tokens 600
+
+One student asks `--turns` follow-up questions in a single session while the
+fake model answers with `--answer-tokens` words each and charges a prefill
+delay per prompt character (`--prefill` seconds per 1000). Run twice:
+- legacy: the old behaviour, the last 3 raw turns whatever their size
+  (no summary, no token budget);
+- budgeted: CONTEXT_TOKEN_BUDGET with the rolling session summary.
+For each, reports the prompt size the model received, the /query latency,
+and whether the first question is still visible to the model at the end.
+A third run, short_turns, asks more than CONTEXT_WINDOW one-line questions
+with short answers: they fit the budget, so only the window forces folding.
+Exits non-zero if the budgeted or short_turns run lost the first question.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import httpx
+
+from .harness import ServerThread, configure_env, emit, summarize
+from . import fake_llm
+
+FIRST_QUESTION = "Differentiate f(x) = x^3 sin(x) using the product rule"
+
+
+def _legacy_fit(summary, turns):
+    return None, None, turns[-3:]
+
+
+async def session(app_url, llm, email, turns, first=FIRST_QUESTION, follow_up="Follow-up"):
+    async with httpx.AsyncClient(base_url=app_url, timeout=120) as client:
+        await client.post("/register/student", json={"name": email, "email": email, "password": "pw"})
+        r = await client.post("/login", data={"username": email, "password": "pw"})
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        prompt_chars, latencies = [], []
+        for turn in range(turns):
+            question = first if turn == 0 else f"{follow_up} {turn}: now explain step {turn} in more detail"
+            before = llm.state.stats["prompt_chars_total"]
+            start = time.perf_counter()
+            (await client.post("/query", json={"content": question}, headers=headers)).raise_for_status()
+            latencies.append(time.perf_counter() - start)
+            prompt_chars.append(llm.state.stats["prompt_chars_total"] - before)
+
+    final_prompt = "\n".join(m["content"] for m in llm.state.last_messages)
+    return {
+        "prompt_chars_last": prompt_chars[-1],
+        "prompt_chars_max": max(prompt_chars),
+        "prompt_chars_mean": round(sum(prompt_chars) / len(prompt_chars)),
+        "latency": summarize(latencies),
+        "first_question_in_final_prompt": "product rule" in final_prompt,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--answer-tokens", type=int, default=600)
+    parser.add_argument("--prefill", type=float, default=0.02, help="fake prefill seconds per 1000 prompt chars")
+    parser.add_argument("--budget", type=int, help="CONTEXT_TOKEN_BUDGET for the budgeted run")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args()
+
+    llm_app = fake_llm.create_app(latency=0.05, tokens=args.answer_tokens, prefill=args.prefill)
+    with ServerThread(llm_app) as llm:
+        configure_env(llm.url)
+        from app import context, main as app_main, models
+        from app.database import engine
+        models.Base.metadata.create_all(bind=engine)
+        if args.budget:
+            context.CONTEXT_TOKEN_BUDGET = args.budget
+        budget, fit = context.CONTEXT_TOKEN_BUDGET, context.fit
+
+        with ServerThread(app_main.app) as api:
+            context.fit = _legacy_fit
+            legacy = asyncio.run(session(api.url, llm_app, "legacy@example.com", args.turns))
+            context.fit = fit
+            budgeted = asyncio.run(session(api.url, llm_app, "budgeted@example.com", args.turns))
+            # Questions of their own, so the answer cache can't serve the long answers above.
+            llm_app.state.settings["tokens"] = 5
+            short_turns = asyncio.run(session(api.url, llm_app, "short@example.com", context.CONTEXT_WINDOW + 4,
+                                              first=FIRST_QUESTION + ", briefly", follow_up="Quick check"))
+
+    emit({
+        "turns": args.turns,
+        "answer_tokens": args.answer_tokens,
+        "context_token_budget": budget,
+        "legacy": legacy,
+        "budgeted": budgeted,
+        "short_turns": short_turns,
+    }, args.output)
+    lost = [name for name, run in (("budgeted", budgeted), ("short_turns", short_turns))
+            if not run["first_question_in_final_prompt"]]
+    if lost:
+        print(f"First question lost from the context in: {', '.join(lost)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Full-scan guard for the hot request paths.
+
+Builds a SQLite database through the Alembic migrations, seeds it, drives the
+hot endpoints in-process and records every SELECT they issue. Each statement
+is then run through EXPLAIN QUERY PLAN; any plan step that scans a whole
+application table is reported and the script exits non-zero.
+
+    cd backend && python -m bench.explain_plans
+"""
+import argparse
+import re
+import sys
+
+from sqlalchemy import event
+
+from .harness import ServerThread, configure_env, emit
+from . import fake_llm
+
+# Requests that run on every page load / poll. The admin reports aggregate
+# over whole tables by design and are not listed here.
+HOT_REQUESTS = [
+    ("student", "POST", "/query", {"json": {"content": "What is a vector?"}}),
+    ("student", "POST", "/query", {"json": {"content": "And a scalar?"}}),
+    ("student", "GET", "/history", {}),
+    ("student", "GET", "/escalations", {}),
+    ("student", "GET", "/sessions", {}),
+    ("student", "GET", "/sessions/{session_id}/queries", {}),
+    ("student", "POST", "/escalate/{query_id}", {"params": {"subject": "physics"}}),
+    ("tutor", "GET", "/tutor/pending", {}),
+    ("tutor", "POST", "/tutor/claim", {}),
+    ("tutor", "POST", "/tutor/answer", {"json": {"query_id": "{query_id}", "content": "Magnitude only."}}),
+    ("student", "POST", "/feedback", {"json": {"answer_id": "{answer_id}", "rating": 5}}),
+    ("student", "GET", "/search", {"params": {"q": "vector scalar"}}),
+    ("tutor", "GET", "/search", {"params": {"q": "magnitude"}}),
+    ("admin", "GET", "/admin/stats", {}),
+]
+
+# Tables with a fixed handful of rows, where a scan is the right plan.
+SMALL_TABLES = {"system_counter"}
+
+_SCAN = re.compile(r"\bSCAN (\w+)")
+
+
+def _full_scans(plan_rows, tables):
+    scans = []
+    for row in plan_rows:
+        detail = row[-1]
+        match = _SCAN.search(detail)
+        if not match:
+            continue
+        name = re.sub(r"_\d+$", "", match.group(1))
+        if name in tables and name not in SMALL_TABLES:
+            scans.append(detail)
+    return scans
+
+
+def _fill(value, ids):
+    if isinstance(value, str):
+        return value.format(**ids) if "{" in value else value
+    if isinstance(value, dict):
+        filled = {k: _fill(v, ids) for k, v in value.items()}
+        return {k: int(v) if isinstance(v, str) and v.isdigit() else v for k, v in filled.items()}
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    with ServerThread(fake_llm.app) as llm:
+        report, failures = run(llm.url, args.students)
+
+    emit({"statements": len(report), "failures": failures, "report": report}, args.output)
+    if failures:
+        for item in report:
+            if item["full_scans"]:
+                print(f"FULL SCAN in {item['request']}: {item['full_scans']}\n  {item['sql']}", file=sys.stderr)
+        sys.exit(1)
+
+
+def run(llm_url, students):
+    configure_env(llm_url)
+    from alembic import command
+    from alembic.config import Config
+    command.upgrade(Config("alembic.ini"), "head")
+
+    from fastapi.testclient import TestClient
+    from app import models
+    from app.database import engine
+    from app.main import app
+    from .seed import seed
+
+    seed(engine, students=students, tutors=max(students // 100, 1))
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+    statements = []
+    tables = set(models.Base.metadata.tables)
+
+    with TestClient(app) as client:
+        headers = {}
+        for role in ["student", "tutor", "admin"]:
+            email = f"explain-{role}@example.com"
+            client.post(f"/register/{role}", json={"name": role, "email": email, "password": "pw", "subject": "General"})
+            token = client.post("/login", data={"username": email, "password": "pw"}).json()["access_token"]
+            headers[role] = {"Authorization": f"Bearer {token}"}
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append((path, statement, parameters))
+
+        event.listen(engine, "before_cursor_execute", record)
+        ids = {}
+        for role, method, path, kwargs in HOT_REQUESTS:
+            path = path.format(**ids) if "{" in path else path
+            response = client.request(method, path, headers=headers[role], **_fill(kwargs, ids))
+            response.raise_for_status()
+            body = response.json()
+            if path == "/query":
+                ids.update(query_id=body["query_id"], answer_id=body["answers"][0]["answer_id"])
+            if path == "/sessions":
+                ids.update(session_id=body["items"][0]["session_id"])
+        event.remove(engine, "before_cursor_execute", record)
+
+    report, failures = [], 0
+    with engine.connect() as conn:
+        for path, statement, parameters in statements:
+            plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+            scans = _full_scans(plan, tables)
+            failures += bool(scans)
+            report.append({"request": path, "sql": " ".join(statement.split()), "plan": [row[-1] for row in plan], "full_scans": scans})
+    return report, failures
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Local stand-in for the Hugging Face chat-completion API (OpenAI-compatible
+`/v1/chat/completions`), so the backend can be load-tested offline.
+
+    uvicorn bench.fake_llm:app --port 9000
+    HF_BASE_URL=http://127.0.0.1:9000 HUGGINGFACE_API_KEY=fake uvicorn app.main:app
+
+Tuning (env): FAKE_LLM_LATENCY  seconds before the first token (default 0.5)
+              FAKE_LLM_TOKENS   tokens per answer (default 20)
+              FAKE_LLM_TOKEN_DELAY  seconds between streamed tokens (default 0.01)
+              FAKE_LLM_CAPACITY  requests in flight before answering 429 (default 0: unlimited)
+              FAKE_LLM_ERROR_RATE  fraction of requests answered 503 (default 0)
+              FAKE_LLM_RETRY_AFTER  Retry-After seconds sent with a 429 (default: none)
+              FAKE_LLM_PREFILL  extra seconds per 1000 prompt characters (default 0)
+
+POST /settings with a JSON object changes any of these at runtime (keys
+without the prefix, e.g. {"capacity": 4}), to simulate an outage mid-test.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def _chunk(model, delta, finish_reason=None):
+    return {
+        "id": "fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def create_app(**overrides):
+    """A fake model server with its own settings and stats (several can run side by side)."""
+    app = FastAPI(title="Fake LLM")
+    settings = {
+        "latency": float(os.getenv("FAKE_LLM_LATENCY", 0.5)),
+        "tokens": int(os.getenv("FAKE_LLM_TOKENS", 20)),
+        "token_delay": float(os.getenv("FAKE_LLM_TOKEN_DELAY", 0.01)),
+        "capacity": int(os.getenv("FAKE_LLM_CAPACITY", 0)),
+        "error_rate": float(os.getenv("FAKE_LLM_ERROR_RATE", 0)),
+        "retry_after": os.getenv("FAKE_LLM_RETRY_AFTER"),
+        "prefill": float(os.getenv("FAKE_LLM_PREFILL", 0)),
+        **overrides,
+    }
+    stats = {"requests": 0, "in_flight": 0, "peak_in_flight": 0, "rejected_429": 0, "failed_503": 0,
+             "prompt_chars_total": 0, "prompt_chars_max": 0}
+    app.state.settings, app.state.stats = settings, stats
+    app.state.last_messages = []
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        question = body["messages"][-1]["content"]
+        words = [f"tok{i} " for i in range(settings["tokens"])]
+        prompt_chars = sum(len(m["content"]) for m in body["messages"])
+        app.state.last_messages = body["messages"]
+
+        stats["requests"] += 1
+        stats["prompt_chars_total"] += prompt_chars
+        stats["prompt_chars_max"] = max(stats["prompt_chars_max"], prompt_chars)
+        if settings["capacity"] and stats["in_flight"] >= settings["capacity"]:
+            stats["rejected_429"] += 1
+            headers = {"Retry-After": str(settings["retry_after"])} if settings["retry_after"] else {}
+            return JSONResponse({"error": "Rate limit reached"}, status_code=429, headers=headers)
+        if random.random() < settings["error_rate"]:
+            stats["failed_503"] += 1
+            return JSONResponse({"error": "Model is overloaded"}, status_code=503)
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+        try:
+            await asyncio.sleep(settings["latency"] + settings["prefill"] * prompt_chars / 1000)
+        except BaseException:
+            stats["in_flight"] -= 1
+            raise
+
+        if not body.get("stream"):
+            stats["in_flight"] -= 1
+            return {
+                "id": "fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": f"Answer to: {question}\n" + "".join(words)}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)},
+            }
+
+        async def events():
+            try:
+                yield f"data: {json.dumps(_chunk(model, {'role': 'assistant', 'content': f'Answer to: {question}'}))}\n\n"
+                for word in words:
+                    await asyncio.sleep(settings["token_delay"])
+                    yield f"data: {json.dumps(_chunk(model, {'content': word}))}\n\n"
+                yield f"data: {json.dumps(_chunk(model, {}, 'stop'))}\n\n"
+                yield "data: [DONE]\n\n"
+            finally:
+                stats["in_flight"] -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    @app.post("/stats/reset")
+    def reset_stats():
+        stats.update(requests=0, peak_in_flight=stats["in_flight"], rejected_429=0, failed_503=0,
+                     prompt_chars_total=0, prompt_chars_max=0)
+        return stats
+
+    @app.post("/settings")
+    async def update_settings(request: Request):
+        settings.update({k: v for k, v in (await request.json()).items() if k in settings})
+        return settings
+
+    return app
+
+
+app = create_app()
+settings, stats = app.state.settings, app.state.stats
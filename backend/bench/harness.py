@@ -0,0 +1,90 @@
+"""Shared plumbing for the offline benchmarks: in-process servers and stats."""
+import json
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+import uvicorn
+from sqlalchemy import event
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def configure_env(llm_url: str, db_url: str = None):
+    """Point the backend at SQLite and the fake model server. Must run before `app` is imported."""
+    if db_url is None:
+        db_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = db_url
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    os.environ["HUGGINGFACE_API_KEY"] = "fake"
+    os.environ["HF_BASE_URL"] = llm_url
+    return db_url
+
+
+class ServerThread:
+    """Runs an ASGI app with uvicorn on a background thread."""
+
+    def __init__(self, app, port: int = None):
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning", backlog=4096)
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+class RoundTripCounter:
+    """Counts DB round-trips (statements + commits/rollbacks) on an engine."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._bump)
+        event.listen(engine, "commit", self._bump)
+        event.listen(engine, "rollback", self._bump)
+
+    def _bump(self, *args, **kwargs):
+        self.count += 1
+
+
+def summarize(samples: list) -> dict:
+    """Latency summary in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+        "p50_ms": round(pick(0.50), 2),
+        "p95_ms": round(pick(0.95), 2),
+        "p99_ms": round(pick(0.99), 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def emit(result, output: str = None):
+    """Writes a benchmark result as JSON to `output`, or stdout if not given."""
+    text = json.dumps(result, indent=2, default=str)
+    if output:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
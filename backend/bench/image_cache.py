@@ -0,0 +1,108 @@
+"""
+Vision answer cache: dHash distances and a class uploading one worksheet.
+
+    cd backend && python -m bench.image_cache --students 30 --pages 8
+
+First, Hamming distances between the hash of a synthetic worksheet photo and
+edited copies of it (re-encoded, resized, brightened: what forwarding through
+a chat app does; cropped, tilted: a re-shot photo), and between distinct
+pages. Near matches are safe when every copy sits under
+IMAGE_CACHE_MAX_DISTANCE and every distinct page well above it.
+
+Then `--students` students upload copies of the same page (cycling through
+the forwarded variants) and `--pages` other pages, all asking the same
+question, with the model call stubbed out and counted. Without the cache
+every upload is a vision call; with it, only the first of each page.
+"""
+import argparse
+import io
+
+from PIL import Image, ImageEnhance, ImageOps
+
+from .harness import configure_env, emit
+from .image_pipeline import synthetic_photo
+
+QUESTION = "Solve question 3 on this worksheet"
+
+
+def _jpeg(image, quality=90):
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=quality)
+    return out.getvalue()
+
+
+def variants(photo):
+    """Edited copies of a photo: (name, JPEG bytes, expected to match)."""
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(photo)))
+    w, h = image.size
+    return [
+        ("original", photo, True),
+        ("reencoded_q60", _jpeg(image, 60), True),
+        ("resized_50pct", _jpeg(image.resize((w // 2, h // 2))), True),
+        ("brightened_15pct", _jpeg(ImageEnhance.Brightness(image).enhance(1.15)), True),
+        ("cropped_2pct", _jpeg(image.crop((w // 50, h // 50, w - w // 50, h - h // 50))), False),
+        ("tilted_1deg", _jpeg(image.rotate(1, fillcolor=(235, 230, 215))), False),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--megapixels", type=float, default=4)
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--pages", type=int, default=8, help="distinct pages")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args()
+
+    configure_env("http://127.0.0.1:9")
+
+    from fastapi.testclient import TestClient
+    from app import images, models, nlp_engine
+    from app.database import engine
+    from app.image_cache import hamming, image_cache
+    from app.main import app
+
+    pages = [synthetic_photo(args.megapixels, seed=seed) for seed in range(args.pages + 1)]
+    hashes = [images._prepare_file(io.BytesIO(page)).dhash for page in pages]
+    copies = variants(pages[0])
+    copy_distances = {
+        name: hamming(hashes[0], images._prepare_file(io.BytesIO(data)).dhash)
+        for name, data, _ in copies
+    }
+    page_distances = sorted(hamming(a, b) for i, a in enumerate(hashes) for b in hashes[i + 1:])
+
+    calls = 0
+
+    async def vision_stub(question, image):
+        nonlocal calls
+        calls += 1
+        answer = f"answer #{calls}"
+        image_cache.put(question, image, answer)
+        return answer
+
+    nlp_engine.ask_gemini_vision = vision_stub
+    models.Base.metadata.create_all(bind=engine)
+
+    forwarded = [data for _, data, matches in copies if matches]
+    uploads = [forwarded[i % len(forwarded)] for i in range(args.students)] + pages[1:]
+    with TestClient(app) as client:
+        client.post("/register/student", json={"name": "Class", "email": "class@example.com", "password": "pw"})
+        token = client.post("/login", data={"username": "class@example.com", "password": "pw"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for data in uploads:
+            client.post("/query/upload", headers=headers, data={"content": QUESTION},
+                        files={"image": ("page.jpg", data, "image/jpeg")}).raise_for_status()
+
+    emit({
+        "max_distance": image_cache.max_distance,
+        "hash_bits": 256,
+        "copy_distances": copy_distances,
+        "distinct_page_distances": {"min": page_distances[0], "max": page_distances[-1]},
+        "uploads": len(uploads),
+        "vision_calls": calls,
+        "vision_calls_without_cache": len(uploads),
+        "cache": image_cache.stats(),
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Image preprocessing benchmark: legacy decode-and-forward vs. app/images.py.
+
+    cd backend && python -m bench.image_pipeline --megapixels 4 8 12 --repeat 3
+
+For each size a synthetic phone-style photo (JPEG with an EXIF rotation) is
+base64-encoded the way the frontend sends it, then:
+- legacy: b64decode, PIL open, and the PNG re-encode the Gemini SDK applies to
+  a PIL image (what used to go over the wire);
+- prepared: images.prepare_base64 (chunked decode, draft decode, orientation,
+  downscale to IMAGE_MAX_DIMENSION, JPEG/WEBP re-encode).
+Reports time per image and the bytes that would be uploaded to the model,
+plus the throughput of a concurrent batch through the bounded worker pool.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import random
+import time
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from .harness import emit, summarize
+
+
+def synthetic_photo(megapixels, seed=0):
+    """A worksheet-like photo: paper gradient, lines of 'text', sensor noise."""
+    rng = random.Random(seed)
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    image = Image.blend(image, Image.new("RGB", (width, height), (235, 230, 215)), 0.8)
+    draw = ImageDraw.Draw(image)
+    line_height = max(height // 60, 8)
+    for y in range(line_height * 2, height - line_height, line_height * 2):
+        x = width // 20
+        while x < width * 0.9:
+            word = rng.randint(width // 80, width // 25)
+            draw.rectangle([x, y, x + word, y + line_height // 2], fill=(40, 40, 60))
+            x += word + width // 120
+    noise = Image.effect_noise((width, height), 12).convert("RGB")
+    image = Image.blend(image, noise, 0.08).filter(ImageFilter.GaussianBlur(0.6))
+
+    exif = image.getexif()
+    exif[0x0112] = 6  # taken in portrait: rotate 90 degrees on display
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=90, exif=exif)
+    return out.getvalue()
+
+
+def legacy(data_url):
+    image_bytes = base64.b64decode(data_url.split(",")[1])
+    image = Image.open(io.BytesIO(image_bytes))
+    try:
+        from google.genai._transformers import pil_to_blob
+        return len(pil_to_blob(image).data)
+    except ImportError:
+        out = io.BytesIO()
+        image.save(out, "PNG")
+        return len(out.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--megapixels", type=float, nargs="*", default=[4, 8, 12])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=16, help="concurrent uploads for the throughput run")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args()
+
+    from app import images
+
+    results = []
+    for mp in args.megapixels:
+        jpeg = synthetic_photo(mp)
+        data_url = "data:image/jpeg;base64," + base64.b64encode(jpeg).decode()
+
+        legacy_times, legacy_bytes = [], 0
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            legacy_bytes = legacy(data_url)
+            legacy_times.append(time.perf_counter() - start)
+
+        prepared_times, prepared = [], None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            prepared = images._prepare_base64(data_url)
+            prepared_times.append(time.perf_counter() - start)
+
+        async def batch():
+            start = time.perf_counter()
+            await asyncio.gather(*(images.prepare_base64(data_url) for _ in range(args.batch)))
+            return time.perf_counter() - start
+
+        wall = asyncio.run(batch())
+        results.append({
+            "megapixels": mp,
+            "upload_bytes": len(jpeg),
+            "base64_chars": len(data_url),
+            "legacy": {"time": summarize(legacy_times), "model_bytes": legacy_bytes},
+            "prepared": {
+                "time": summarize(prepared_times),
+                "model_bytes": len(prepared.data),
+                "size": prepared.size,
+                "original_size": prepared.original_size,
+            },
+            "batch_images_per_s": round(args.batch / wall, 2),
+        })
+
+    emit({
+        "max_dimension": images.IMAGE_MAX_DIMENSION,
+        "format": images.IMAGE_FORMAT,
+        "quality": images.IMAGE_QUALITY,
+        "workers": images.IMAGE_WORKERS,
+        "results": results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Burst load test for POST /query against the fake model server.
+
+    cd backend && python -m bench.load_query --requests 300 --latency 1.0
+
+Every request waits `--latency` seconds on the (fake) model. While the burst
+is in flight a probe keeps hitting GET /history, which needs a DB thread but no
+model call. With the old sync endpoint each in-flight question pinned one of
+AnyIO's 40 default threads, so upstream concurrency topped out at 40 and the
+probe queued behind the burst; with the async engine `peak_upstream_in_flight`
+should track `--requests` (up to LLM_POOL_SIZE) and the probe should stay fast.
+
+Before the burst a short sequential pass measures DB round-trips (statements
+plus commits) per /query, auth included, so N+1 regressions show up.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from .harness import RoundTripCounter, ServerThread, configure_env, emit, summarize
+from . import fake_llm
+
+
+async def run(app_url, llm_url, requests, probes, counter):
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=120) as client:
+        headers = []
+        for i in range(min(requests, 50)):
+            email = f"load{i}@example.com"
+            await client.post("/register/student", json={"name": f"Load {i}", "email": email, "password": "pw"})
+            r = await client.post("/login", data={"username": email, "password": "pw"})
+            headers.append({"Authorization": f"Bearer {r.json()['access_token']}"})
+        # Sequential pass: round-trips per request, several turns deep so the
+        # context lookup has history to load.
+        sequential = 10
+        before = counter.count
+        for i in range(sequential):
+            (await client.post("/query", json={"content": f"Warm-up question {i}"}, headers=headers[0])).raise_for_status()
+        round_trips = (counter.count - before) / sequential
+
+        await client.post(f"{llm_url}/stats/reset")
+
+        latencies, probe_latencies = [], []
+
+        async def ask(i):
+            start = time.perf_counter()
+            r = await client.post("/query", json={"content": f"What is Newton's law #{i}?"}, headers=headers[i % len(headers)])
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+        async def probe():
+            for _ in range(probes):
+                start = time.perf_counter()
+                (await client.get("/history", headers=headers[0])).raise_for_status()
+                probe_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.05)
+
+        start = time.perf_counter()
+        await asyncio.gather(probe(), *(ask(i) for i in range(requests)))
+        wall = time.perf_counter() - start
+        upstream = (await client.get(f"{llm_url}/stats")).json()
+
+    return {
+        "requests": requests,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(requests / wall, 2),
+        "query_latency": summarize(latencies),
+        "probe_latency": summarize(probe_latencies),
+        "peak_upstream_in_flight": upstream["peak_in_flight"],
+        "db_round_trips_per_query": round(round_trips, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=1.0, help="fake model latency in seconds")
+    parser.add_argument("--probes", type=int, default=20)
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args()
+
+    fake_llm.settings["latency"] = args.latency
+    with ServerThread(fake_llm.app) as llm:
+        configure_env(llm.url)
+        from app import models
+        from app.database import engine
+        from app.main import app
+        models.Base.metadata.create_all(bind=engine)
+        counter = RoundTripCounter(engine)
+        with ServerThread(app) as api:
+            result = asyncio.run(run(api.url, llm.url, args.requests, args.probes, counter))
+    emit(result, args.output)
+
+
+if __name__ == "__main__":
+    main()
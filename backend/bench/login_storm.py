@@ -0,0 +1,108 @@
+"""
+Login storm: a class full of students logging in at the same moment.
+
+    cd backend && python -m bench.login_storm --logins 100 --cost 12 --rounds 10 11 12 13
+
+First, a single bcrypt hash and verify is timed at every cost in `--rounds`:
+each step up doubles the CPU per login, which is the number to weigh when
+choosing BCRYPT_ROUNDS. Then `--logins` seeded students (hashed at `--cost`)
+all POST /login at once while a probe keeps hitting GET /. Logins should
+drain at about PASSWORD_HASH_WORKERS / verify-time per second, cost one
+lookup per attempt, and leave the probe (the event loop) responsive.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from .harness import RoundTripCounter, ServerThread, configure_env, emit, summarize
+
+PASSWORD = "storm-password"
+
+
+def time_costs(rounds, samples=3):
+    import bcrypt
+
+    result = {}
+    for cost in rounds:
+        hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(cost))
+        start = time.perf_counter()
+        for _ in range(samples):
+            bcrypt.checkpw(PASSWORD.encode(), hashed)
+        result[str(cost)] = round((time.perf_counter() - start) / samples * 1000, 1)
+    return result
+
+
+async def storm(app_url, emails, probes, counter):
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=300) as client:
+        latencies, probe_latencies = [], []
+
+        async def login(email):
+            start = time.perf_counter()
+            r = await client.post("/login", data={"username": email, "password": PASSWORD})
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+        async def probe():
+            for _ in range(probes):
+                start = time.perf_counter()
+                (await client.get("/")).raise_for_status()
+                probe_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.05)
+
+        before = counter.count
+        start = time.perf_counter()
+        await asyncio.gather(probe(), *(login(email) for email in emails))
+        wall = time.perf_counter() - start
+
+    return {
+        "logins": len(emails),
+        "wall_s": round(wall, 3),
+        "logins_per_s": round(len(emails) / wall, 2),
+        "login_latency": summarize(latencies),
+        "probe_latency": summarize(probe_latencies),
+        "db_round_trips_per_login": round((counter.count - before) / len(emails), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--cost", type=int, default=12, help="BCRYPT_ROUNDS for the seeded accounts and the app")
+    parser.add_argument("--workers", type=int, help="PASSWORD_HASH_WORKERS (default: CPU count)")
+    parser.add_argument("--rounds", type=int, nargs="*", default=[10, 11, 12, 13], help="costs to time")
+    parser.add_argument("--probes", type=int, default=20)
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args()
+
+    os.environ["BCRYPT_ROUNDS"] = str(args.cost)
+    if args.workers:
+        os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    configure_env("http://127.0.0.1:9")
+
+    from app import models, passwords
+    from app.database import engine
+    from app.main import app
+    from .seed import seed
+
+    models.Base.metadata.create_all(bind=engine)
+    seed(engine, students=args.logins, tutors=1, sessions_per_student=1, queries_per_session=1,
+         password_hash=passwords.pwd_context.hash(PASSWORD))
+    emails = [f"student{i}@example.com" for i in range(1, args.logins + 1)]
+
+    counter = RoundTripCounter(engine)
+    with ServerThread(app) as api:
+        result = asyncio.run(storm(api.url, emails, args.probes, counter))
+    emit({
+        "verify_ms_by_cost": time_costs(args.rounds),
+        "cost": args.cost,
+        "hash_workers": passwords.PASSWORD_HASH_WORKERS,
+        **result,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Provider overload: rate limits, retries, circuit breaking and failover.
+
+    cd backend && python -m bench.provider_overload --requests 60 --capacity 8
+
+Two fake model servers run in-process: the primary (standing in for Hugging
+Face) answers 429 once more than `--capacity` calls are in flight, and a
+healthy local fallback (LOCAL_LLM_URL). Phases, each a burst of `--requests`
+concurrent POST /query:
+- overload: the primary is saturated; excess calls are retried with backoff,
+  then fail over to the local server (or, with `--concurrency`, queue on our
+  side instead of being rejected upstream);
+- outage: the primary answers 503 to everything; its breaker should open
+  after LLM_BREAKER_FAILURES calls and the rest go straight to the fallback;
+- total outage: both fail; every query must come back 503 and be stored as
+  status "failed" with no Answer row;
+- recovery: both are healthy again; after the breaker cooldown one probe
+  call closes the breaker and traffic returns to the primary.
+Exits non-zero when one of those guarantees does not hold (see `check`).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+from .harness import ServerThread, configure_env, emit, summarize
+from . import fake_llm
+
+
+def _delta(after, before):
+    return {k: v - before.get(k, 0) for k, v in after.items() if isinstance(v, (int, float))}
+
+
+async def burst(client, headers, requests, tag):
+    latencies, codes = [], Counter()
+
+    async def ask(i):
+        start = time.perf_counter()
+        r = await client.post("/query", json={"content": f"{tag} question {i}"}, headers=headers[i % len(headers)])
+        latencies.append(time.perf_counter() - start)
+        codes[r.status_code] += 1
+
+    await asyncio.gather(*(ask(i) for i in range(requests)))
+    return {"status_codes": dict(codes), "latency": summarize(latencies)}
+
+
+async def run(app_url, primary, fallback, requests, cooldown):
+    from app import nlp_engine
+
+    route = nlp_engine.text_route
+    targets = {t.name: t for t in route.targets}
+    primary_target = route.targets[0]
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=120) as client:
+        headers = []
+        for i in range(min(requests, 20)):
+            email = f"overload{i}@example.com"
+            await client.post("/register/student", json={"name": f"Overload {i}", "email": email, "password": "pw"})
+            r = await client.post("/login", data={"username": email, "password": "pw"})
+            headers.append({"Authorization": f"Bearer {r.json()['access_token']}"})
+
+        async def phase(name, primary_settings, fallback_settings):
+            primary.state.settings.update(primary_settings)
+            fallback.state.settings.update(fallback_settings)
+            before = {n: dict(t.stats) for n, t in targets.items()}
+            upstream_before = dict(primary.state.stats)
+            result = await burst(client, headers, requests, name)
+            result["targets"] = {
+                n: {**_delta(t.stats, before[n]), "breaker": t.breaker.state} for n, t in targets.items() if t.enabled
+            }
+            result["primary_upstream"] = _delta(primary.state.stats, upstream_before)
+            return result
+
+        healthy = {"error_rate": 0.0}
+        results = {"overload": await phase("overload", healthy, healthy)}
+        results["outage"] = await phase("outage", {"error_rate": 1.0}, healthy)
+        results["total_outage"] = await phase("total_outage", {"error_rate": 1.0}, {"error_rate": 1.0})
+        # Once the cooldown has passed, the next call is the half-open probe;
+        # only it is let through, so send it alone, as steady traffic would.
+        await asyncio.sleep(cooldown)
+        primary.state.settings.update(healthy)
+        fallback.state.settings.update(healthy)
+        probe = await client.post("/query", json={"content": "recovery probe"}, headers=headers[0])
+        probe_breaker = primary_target.breaker.state
+        results["recovery"] = {"probe_status": probe.status_code, "breaker_after_probe": probe_breaker,
+                               **await phase("recovery", healthy, healthy)}
+    return results
+
+
+def check(result):
+    """The overload guarantees; returns a description of each one that failed."""
+    phases = result["phases"]
+    primary = result["primary_target"]
+    problems = []
+    codes = phases["total_outage"]["status_codes"]
+    if set(codes) != {503}:
+        problems.append(f"total_outage: expected only 503s, got {codes}")
+    if result["failed_queries_with_answer_rows"]:
+        problems.append(f"{result['failed_queries_with_answer_rows']} failed queries have answer rows")
+    outage = phases["outage"]["targets"][primary]
+    if outage["breaker"] != "open" or not outage["short_circuited"]:
+        problems.append(f"outage: the {primary} breaker did not open ({outage})")
+    if phases["recovery"]["breaker_after_probe"] != "closed":
+        problems.append(f"recovery: the probe left the {primary} breaker {phases['recovery']['breaker_after_probe']}")
+    return problems
+
+
+def failed_queries_without_answers(engine):
+    from sqlalchemy import text
+
+    with engine.connect() as conn:
+        failed = conn.execute(text("SELECT COUNT(*) FROM query WHERE status = 'failed'")).scalar()
+        answered = conn.execute(text(
+            "SELECT COUNT(*) FROM query q JOIN answer a ON a.query_id = q.query_id WHERE q.status = 'failed'"
+        )).scalar()
+    return {"failed_queries": failed, "failed_queries_with_answer_rows": answered}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--capacity", type=int, default=8, help="primary's in-flight limit before it answers 429")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model latency in seconds")
+    parser.add_argument("--concurrency", type=int, help="LLM_TEXT_CONCURRENCY (default: unlimited up to LLM_POOL_SIZE)")
+    parser.add_argument("--cooldown", type=float, default=2.0, help="LLM_BREAKER_COOLDOWN for the run")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args()
+
+    primary = fake_llm.create_app(latency=args.latency, capacity=args.capacity)
+    fallback = fake_llm.create_app(latency=args.latency)
+    os.environ["LLM_BREAKER_COOLDOWN"] = str(args.cooldown)
+    if args.concurrency:
+        os.environ["LLM_TEXT_CONCURRENCY"] = str(args.concurrency)
+
+    with ServerThread(primary) as primary_server, ServerThread(fallback) as fallback_server:
+        configure_env(primary_server.url)
+        os.environ["LOCAL_LLM_URL"] = fallback_server.url
+        from app import models, nlp_engine, providers
+        from app.database import engine
+        from app.main import app
+        models.Base.metadata.create_all(bind=engine)
+        with ServerThread(app) as api:
+            phases = asyncio.run(run(api.url, primary, fallback, args.requests, args.cooldown + 0.5))
+
+    result = {
+        "requests_per_phase": args.requests,
+        "primary_capacity": args.capacity,
+        "retries": providers.LLM_RETRIES,
+        "breaker_failures": providers.LLM_BREAKER_FAILURES,
+        "primary_target": nlp_engine.text_route.targets[0].name,
+        "phases": phases,
+        **failed_queries_without_answers(engine),
+    }
+    emit(result, args.output)
+    problems = check(result)
+    if problems:
+        for problem in problems:
+            print(f"FAILED: {problem}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
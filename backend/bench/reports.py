@@ -0,0 +1,63 @@
+"""
+Latency and DB round-trips of the admin dashboard endpoints as the user
+count grows. Each step seeds more synthetic users into a SQLite database and
+times GET /admin/reports and /admin/stats in-process.
+
+    cd backend && python -m bench.reports --sizes 1000 10000 50000
+
+Set-based aggregates keep `round_trips` constant across sizes; the old
+per-tutor/per-student COUNT loop grew linearly with them.
+"""
+import argparse
+import time
+
+from .harness import RoundTripCounter, configure_env, emit, summarize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--endpoints", nargs="+", default=["/admin/reports", "/admin/stats"])
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args()
+
+    configure_env("http://127.0.0.1:9")
+    from fastapi.testclient import TestClient
+    from app import models
+    from app.database import engine
+    from app.main import app
+    from .seed import seed
+
+    models.Base.metadata.create_all(bind=engine)
+    counter = RoundTripCounter(engine)
+    results = []
+    with TestClient(app) as client:
+        client.post("/register/admin", json={"name": "Bench", "email": "admin@example.com", "password": "pw"})
+        token = client.post("/login", data={"username": "admin@example.com", "password": "pw"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        seeded = 0
+        for size in sorted(args.sizes):
+            seed(engine, students=size - seeded, tutors=max((size - seeded) // 100, 1))
+            seeded = size
+            # Seeding bypasses the write paths, so bring the counters up to date.
+            client.post("/admin/stats/reconcile", headers=headers).raise_for_status()
+            for endpoint in args.endpoints:
+                client.get(endpoint, headers=headers).raise_for_status()  # warm up
+                samples, before = [], counter.count
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    client.get(endpoint, headers=headers).raise_for_status()
+                    samples.append(time.perf_counter() - start)
+                results.append({
+                    "students": size,
+                    "endpoint": endpoint,
+                    "round_trips": (counter.count - before) / args.repeat,
+                    "latency": summarize(samples),
+                })
+    emit(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
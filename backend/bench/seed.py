@@ -0,0 +1,90 @@
+"""
+Bulk-loads a synthetic but realistically shaped dataset for the benchmarks.
+Import it after `harness.configure_env`, since it pulls in the app models.
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from app import models
+
+# Not a valid bcrypt hash: by default seeded users cannot log in.
+_PLACEHOLDER_PASSWORD = "!seeded"
+SUBJECTS = ["Math", "Physics", "Chemistry", "Biology", "General"]
+
+
+def seed(engine, students=1000, tutors=50, sessions_per_student=2, queries_per_session=3,
+         escalation_rate=0.1, batch=5000, rng=None, password_hash=_PLACEHOLDER_PASSWORD):
+    """
+    Inserts students, tutors, sessions, queries, AI answers and escalations
+    (a share resolved by tutors) with Core bulk inserts. Returns row counts.
+    Pass a real `password_hash` to make the seeded accounts usable for login.
+    """
+    rng = rng or random.Random(42)
+    start = datetime(2025, 1, 1)
+    counts = dict.fromkeys(["students", "tutors", "sessions", "queries", "answers", "escalations"], 0)
+
+    def flush(table, rows, key):
+        if rows:
+            with engine.begin() as conn:
+                conn.execute(insert(table), rows)
+            counts[key] += len(rows)
+            rows.clear()
+
+    with engine.begin() as conn:
+        next_id = lambda column: (conn.execute(select(func.max(column))).scalar() or 0) + 1
+        first_student = next_id(models.Student.student_id)
+        first_tutor = next_id(models.Tutor.tutor_id)
+        first_session = next_id(models.Session.session_id)
+        first_query = next_id(models.Query.query_id)
+
+    tutor_rows = [
+        {"tutor_id": first_tutor + i, "name": f"Tutor {first_tutor + i}", "email": f"tutor{first_tutor + i}@example.com",
+         "password": password_hash, "subject": SUBJECTS[i % len(SUBJECTS)], "created_at": start}
+        for i in range(tutors)
+    ]
+    flush(models.Tutor.__table__, tutor_rows, "tutors")
+
+    student_rows, session_rows, query_rows, answer_rows, escalation_rows = [], [], [], [], []
+    session_id, query_id = first_session, first_query
+    for i in range(students):
+        student_id = first_student + i
+        joined = start + timedelta(minutes=i)
+        student_rows.append({"student_id": student_id, "name": f"Student {student_id}", "email": f"student{student_id}@example.com",
+                             "password": password_hash, "created_at": joined})
+        for s in range(sessions_per_student):
+            started = joined + timedelta(days=s)
+            session_rows.append({"session_id": session_id, "student_id": student_id, "started_at": started,
+                                 "ended_at": started + timedelta(hours=1) if s < sessions_per_student - 1 else None})
+            for q in range(rng.randint(1, queries_per_session * 2 - 1)):
+                asked = started + timedelta(minutes=q)
+                escalated = rng.random() < escalation_rate
+                resolved = escalated and tutors and rng.random() < 0.5
+                status = "resolved" if resolved else "escalated" if escalated else "answered"
+                query_rows.append({"query_id": query_id, "session_id": session_id, "content": f"Question {query_id}: what is topic {rng.randint(1, 500)}?",
+                                   "timestamp": asked, "status": status})
+                answer_rows.append({"query_id": query_id, "content": f"AI answer for question {query_id}.", "timestamp": asked, "is_ai": 1, "is_cached": 0})
+                if escalated:
+                    tutor_id = first_tutor + rng.randrange(tutors) if resolved else None
+                    escalation_rows.append({"query_id": query_id, "tutor_id": tutor_id, "escalated_at": asked + timedelta(minutes=1),
+                                            "status": "resolved" if resolved else "pending"})
+                    if resolved:
+                        answer_rows.append({"query_id": query_id, "tutor_id": tutor_id, "content": f"Tutor answer for {query_id}.",
+                                            "timestamp": asked + timedelta(minutes=5), "is_ai": 0, "is_cached": 0})
+                query_id += 1
+            session_id += 1
+
+        if len(query_rows) >= batch:
+            flush(models.Student.__table__, student_rows, "students")
+            flush(models.Session.__table__, session_rows, "sessions")
+            flush(models.Query.__table__, query_rows, "queries")
+            flush(models.Answer.__table__, answer_rows, "answers")
+            flush(models.Escalation.__table__, escalation_rows, "escalations")
+
+    flush(models.Student.__table__, student_rows, "students")
+    flush(models.Session.__table__, session_rows, "sessions")
+    flush(models.Query.__table__, query_rows, "queries")
+    flush(models.Answer.__table__, answer_rows, "answers")
+    flush(models.Escalation.__table__, escalation_rows, "escalations")
+    return counts
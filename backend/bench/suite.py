@@ -0,0 +1,208 @@
+"""
+End-to-end benchmark suite: the main endpoints at set concurrency levels.
+
+    cd backend && python -m bench.suite --students 5000 --concurrency 1 10 50 --output runs/today.json
+    python -m bench.compare runs/yesterday.json runs/today.json
+
+Runs offline: SQLite (through the Alembic migrations) and the fake model
+server, with `--llm-latency` before the first token and `--token-delay`
+between streamed tokens. Seeds `--students` students (with `--tutors` tutors,
+sessions, queries, answers and escalations in the shapes of seed.py) whose
+password is "pw", hashed at `--bcrypt-rounds`, then drives each scenario with
+`--requests` requests at every `--concurrency` level. Each concurrent client
+acts as a different seeded user (tokens are minted directly; the login
+scenario goes through /login).
+
+Every result row reports latency percentiles, throughput, errors and DB round
+trips per request (statements plus commits, including the background jobs the
+requests queued). The streaming scenario also reports time to first token.
+The output JSON carries the git revision and parameters, so runs can be kept
+and compared with bench.compare.
+"""
+import argparse
+import asyncio
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+from sqlalchemy import select
+
+from .harness import RoundTripCounter, ServerThread, configure_env, emit, summarize
+from . import fake_llm
+
+
+def _question(i):
+    # Distinct text per request, so the answer cache and coalescing stay out of the way.
+    return f"Benchmark question {i}: how does topic {i % 97} relate to topic {i % 89}?"
+
+
+async def _stream(client, headers, i, first_token):
+    start = time.perf_counter()
+    async with client.stream("POST", "/query/stream", json={"content": _question(i)}, headers=headers) as r:
+        done = False
+        async for line in r.aiter_lines():
+            if line.startswith("event: token") and not first_token.get(i):
+                first_token[i] = time.perf_counter() - start
+            done = done or line.startswith("event: done")
+    return r.status_code if done else 599
+
+
+SCENARIOS = {
+    "login": lambda c, u, i, ctx: c.post("/login", data={"username": u["email"], "password": "pw"}),
+    "query": lambda c, u, i, ctx: c.post("/query", json={"content": _question(i)}, headers=u["headers"]),
+    "query_stream": lambda c, u, i, ctx: _stream(c, u["headers"], i, ctx["first_token"]),
+    "history": lambda c, u, i, ctx: c.get("/history", headers=u["headers"]),
+    "tutor_pending": lambda c, u, i, ctx: c.get("/tutor/pending", headers=u["headers"]),
+    "admin_stats": lambda c, u, i, ctx: c.get("/admin/stats", headers=u["headers"]),
+    "admin_reports": lambda c, u, i, ctx: c.get("/admin/reports", headers=u["headers"]),
+    "admin_users": lambda c, u, i, ctx: c.get("/admin/users", headers=u["headers"]),
+}
+# Which seeded accounts each scenario runs as.
+ROLES = {"tutor_pending": "tutor", "admin_stats": "admin", "admin_reports": "admin", "admin_users": "admin"}
+
+
+async def drive(app_url, scenario, users, requests, concurrency, counter, settle):
+    """Runs `requests` requests of `scenario` with `concurrency` concurrent clients."""
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    ctx = {"first_token": {}}
+    latencies, errors = [], 0
+    next_request = iter(range(requests))
+
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=300) as client:
+        async def client_loop(n):
+            nonlocal errors
+            user = users[n % len(users)]
+            for i in next_request:
+                start = time.perf_counter()
+                try:
+                    response = await SCENARIOS[scenario](client, user, i, ctx)
+                    status = response if isinstance(response, int) else response.status_code
+                except httpx.HTTPError:
+                    status = 599
+                latencies.append(time.perf_counter() - start)
+                errors += status >= 400
+
+        before = counter.count
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(n) for n in range(concurrency)))
+        wall = time.perf_counter() - start
+        await settle()
+
+    row = {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(requests / wall, 2),
+        "latency": summarize(latencies),
+        "db_round_trips_per_request": round((counter.count - before) / requests, 2),
+    }
+    if ctx["first_token"]:
+        row["time_to_first_token"] = summarize(list(ctx["first_token"].values()))
+    return row
+
+
+def _accounts(engine, pk, role, create_access_token, where):
+    """Seeded accounts matching `where`, each with a bearer token minted as /login would."""
+    with engine.connect() as conn:
+        rows = conn.execute(select(pk, pk.class_.email).where(where).order_by(pk)).all()
+    return [{"email": email, "headers": {"Authorization": "Bearer " + create_access_token(
+                {"sub": email, "role": role, "uid": user_id})}} for user_id, email in rows]
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--tutors", type=int, help="default: students / 50")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and concurrency level")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests before each scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake model seconds before the first token")
+    parser.add_argument("--llm-tokens", type=int, default=40)
+    parser.add_argument("--token-delay", type=float, default=0.005, help="fake model seconds between streamed tokens")
+    parser.add_argument("--bcrypt-rounds", type=int, default=6, help="cost of the seeded password hashes and of login")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args()
+    tutors = args.tutors or max(args.students // 50, 1)
+
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    llm_app = fake_llm.create_app(latency=args.llm_latency, tokens=args.llm_tokens, token_delay=args.token_delay)
+    with ServerThread(llm_app) as llm:
+        db_url = configure_env(llm.url)
+        from alembic import command
+        from alembic.config import Config
+        command.upgrade(Config("alembic.ini"), "head")
+
+        from app import jobs, models, passwords
+        from app.database import engine
+        from app.main import _reconcile_stats, app, create_access_token
+        from .seed import seed
+
+        rng = random.Random(args.seed)
+        seeded = seed(engine, students=args.students, tutors=tutors, rng=rng,
+                      password_hash=passwords.pwd_context.hash("pw"))
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+        _reconcile_stats()
+
+        pool = max(args.concurrency)
+        student_ids = rng.sample(range(1, args.students + 1), min(pool, args.students))
+        users = {
+            "student": _accounts(engine, models.Student.student_id, "student", create_access_token,
+                                 models.Student.student_id.in_(student_ids)),
+            "tutor": _accounts(engine, models.Tutor.tutor_id, "tutor", create_access_token,
+                               models.Tutor.tutor_id <= pool),
+        }
+
+        counter = RoundTripCounter(engine)
+        results = []
+        with ServerThread(app) as api:
+            with httpx.Client(base_url=api.url) as client:
+                client.post("/register/admin", json={"name": "Bench Admin", "email": "bench-admin@example.com", "password": "pw"})
+                token = client.post("/login", data={"username": "bench-admin@example.com", "password": "pw"}).json()["access_token"]
+            users["admin"] = [{"email": "bench-admin@example.com", "headers": {"Authorization": f"Bearer {token}"}}]
+
+            async def settle():
+                # Count the background work the scenario queued against it, not the next one.
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(jobs.queue.join(), jobs.queue._loop))
+
+            for scenario in args.scenarios:
+                role_users = users[ROLES.get(scenario, "student")]
+                if args.warmup:
+                    asyncio.run(drive(api.url, scenario, role_users, args.warmup, 1, counter, settle))
+                for concurrency in args.concurrency:
+                    row = asyncio.run(drive(api.url, scenario, role_users, args.requests, concurrency, counter, settle))
+                    results.append(row)
+                    print(f"{scenario:14} c={concurrency:<4} p50={row['latency'].get('p50_ms')}ms "
+                          f"p99={row['latency'].get('p99_ms')}ms {row['throughput_rps']} rps errors={row['errors']}", file=sys.stderr)
+
+    emit({
+        "meta": {
+            "revision": _git_revision(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "database": db_url.split(":")[0],
+            "params": {k: v for k, v in vars(args).items() if k != "output"},
+        },
+        "seeded": seeded,
+        "results": results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
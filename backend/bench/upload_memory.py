@@ -0,0 +1,94 @@
+"""
+Upload memory: base64-in-JSON (/query) vs. multipart (/query/upload).
+
+    cd backend && python -m bench.upload_memory --megapixels 4 8 12 --repeat 3
+
+The same synthetic phone photo is posted both ways through an in-process
+client, with the model call stubbed out so only the upload path is measured.
+Request bodies are built before measuring; for each request the Python heap
+peak (tracemalloc) above the starting level is recorded. The JSON path holds
+the raw body, the decoded JSON string and the validated field at once
+(each ~1.33x the image); the multipart parser spools the file part to disk
+past 1 MB and the preprocessor reads it from there. Pillow's pixel buffers
+are not on the Python heap, so the peaks cover only the request handling.
+"""
+import argparse
+import base64
+import time
+import tracemalloc
+
+from .harness import configure_env, emit, summarize
+from .image_pipeline import synthetic_photo
+
+
+def measure(client, request, repeat):
+    peaks, times = [], []
+    for _ in range(repeat):
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        response = client.send(request)
+        times.append(time.perf_counter() - start)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        response.raise_for_status()
+        peaks.append(peak - baseline)
+    return {
+        "wire_bytes": len(request.content),
+        "peak_mib": round(max(peaks) / 2**20, 2),
+        "time": summarize(times),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--megapixels", type=float, nargs="*", default=[4, 8, 12])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args()
+
+    configure_env("http://127.0.0.1:9")
+
+    from fastapi.testclient import TestClient
+    from app import models, nlp_engine
+    from app.database import engine
+    from app.main import app
+
+    async def vision_stub(question, image):
+        return f"{image.size[0]}x{image.size[1]} {image.mime_type}"
+
+    nlp_engine.ask_gemini_vision = vision_stub
+    models.Base.metadata.create_all(bind=engine)
+
+    results = []
+    with TestClient(app) as client:
+        client.post("/register/student", json={"name": "Upload", "email": "upload@example.com", "password": "pw"})
+        token = client.post("/login", data={"username": "upload@example.com", "password": "pw"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        for mp in args.megapixels:
+            jpeg = synthetic_photo(mp)
+            data_url = "data:image/jpeg;base64," + base64.b64encode(jpeg).decode()
+            as_json = client.build_request(
+                "POST", "/query", headers=headers,
+                json={"content": "What is on this worksheet?", "image": data_url})
+            as_multipart = client.build_request(
+                "POST", "/query/upload", headers=headers,
+                data={"content": "What is on this worksheet?"},
+                files={"image": ("worksheet.jpg", jpeg, "image/jpeg")})
+            as_json.read()
+            as_multipart.read()
+            del data_url
+
+            results.append({
+                "megapixels": mp,
+                "image_bytes": len(jpeg),
+                "base64_json": measure(client, as_json, args.repeat),
+                "multipart": measure(client, as_multipart, args.repeat),
+            })
+
+    emit({"results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Write paths with and without the background job queue.
+
+    cd backend && python -m bench.write_paths --rounds 50 --db-rtt 2
+
+Each round a student asks a question (/query, fake model), escalates it, a
+tutor answers (/tutor/answer) and the student rates the answer (/feedback).
+`--db-rtt` milliseconds are added to every DB round trip to stand in for a
+database across the network. Run twice:
+- queued: counters, rollups and pushes go to the job queue (jobs.py);
+- inline: the same job handlers run inside the request instead, each in a
+  transaction of its own, as a stand-in for the old synchronous writes.
+For each endpoint, reports the DB round trips the request itself made and its
+latency; both runs must end with the same dashboard counters and reports.
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from sqlalchemy import event
+
+from .harness import ServerThread, configure_env, emit, summarize
+from . import fake_llm
+
+ENDPOINTS = ["/query", "/escalate", "/tutor/answer", "/feedback"]
+
+
+def run(client, mode, rounds, rtt):
+    from app import jobs
+    from app.database import engine
+
+    in_job = threading.local()
+    run_in_transaction = jobs.JobQueue._run_in_transaction
+
+    def tagged(fn, job):
+        in_job.active = True
+        try:
+            return run_in_transaction(fn, job)
+        finally:
+            in_job.active = False
+
+    def inline_enqueue(kind, key=None, **payload):
+        fn, uses_db = jobs.queue._handlers[kind]
+        if not uses_db:
+            return original_enqueue(kind, key=key, **payload)
+        run_in_transaction(fn, jobs.Job(kind, payload, key=key))
+        return True
+
+    round_trips = {"count": 0}
+
+    def on_round_trip(*args, **kwargs):
+        if rtt:
+            time.sleep(rtt / 1000)
+        if not getattr(in_job, "active", False):
+            round_trips["count"] += 1
+
+    original_enqueue = jobs.queue.enqueue
+    jobs.JobQueue._run_in_transaction = staticmethod(tagged)
+    if mode == "inline":
+        jobs.queue.enqueue = inline_enqueue
+    for name in ("before_cursor_execute", "commit", "rollback"):
+        event.listen(engine, name, on_round_trip)
+    try:
+        headers = {}
+        for role in ("student", "tutor", "admin"):
+            email = f"{mode}-{role}@example.com"
+            client.post(f"/register/{role}", json={"name": role, "email": email, "password": "pw", "subject": "General"})
+            token = client.post("/login", data={"username": email, "password": "pw"}).json()["access_token"]
+            headers[role] = {"Authorization": f"Bearer {token}"}
+
+        samples = {path: {"latency": [], "round_trips": []} for path in ENDPOINTS}
+
+        def timed(path, role, method, url, **kwargs):
+            before, start = round_trips["count"], time.perf_counter()
+            response = client.request(method, url, headers=headers[role], **kwargs)
+            samples[path]["latency"].append(time.perf_counter() - start)
+            samples[path]["round_trips"].append(round_trips["count"] - before)
+            response.raise_for_status()
+            return response.json()
+
+        for i in range(rounds):
+            query = timed("/query", "student", "POST", "/query", json={"content": f"{mode} question {i}"})
+            timed("/escalate", "student", "POST", f"/escalate/{query['query_id']}")
+            timed("/tutor/answer", "tutor", "POST", "/tutor/answer", json={"query_id": query["query_id"], "content": "See the worked example."})
+            answer_id = client.get("/history", headers=headers["student"]).json()["items"][0]["queries"][-1]["answers"][-1]["answer_id"]
+            timed("/feedback", "student", "POST", "/feedback", json={"answer_id": answer_id, "rating": 1 + i % 5})
+
+        asyncio.run_coroutine_threadsafe(jobs.queue.join(), jobs.queue._loop).result(timeout=60)
+        reports = client.get("/admin/reports", headers=headers["admin"]).json()
+        return {
+            "endpoints": {
+                path: {"round_trips": sum(s["round_trips"]) / len(s["round_trips"]), "latency": summarize(s["latency"])}
+                for path, s in samples.items()
+            },
+            "tutor_performance": [t for t in reports["tutor_performance"] if t["tutor_name"] == "tutor"][-1:],
+        }
+    finally:
+        for name in ("before_cursor_execute", "commit", "rollback"):
+            event.remove(engine, name, on_round_trip)
+        jobs.JobQueue._run_in_transaction = staticmethod(run_in_transaction)
+        jobs.queue.enqueue = original_enqueue
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--db-rtt", type=float, default=2.0, help="milliseconds added to each DB round trip")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args()
+
+    fake_llm.settings["latency"] = 0
+    with ServerThread(fake_llm.app) as llm:
+        configure_env(llm.url)
+        from fastapi.testclient import TestClient
+        from app import models
+        from app.database import engine
+        from app.main import app
+        models.Base.metadata.create_all(bind=engine)
+
+        with TestClient(app) as client:
+            result = {mode: run(client, mode, args.rounds, args.db_rtt) for mode in ("inline", "queued")}
+            admin = client.post("/login", data={"username": "queued-admin@example.com", "password": "pw"}).json()["access_token"]
+            result["stats"] = client.get("/admin/stats", headers={"Authorization": f"Bearer {admin}"}).json()
+    emit({"rounds": args.rounds, "db_rtt_ms": args.db_rtt, **result}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Initial schema, as previously created by metadata.create_all.
+
+Databases created before migrations existed already have these tables:
+mark them with `alembic stamp 0001` and then run `alembic upgrade head`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "student",
+        sa.Column("student_id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("name", sa.String(100), nullable=False),
+        sa.Column("email", sa.String(100), nullable=False, unique=True),
+        sa.Column("password", sa.String(255), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_table(
+        "tutor",
+        sa.Column("tutor_id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("name", sa.String(100), nullable=False),
+        sa.Column("email", sa.String(100), nullable=False, unique=True),
+        sa.Column("password", sa.String(255), nullable=False),
+        sa.Column("subject", sa.String(100), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_table(
+        "admin",
+        sa.Column("admin_id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("name", sa.String(100), nullable=False),
+        sa.Column("email", sa.String(100), nullable=False, unique=True),
+        sa.Column("password", sa.String(255), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_table(
+        "session",
+        sa.Column("session_id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("student_id", sa.Integer(), sa.ForeignKey("student.student_id"), nullable=False),
+        sa.Column("started_at", sa.DateTime()),
+        sa.Column("ended_at", sa.DateTime(), nullable=True),
+    )
+    op.create_table(
+        "query",
+        sa.Column("query_id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("session_id", sa.Integer(), sa.ForeignKey("session.session_id"), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("timestamp", sa.DateTime()),
+        sa.Column("status", sa.String(20)),
+    )
+    op.create_table(
+        "answer",
+        sa.Column("answer_id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("query_id", sa.Integer(), sa.ForeignKey("query.query_id"), nullable=False),
+        sa.Column("tutor_id", sa.Integer(), sa.ForeignKey("tutor.tutor_id"), nullable=True),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("timestamp", sa.DateTime()),
+        sa.Column("is_ai", sa.Integer()),
+    )
+    op.create_table(
+        "escalation",
+        sa.Column("escalation_id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("query_id", sa.Integer(), sa.ForeignKey("query.query_id"), nullable=False),
+        sa.Column("tutor_id", sa.Integer(), sa.ForeignKey("tutor.tutor_id"), nullable=True),
+        sa.Column("escalated_at", sa.DateTime()),
+        sa.Column("status", sa.String(20)),
+    )
+    op.create_table(
+        "feedback",
+        sa.Column("feedback_id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("answer_id", sa.Integer(), sa.ForeignKey("answer.answer_id"), nullable=False),
+        sa.Column("student_id", sa.Integer(), sa.ForeignKey("student.student_id"), nullable=False),
+        sa.Column("rating", sa.Integer(), nullable=False),
+        sa.Column("comment", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime()),
+    )
+
+
+def downgrade():
+    for table in ["feedback", "escalation", "answer", "query", "session", "admin", "tutor", "student"]:
+        op.drop_table(table)
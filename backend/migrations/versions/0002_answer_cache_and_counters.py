@@ -0,0 +1,36 @@
+"""answer.is_cached and the system_counter table.
+
+Both may already exist on databases that ran the app's create_all after these
+were added to the models, so each step checks first.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if "is_cached" not in {c["name"] for c in inspector.get_columns("answer")}:
+        op.add_column("answer", sa.Column("is_cached", sa.Integer(), server_default="0"))
+
+    if not inspector.has_table("system_counter"):
+        op.create_table(
+            "system_counter",
+            sa.Column("name", sa.String(50), primary_key=True),
+            sa.Column("value", sa.Integer(), nullable=False, server_default="0"),
+        )
+
+
+def downgrade():
+    op.drop_table("system_counter")
+    with op.batch_alter_table("answer") as batch:
+        batch.drop_column("is_cached")
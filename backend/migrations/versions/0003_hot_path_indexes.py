@@ -0,0 +1,33 @@
+"""Indexes for the hot filter / sort columns.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_session_student_ended", "session", ["student_id", "ended_at"]),
+    ("ix_session_student_started", "session", ["student_id", "started_at"]),
+    ("ix_query_session_timestamp", "query", ["session_id", "timestamp"]),
+    ("ix_query_status", "query", ["status"]),
+    ("ix_answer_query", "answer", ["query_id"]),
+    ("ix_answer_tutor", "answer", ["tutor_id"]),
+    ("ix_escalation_query", "escalation", ["query_id"]),
+    ("ix_escalation_escalated_at", "escalation", ["escalated_at"]),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
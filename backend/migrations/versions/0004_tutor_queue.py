@@ -0,0 +1,29 @@
+"""Tutor work queue: escalation subject routing and claim leases.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("escalation") as batch:
+        batch.add_column(sa.Column("subject", sa.String(100), nullable=False, server_default="General"))
+        batch.add_column(sa.Column("claim_expires_at", sa.DateTime(), nullable=True))
+    op.create_index("ix_escalation_queue", "escalation", ["status", "subject", "escalated_at"])
+    op.create_index("ix_escalation_tutor_claim", "escalation", ["tutor_id", "claim_expires_at"])
+
+
+def downgrade():
+    op.drop_index("ix_escalation_tutor_claim", table_name="escalation")
+    op.drop_index("ix_escalation_queue", table_name="escalation")
+    with op.batch_alter_table("escalation") as batch:
+        batch.drop_column("claim_expires_at")
+        batch.drop_column("subject")
@@ -0,0 +1,25 @@
+"""Rolling conversation summary on the session.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("session") as batch:
+        batch.add_column(sa.Column("summary", sa.Text(), nullable=True))
+        batch.add_column(sa.Column("summary_through", sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("session") as batch:
+        batch.drop_column("summary_through")
+        batch.drop_column("summary")
@@ -0,0 +1,57 @@
+"""Activity rollups for the admin reports and the background job receipts.
+
+The rollup columns are backfilled from the source tables; from then on the
+background jobs in tasks.py keep them.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("student") as batch:
+        batch.add_column(sa.Column("query_count", sa.Integer(), nullable=False, server_default="0"))
+    with op.batch_alter_table("tutor") as batch:
+        batch.add_column(sa.Column("answers_given", sa.Integer(), nullable=False, server_default="0"))
+        batch.add_column(sa.Column("rating_count", sa.Integer(), nullable=False, server_default="0"))
+        batch.add_column(sa.Column("rating_sum", sa.Integer(), nullable=False, server_default="0"))
+    op.create_index("ix_student_query_count", "student", ["query_count"])
+
+    op.create_table(
+        "job_receipt",
+        sa.Column("key", sa.String(191), primary_key=True),
+        sa.Column("done_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_job_receipt_done_at", "job_receipt", ["done_at"])
+
+    op.execute("""
+        UPDATE student SET query_count = (
+            SELECT COUNT(*) FROM query JOIN session ON session.session_id = query.session_id
+            WHERE session.student_id = student.student_id)""")
+    op.execute("""
+        UPDATE tutor SET
+            answers_given = (SELECT COUNT(*) FROM answer WHERE answer.tutor_id = tutor.tutor_id),
+            rating_count = (SELECT COUNT(*) FROM feedback JOIN answer ON answer.answer_id = feedback.answer_id
+                            WHERE answer.tutor_id = tutor.tutor_id),
+            rating_sum = (SELECT COALESCE(SUM(feedback.rating), 0) FROM feedback JOIN answer ON answer.answer_id = feedback.answer_id
+                          WHERE answer.tutor_id = tutor.tutor_id)""")
+
+
+def downgrade():
+    op.drop_index("ix_job_receipt_done_at", table_name="job_receipt")
+    op.drop_table("job_receipt")
+    op.drop_index("ix_student_query_count", table_name="student")
+    with op.batch_alter_table("tutor") as batch:
+        batch.drop_column("rating_sum")
+        batch.drop_column("rating_count")
+        batch.drop_column("answers_given")
+    with op.batch_alter_table("student") as batch:
+        batch.drop_column("query_count")
@@ -0,0 +1,52 @@
+"""Full-text indexes over query and answer content (search.py).
+
+MySQL: FULLTEXT indexes, built from the existing rows. SQLite: FTS5 tables
+with sync triggers (as models.fts5_ddl creates them), filled by an FTS5
+'rebuild'.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+TABLES = [("query", "query_id"), ("answer", "answer_id")]
+
+
+def _fts5(table, key):
+    fts = f"{table}_fts"
+    delete = f"INSERT INTO {fts}({fts}, rowid, content) VALUES ('delete', old.{key}, old.content);"
+    insert = f"INSERT INTO {fts}(rowid, content) VALUES (new.{key}, new.content);"
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5(content, content='{table}', content_rowid='{key}', tokenize='porter unicode61')",
+        f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER {fts}_update AFTER UPDATE OF content ON {table} BEGIN {delete} {insert} END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def upgrade():
+    dialect = op.get_context().dialect.name
+    for table, key in TABLES:
+        if dialect == "mysql":
+            op.create_index(f"ft_{table}_content", table, ["content"], mysql_prefix="FULLTEXT")
+        elif dialect == "sqlite":
+            for statement in _fts5(table, key):
+                op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_context().dialect.name
+    for table, _ in reversed(TABLES):
+        if dialect == "mysql":
+            op.drop_index(f"ft_{table}_content", table_name=table)
+        elif dialect == "sqlite":
+            for trigger in ("update", "delete", "insert"):
+                op.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{trigger}")
+            op.execute(f"DROP TABLE IF EXISTS {table}_fts")
@@ -0,0 +1,27 @@
+"""Indexes for the paged admin user listing (newest first).
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_student_created_at", "student", ["created_at"]),
+    ("ix_tutor_created_at", "tutor", ["created_at"]),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
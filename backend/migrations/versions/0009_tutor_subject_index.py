@@ -0,0 +1,21 @@
+"""Index for routing escalations by tutor subject, case-insensitively.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_tutor_subject_lower", "tutor", [sa.func.lower(sa.column("subject"))])
+
+
+def downgrade():
+    op.drop_index("ix_tutor_subject_lower", table_name="tutor")
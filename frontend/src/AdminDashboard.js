@@ -6,6 +6,8 @@ function AdminDashboard() {
   const [stats, setStats] = useState(null);
   const [reports, setReports] = useState(null);
   const [users, setUsers] = useState([]);
+  const [usersRole, setUsersRole] = useState('student');
+  const [usersCursor, setUsersCursor] = useState(null);
   const [activeTab, setActiveTab] = useState('overview'); 
   const [systemStatus, setSystemStatus] = useState('Checking...');
   const navigate = useNavigate();
@@ -15,10 +17,8 @@ function AdminDashboard() {
       try {
         const s = await api.get('/admin/stats');
         const r = await api.get('/admin/reports');
-        const u = await api.get('/admin/users');
         setStats(s.data);
         setReports(r.data);
-        setUsers(u.data);
         setSystemStatus('Online'); 
       } catch (error) {
         setSystemStatus('Offline');
@@ -28,6 +28,29 @@ function AdminDashboard() {
     fetchData();
   }, [navigate]);
 
+  // User list: one role at a time, newest first, a page per request (cursor = null -> first page).
+  const fetchUsers = async (role, cursor = null) => {
+    try {
+      const res = await api.get('/admin/users', { params: cursor ? { role, cursor } : { role } });
+      setUsers(prev => cursor ? [...prev, ...res.data.items] : res.data.items);
+      setUsersCursor(res.data.next_cursor);
+    } catch (err) { console.error(err); }
+  };
+
+  useEffect(() => { fetchUsers(usersRole); }, [usersRole]);
+
+  const handleExport = async (format) => {
+    try {
+      const res = await api.get('/admin/users/export', { params: { format }, responseType: 'blob' });
+      const url = URL.createObjectURL(res.data);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = `users.${format}`;
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch (err) { console.error(err); }
+  };
+
   const handleLogout = () => { localStorage.clear(); navigate('/login'); };
 
   const handlePrint = () => {
@@ -112,10 +135,10 @@ function AdminDashboard() {
             <div className="table-card">
                 <div className="table-header"><h3>🏆 Tutor Performance</h3></div>
                 <table className="modern-table">
-                    <thead><tr><th>Name</th><th style={{textAlign:'right'}}>Resolutions</th></tr></thead>
+                    <thead><tr><th>Name</th><th style={{textAlign:'right'}}>Resolutions</th><th style={{textAlign:'right'}}>Avg. Rating</th></tr></thead>
                     <tbody>
                         {reports.tutor_performance.map((t, i) => (
-                            <tr key={i}><td>{t.tutor_name}</td><td style={{textAlign:'right', fontWeight:'bold'}}>{t.answers_given}</td></tr>
+                            <tr key={i}><td>{t.tutor_name}</td><td style={{textAlign:'right', fontWeight:'bold'}}>{t.answers_given}</td><td style={{textAlign:'right'}}>{t.avg_rating ?? '—'}</td></tr>
                         ))}
                     </tbody>
                 </table>
@@ -142,7 +165,16 @@ function AdminDashboard() {
 
       {activeTab === 'users' && (
           <div className="table-card">
-              <div className="table-header"><h3>System User List</h3></div>
+              <div className="table-header" style={{display:'flex', justifyContent:'space-between', alignItems:'center'}}>
+                  <h3>System User List</h3>
+                  <div style={{display:'flex', gap:'10px'}}>
+                      <select className="form-control" style={{width:'auto'}} value={usersRole} onChange={e => setUsersRole(e.target.value)}>
+                          <option value="student">Students</option>
+                          <option value="tutor">Tutors</option>
+                      </select>
+                      <button onClick={() => handleExport('csv')} className="btn-primary" style={{width:'auto'}}>⬇️ Export CSV</button>
+                  </div>
+              </div>
               <table className="modern-table">
                   <thead><tr><th>Role</th><th>Name</th><th>Email</th><th>Joined</th></tr></thead>
                   <tbody>
@@ -156,6 +188,7 @@ function AdminDashboard() {
                       ))}
                   </tbody>
               </table>
+              {usersCursor && <div style={{textAlign:'center', padding:'10px'}}><span className="action-link" onClick={() => fetchUsers(usersRole, usersCursor)}>Load more</span></div>}
           </div>
       )}
     </div>
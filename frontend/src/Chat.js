@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useRef } from 'react';
-import api from './api';
+import api, { streamQuery, openNotifications } from './api';
 import { useNavigate } from 'react-router-dom';
 import ReactMarkdown from 'react-markdown';
 import remarkMath from 'remark-math';
@@ -8,12 +8,19 @@ import rehypeKatex from 'rehype-katex';
 import 'katex/dist/katex.min.css';
 
 function Chat() {
-  const [history, setHistory] = useState([]);
+  const [sessions, setSessions] = useState([]);
+  const [sessionsCursor, setSessionsCursor] = useState(null);
+  const [escalations, setEscalations] = useState([]);
+  const [escalationsCursor, setEscalationsCursor] = useState(null);
   const [currentSession, setCurrentSession] = useState(null);
+  const [currentSessionId, setCurrentSessionId] = useState(null);
+  const [olderCursor, setOlderCursor] = useState(null);
   const [input, setInput] = useState('');
   const [selectedImage, setSelectedImage] = useState(null);
   const [loading, setLoading] = useState(false);
   const [activeTab, setActiveTab] = useState('chat');
+  const [subjects, setSubjects] = useState(['General']);
+  const [escalationSubject, setEscalationSubject] = useState('General');
   
 
   const [showFeedbackModal, setShowFeedbackModal] = useState(null);
@@ -31,33 +38,63 @@ function Chat() {
   const fileInputRef = useRef(null);
 
 
+  useEffect(() => {
+    api.get('/subjects').then(res => setSubjects(res.data)).catch(err => console.error(err));
+  }, []);
+
   useEffect(() => {
     fetchHistory();
+    fetchEscalations();
   }, []);
 
-  const fetchHistory = async () => {
+  // Tutor replies arrive over the socket instead of by re-fetching /history.
+  useEffect(() => openNotifications((msg) => {
+    if (msg.type !== 'tutor_answer') return;
+    setEscalations(prev => prev.map(q => q.query_id === msg.query_id
+      ? { ...q, status: 'resolved', answers: [...q.answers, msg.answer] }
+      : q));
+  }), []);
+
+  // Sidebar: lightweight session list, one page at a time (cursor = null -> first page).
+  const fetchHistory = async (cursor = null) => {
     try {
-      const res = await api.get('/history');
-      setHistory(res.data);
-  
-      if (res.data.length > 0 && currentSession === undefined) { 
-        loadSessionMessages(res.data[0]);
-      }
+      const res = await api.get('/sessions', { params: cursor ? { cursor } : {} });
+      setSessions(prev => cursor ? [...prev, ...res.data.items] : res.data.items);
+      setSessionsCursor(res.data.next_cursor);
+      return res.data.items;
+    } catch (err) { console.error(err); return []; }
+  };
+
+  // Tutor Resolutions tab: only the escalated / resolved questions, newest first, a page at a time.
+  const fetchEscalations = async (cursor = null) => {
+    try {
+      const res = await api.get('/escalations', { params: cursor ? { cursor } : {} });
+      setEscalations(prev => cursor ? [...prev, ...res.data.items] : res.data.items);
+      setEscalationsCursor(res.data.next_cursor);
     } catch (err) { console.error(err); }
   };
 
-  const loadSessionMessages = (session) => {
-    const msgs = [];
-    session.queries.forEach(q => {
-        msgs.push({ type: 'msg-user', text: q.content, id: q.query_id, status: q.status });
-        q.answers.forEach(a => {
-            if(!a.tutor_id) { 
-                msgs.push({ type: 'msg-ai', text: a.content, id: a.answer_id, query_id: q.query_id });
-            }
-        });
-    });
-    setCurrentSession(msgs);
-    setActiveTab('chat');
+  // Messages come newest first; `cursor` loads the next (older) page and prepends it.
+  const loadSessionMessages = async (sessionId, cursor = null) => {
+    try {
+      const res = await api.get(`/sessions/${sessionId}/queries`, { params: cursor ? { cursor } : {} });
+      const msgs = [];
+      [...res.data.items].reverse().forEach(q => {
+          msgs.push({ type: 'msg-user', text: q.content, id: q.query_id, status: q.status });
+          if (q.status === 'failed') {
+              msgs.push({ type: 'msg-ai', text: "⚠️ The AI couldn't answer this one (service busy). Try again, or ask a tutor.", id: `failed-${q.query_id}`, failed: true });
+          }
+          q.answers.forEach(a => {
+              if(!a.tutor_id) { 
+                  msgs.push({ type: 'msg-ai', text: a.content, id: a.answer_id, query_id: q.query_id });
+              }
+          });
+      });
+      setCurrentSession(prev => cursor ? [...msgs, ...(prev || [])] : msgs);
+      setCurrentSessionId(sessionId);
+      setOlderCursor(res.data.next_cursor);
+      setActiveTab('chat');
+    } catch (err) { console.error(err); }
   };
 
   useEffect(() => {
@@ -71,8 +108,10 @@ function Chat() {
           await api.post('/session/new');
           
           setCurrentSession(null); 
+          setCurrentSessionId(null);
+          setOlderCursor(null);
           setInput('');
-          setSelectedImage(null);
+          clearSelectedImage();
           
      
           fetchHistory();
@@ -81,12 +120,16 @@ function Chat() {
       }
   };
 
+  const clearSelectedImage = () => {
+    if (selectedImage) URL.revokeObjectURL(selectedImage.preview);
+    setSelectedImage(null);
+  };
+
   const handleImageSelect = (e) => {
     const file = e.target.files[0];
     if (file) {
-        const reader = new FileReader();
-        reader.onloadend = () => setSelectedImage(reader.result);
-        reader.readAsDataURL(file);
+        // Keep the File itself (sent as multipart); the preview is an object URL.
+        setSelectedImage({ file, preview: URL.createObjectURL(file) });
     }
   };
 
@@ -98,7 +141,7 @@ function Chat() {
     const imageToSend = selectedImage;
     
     setInput('');
-    setSelectedImage(null);
+    clearSelectedImage();
     setLoading(true);
     if(isListening && recognitionRef.current) recognitionRef.current.stop();
 
@@ -112,15 +155,34 @@ function Chat() {
     
     setCurrentSession(prev => [...(prev || []), tempUserMsg]);
 
+    const streamingId = `stream-${Date.now()}`;
     try {
-      await api.post('/query', { content: userMessageText || "Analyze this image", image: imageToSend });
+      let streamed = '';
+      await streamQuery({ content: userMessageText || "Analyze this image", image: imageToSend?.file }, (chunk) => {
+        streamed += chunk;
+        setLoading(false);
+        setCurrentSession(prev => [
+          ...(prev || []).filter(m => m.id !== streamingId),
+          { type: 'msg-ai', text: streamed, id: streamingId }
+        ]);
+      });
       
-      const res = await api.get('/history');
-      setHistory(res.data);
-  
-      if (res.data.length > 0) loadSessionMessages(res.data[0]);
+      const latest = await fetchHistory();
+      if (latest.length > 0) loadSessionMessages(latest[0].session_id);
     } catch (error) {
-      alert("Error sending message.");
+      if (!error.query) {
+        alert("Error sending message.");
+        return;
+      }
+      // The model failed (possibly mid-answer): drop the partial text and show
+      // the server's message, with the escalate option on the failed query.
+      const failed = error.query;
+      setCurrentSession(prev => [
+        ...(prev || []).filter(m => m.id !== streamingId && m.id !== tempUserMsg.id),
+        { type: 'msg-user', text: failed.content, id: failed.query_id, status: 'failed' },
+        { type: 'msg-ai', text: error.message, id: `failed-${failed.query_id}`, failed: true }
+      ]);
+      fetchHistory();
     } finally {
       setLoading(false);
     }
@@ -129,9 +191,9 @@ function Chat() {
   const handleEscalate = async (queryId) => {
     if(!window.confirm("Move this to 'Tutor Resolutions'?")) return;
     try {
-      await api.post(`/escalate/${queryId}`);
-      alert("Moved to Escalations!");
-      fetchHistory(); 
+      const res = await api.post(`/escalate/${queryId}`, null, { params: { subject: escalationSubject } });
+      alert(`Moved to Escalations! (${res.data.subject} tutors)`);
+      fetchEscalations();
     } catch(e) { alert("Failed"); }
   };
 
@@ -157,9 +219,7 @@ function Chat() {
 
   const handleLogout = () => { localStorage.clear(); navigate('/login'); };
 
-  const escalatedQueries = history.flatMap(session => 
-    session.queries.filter(q => q.status === 'escalated' || q.status === 'resolved')
-  );
+  const escalatedQueries = escalations;
 
   
   useEffect(() => {
@@ -203,12 +263,14 @@ function Chat() {
 
         <div className="history-list">
             <div style={{padding:'15px 12px 5px', fontSize:'0.75rem', color:'#94a3b8', fontWeight:'bold'}}>HISTORY</div>
-            {history.map(s => (
-                <div key={s.session_id} className="history-item" onClick={() => loadSessionMessages(s)}>
+            {sessions.map(s => (
+                <div key={s.session_id} className="history-item" onClick={() => loadSessionMessages(s.session_id)}>
                     <div>{new Date(s.started_at).toLocaleDateString()}</div>
-                    <div style={{fontSize:'0.8rem', opacity:0.7}}>{s.queries.length} Queries</div>
+                    {s.preview && <div style={{fontSize:'0.8rem', whiteSpace:'nowrap', overflow:'hidden', textOverflow:'ellipsis'}}>{s.preview}</div>}
+                    <div style={{fontSize:'0.8rem', opacity:0.7}}>{s.query_count} Queries</div>
                 </div>
             ))}
+            {sessionsCursor && <div className="history-item" style={{textAlign:'center', opacity:0.7}} onClick={() => fetchHistory(sessionsCursor)}>Load more</div>}
         </div>
         
         <div className="sidebar-footer">
@@ -239,16 +301,25 @@ function Chat() {
                             <p style={{color:'#6b7280'}}>Ask about math, science, coding, or upload an image.</p>
                         </div>
                     ) : 
-                    currentSession.map((msg, idx) => (
+                    <>
+                    {olderCursor && <div style={{textAlign:'center'}}><span className="action-link" onClick={() => loadSessionMessages(currentSessionId, olderCursor)}>Load earlier messages</span></div>}
+                    {currentSession.map((msg, idx) => (
                         <div key={idx} className={`message-bubble ${msg.type}`}>
                             {msg.type === 'msg-ai' && <span className="ai-badge-inline">🤖 AI</span>}
                             <div className="markdown-content">
                                 <ReactMarkdown remarkPlugins={[remarkMath, remarkGfm]} rehypePlugins={[rehypeKatex]}>{msg.text}</ReactMarkdown>
                             </div>
-                            {msg.type === 'msg-ai' && <div className="msg-actions"><div className="rate-btn-link" onClick={() => setShowFeedbackModal(msg.id)}><span>⭐ Rate</span></div></div>}
-                            {msg.type === 'msg-user' && msg.status === 'answered' && <div className="msg-actions"><span className="action-link" style={{color:'#f59e0b'}} onClick={() => handleEscalate(msg.id)}>Not satisfied? Ask Tutor</span></div>}
+                            {msg.type === 'msg-ai' && !msg.failed && <div className="msg-actions"><div className="rate-btn-link" onClick={() => setShowFeedbackModal(msg.id)}><span>⭐ Rate</span></div></div>}
+                            {msg.type === 'msg-user' && (msg.status === 'answered' || msg.status === 'failed') && <div className="msg-actions">
+                                <select value={escalationSubject} onChange={e => setEscalationSubject(e.target.value)} style={{marginRight:'8px', fontSize:'0.8rem'}}>
+                                    {subjects.map(s => <option key={s} value={s}>{s}</option>)}
+                                </select>
+                                <span className="action-link" style={{color:'#f59e0b'}} onClick={() => handleEscalate(msg.id)}>Not satisfied? Ask Tutor</span>
+                            </div>}
                         </div>
                     ))}
+                    </>
+                    }
                     {loading && <div className="message-bubble msg-ai">Thinking...</div>}
                     <div ref={messagesEndRef} />
                 </div>
@@ -256,8 +327,8 @@ function Chat() {
                 <div className="input-container">
                     {selectedImage && (
                         <div style={{marginBottom:'10px', position:'relative', width:'fit-content'}}>
-                            <img src={selectedImage} alt="Preview" style={{height:'80px', borderRadius:'8px', border:'1px solid #ddd'}} />
-                            <button onClick={() => setSelectedImage(null)} style={{position:'absolute', top:-5, right:-5, background:'red', color:'white', border:'none', borderRadius:'50%', width:'20px', height:'20px', cursor:'pointer'}}>×</button>
+                            <img src={selectedImage.preview} alt="Preview" style={{height:'80px', borderRadius:'8px', border:'1px solid #ddd'}} />
+                            <button onClick={clearSelectedImage} style={{position:'absolute', top:-5, right:-5, background:'red', color:'white', border:'none', borderRadius:'50%', width:'20px', height:'20px', cursor:'pointer'}}>×</button>
                         </div>
                     )}
                     <form className="input-box-wrapper" onSubmit={handleSend}>
@@ -289,6 +360,7 @@ function Chat() {
                         );
                     })
                 }
+                {escalationsCursor && <div style={{textAlign:'center'}}><span className="action-link" onClick={() => fetchEscalations(escalationsCursor)}>Load more</span></div>}
             </div>
         )}
       </div>
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import api from './api';
+import api, { openNotifications } from './api';
 import { useNavigate } from 'react-router-dom';
 
 function TutorDashboard() {
@@ -11,7 +11,7 @@ function TutorDashboard() {
     const fetchPendingQueries = async () => {
       try {
         const response = await api.get('/tutor/pending');
-        setQueries(response.data);
+        setQueries(response.data.items);
       } catch (error) {
         if (error.response?.status === 401 || error.response?.status === 403) {
           navigate('/login');
@@ -21,6 +21,15 @@ function TutorDashboard() {
     fetchPendingQueries();
   }, [navigate]);
 
+  // New escalations are pushed in; ones claimed or answered elsewhere drop out.
+  useEffect(() => openNotifications((msg) => {
+    if (msg.type === 'escalation') {
+      setQueries(prev => prev.some(q => q.escalation_id === msg.item.escalation_id) ? prev : [...prev, msg.item]);
+    } else if (msg.type === 'escalation_taken') {
+      setQueries(prev => prev.filter(q => q.claim_expires_at || !msg.escalation_ids.includes(q.escalation_id)));
+    }
+  }), []);
+
   const handleSubmitAnswer = async (queryId) => {
     const content = answerInputs[queryId];
     if (!content) return;
@@ -31,9 +40,20 @@ function TutorDashboard() {
       setAnswerInputs({ ...answerInputs, [queryId]: '' });
       
       const response = await api.get('/tutor/pending');
-      setQueries(response.data);
+      setQueries(response.data.items);
     } catch (error) {
-      alert('Failed to submit answer.');
+      alert(error.response?.status === 409 ? 'Another tutor has claimed this question.' : 'Failed to submit answer.');
+    }
+  };
+
+  // Claims the oldest open questions so no other tutor picks them up meanwhile.
+  const handleClaim = async () => {
+    try {
+      await api.post('/tutor/claim', null, { params: { limit: 3 } });
+      const response = await api.get('/tutor/pending');
+      setQueries(response.data.items);
+    } catch (error) {
+      alert('Failed to claim questions.');
     }
   };
 
@@ -48,9 +68,14 @@ function TutorDashboard() {
             <h1>👨‍🏫 Tutor Workspace</h1>
             <p style={{color: '#64748b', margin: 0}}>Review and answer student escalations.</p>
         </div>
-        <button onClick={handleLogout} className="btn-primary" style={{width: 'auto', background: '#dc3545'}}>
-            Logout
-        </button>
+        <div style={{display: 'flex', gap: '10px'}}>
+            <button onClick={handleClaim} className="btn-primary" style={{width: 'auto'}}>
+                Claim Next
+            </button>
+            <button onClick={handleLogout} className="btn-primary" style={{width: 'auto', background: '#dc3545'}}>
+                Logout
+            </button>
+        </div>
       </div>
 
       <div style={{maxWidth: '800px', margin: '0 auto'}}>
@@ -70,6 +95,8 @@ function TutorDashboard() {
                 <div style={{display: 'flex', alignItems: 'center', gap: '10px'}}>
                     <span className="badge escalated">Escalated</span>
                     <span style={{color: '#64748b', fontSize: '0.9rem'}}>ID: #{q.query_id}</span>
+                    <span style={{color: '#64748b', fontSize: '0.9rem'}}>{q.subject}</span>
+                    {q.claim_expires_at && <span className="badge resolved">Claimed until {new Date(q.claim_expires_at).toLocaleTimeString()}</span>}
                 </div>
                 <span style={{color: '#94a3b8', fontSize: '0.85rem'}}>
                     {new Date(q.timestamp).toLocaleString()}
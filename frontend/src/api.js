@@ -13,4 +13,74 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// POST /query/stream: calls onToken(text) for every chunk the model produces
+// and resolves once the server reports the answer has been saved (`done`).
+// If no model could answer (`error`, even mid-answer) it rejects with the
+// server's message; `err.query` is the query, stored as failed. An image
+// (a File/Blob) is sent as a multipart part to /query/upload/stream rather
+// than base64 inside the JSON body.
+export const streamQuery = async ({ content, image }, onToken) => {
+  const token = localStorage.getItem('token');
+  const auth = token ? { Authorization: `Bearer ${token}` } : {};
+  let request;
+  if (image) {
+    const form = new FormData();
+    form.append('content', content);
+    form.append('image', image);
+    request = { path: '/query/upload/stream', headers: auth, body: form };
+  } else {
+    request = {
+      path: '/query/stream',
+      headers: { 'Content-Type': 'application/json', ...auth },
+      body: JSON.stringify({ content }),
+    };
+  }
+  const response = await fetch(`${api.defaults.baseURL}${request.path}`, {
+    method: 'POST',
+    headers: request.headers,
+    body: request.body,
+  });
+  if (!response.ok || !response.body) throw new Error(`Stream failed: ${response.status}`);
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const raw of events) {
+      const event = raw.match(/^event: (.*)$/m)?.[1];
+      const data = raw.match(/^data: (.*)$/m)?.[1];
+      if (event === 'token' && data) onToken(JSON.parse(data).content);
+      if (event === 'error' && data) {
+        const failed = JSON.parse(data);
+        reader.cancel();
+        const err = new Error(failed.error);
+        err.query = failed;
+        throw err;
+      }
+    }
+  }
+};
+
+// /ws WebSocket: push notifications (escalations for tutors, tutor answers for
+// students). Reconnects after a drop; returns a function that closes it.
+export const openNotifications = (onMessage) => {
+  let socket = null;
+  let closed = false;
+  const connect = () => {
+    const token = localStorage.getItem('token');
+    if (!token || closed) return;
+    const url = api.defaults.baseURL.replace(/^http/, 'ws') + `/ws?token=${encodeURIComponent(token)}`;
+    socket = new WebSocket(url);
+    socket.onmessage = (e) => onMessage(JSON.parse(e.data));
+    socket.onclose = (e) => { if (!closed && e.code !== 1008) setTimeout(connect, 3000); };
+  };
+  connect();
+  return () => { closed = true; socket?.close(); };
+};
+
 export default api;     
\ No newline at end of file